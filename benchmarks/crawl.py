@@ -0,0 +1,291 @@
+"""
+端到端抓取基准测试
+
+启动本地合成站点（独立进程），运行参考爬虫并输出 requests/sec、items/sec、延迟 p50/p99、峰值内存与 CPU 时间，
+结果为一行 json，附带版本与配置，便于在不同下载引擎、不同版本之间对比::
+
+    python -m benchmarks.crawl --pages 500 --threads 16 --latency uniform:0.002,0.01
+    python -m benchmarks.crawl --engine replay --spider json --output bench_output.txt
+
+engine:
+    threaded  多线程下载器直接请求本地站点
+    replay    先录制一遍 cassette（不计时），再在新进程中离线回放，峰值内存不包含录制阶段
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urljoin
+
+from espider.pipelines import BasePipeline
+from espider.spider import Spider
+from espider.utils.cassette import Cassette
+
+from benchmarks.synthetic import SyntheticSite
+
+
+class Stats(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.crashed = 0
+        self.items = 0
+        self.latency = []
+        self.first = None
+        self.last = None
+
+    def record_response(self, response):
+        with self.lock:
+            self.requests += 1
+            if response.status_code != 200: self.errors += 1
+            self.latency.append(float(response.cost_time))
+            self.last = time.time()
+
+    def record_crash(self):
+        with self.lock:
+            self.crashed += 1
+
+    def record_item(self):
+        with self.lock:
+            self.items += 1
+            self.last = time.time()
+
+
+class CountPipeline(BasePipeline):
+    def process_item(self, item, *args, **kwargs):
+        self.spider.stats.record_item()
+
+
+class PageSpider(Spider):
+    """
+    html 参考爬虫：css 提取条目并跟进站内链接
+    """
+
+    __custom_setting__ = {
+        'request': {
+            'max_retry': 0,
+            'timeout': 10
+        },
+        'download': {
+            'max_thread': 16,
+            'wait_time': 0,
+            'close_countdown': 1,
+            'distribute_item': True
+        }
+    }
+
+    path = '/page/0'
+
+    def __init__(self, base_url, max_pages, stats, threads=16, transport=None):
+        self.base_url = base_url
+        self.max_pages = max_pages
+        self.stats = stats
+        self.seen = set()
+        self.seen_lock = threading.Lock()
+        super().__init__()
+
+        self.downloader.max_thread = threads
+        self.downloader.transport = transport
+        self.downloader.add_pipeline(CountPipeline(self))
+
+    def start_requests(self, *args, **kwargs):
+        url = self.base_url + self.path
+        self.follow(url)
+        yield self.request(url, callback=self.parse)
+
+    def follow(self, url):
+        with self.seen_lock:
+            if url in self.seen or len(self.seen) >= self.max_pages: return False
+            self.seen.add(url)
+            return True
+
+    def parse(self, response, *args, **kwargs):
+        self.stats.record_response(response)
+        if response.status_code != 200: return
+
+        for item in response.css('li.item'):
+            yield {
+                'id': item.css('::attr(data-id)').get(),
+                'title': item.css('.title::text').get(),
+                'price': item.css('.price::text').get(),
+            }
+
+        for href in response.css('div.links a::attr(href)').getall():
+            url = urljoin(self.base_url, href)
+            if self.follow(url): yield self.request(url, callback=self.parse)
+
+    def end(self):
+        pass
+
+
+class JsonSpider(PageSpider):
+    """
+    json 参考爬虫：解析 api 接口
+    """
+
+    path = '/api/0'
+
+    def parse(self, response, *args, **kwargs):
+        self.stats.record_response(response)
+        if response.status_code != 200: return
+
+        data = response.json()
+        yield from data.get('items')
+
+        for href in data.get('links'):
+            url = urljoin(self.base_url, href)
+            if self.follow(url): yield self.request(url, callback=self.parse)
+
+
+SPIDERS = {'html': PageSpider, 'json': JsonSpider}
+
+
+def _serve(config, queue):
+    site = SyntheticSite(**config)
+    site.start()
+    queue.put(site.base_url)
+    threading.Event().wait()
+
+
+def start_site(config):
+    """
+    在独立进程中启动站点，避免服务端开销计入爬虫进程
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(config, queue), daemon=True)
+    process.start()
+    return process, queue.get(timeout=10)
+
+
+def crawl(spider_cls, base_url, max_pages, threads, transport=None):
+    stats = Stats()
+    spider = spider_cls(base_url, max_pages, stats, threads=threads, transport=transport)
+
+    # 下载线程中未捕获的异常也计为错误，否则出错的请求既不进入回调也不会被统计
+    excepthook = threading.excepthook
+
+    def record_crash(args):
+        stats.record_crash()
+        excepthook(args)
+
+    threading.excepthook = record_crash
+    cpu = os.times()
+    stats.first = time.time()
+    try:
+        spider.start()
+    finally:
+        threading.excepthook = excepthook
+    cpu_end = os.times()
+
+    seconds = (stats.last or time.time()) - stats.first
+    latency = sorted(stats.latency) or [0]
+    return {
+        'requests': stats.requests,
+        'items': stats.items,
+        # 回调中的非 200 响应 + 请求异常（未进入回调）+ 崩溃的下载线程
+        'errors': stats.errors + spider.downloader.count['Error'] + stats.crashed,
+        'crashed': stats.crashed,
+        'seconds': round(seconds, 3),
+        'requests_per_sec': round(stats.requests / seconds, 1) if seconds else 0,
+        'items_per_sec': round(stats.items / seconds, 1) if seconds else 0,
+        'latency_p50': round(statistics.median(latency), 4),
+        'latency_p99': round(latency[min(len(latency) - 1, int(len(latency) * 0.99))], 4),
+        'cpu_seconds': round((cpu_end.user - cpu.user) + (cpu_end.system - cpu.system), 3),
+        # 当前进程的峰值内存
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def replay(spider_cls, base_url, max_pages, threads, path, latency=0):
+    """
+    在 spawn 启动的新进程中回放，结果不受录制阶段的内存和状态影响
+    """
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(_replay, (spider_cls, base_url, max_pages, threads, path, latency))
+
+
+def _replay(spider_cls, base_url, max_pages, threads, path, latency):
+    transport = Cassette(path, mode='replay', latency=latency)
+    return crawl(spider_cls, base_url, max_pages, threads, transport=transport)
+
+
+def espider_version():
+    try:
+        from importlib.metadata import version
+        return version('espider')
+    except Exception:
+        return 'dev'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='espider end-to-end crawl benchmark')
+    parser.add_argument('--spider', choices=sorted(SPIDERS), default='html')
+    parser.add_argument('--engine', choices=['threaded', 'replay'], default='threaded')
+    parser.add_argument('--pages', type=int, default=500)
+    parser.add_argument('--fanout', type=int, default=10)
+    parser.add_argument('--page-size', type=int, default=16 * 1024)
+    parser.add_argument('--items', type=int, default=10)
+    parser.add_argument('--latency', default=None, help='const:0.01 / uniform:0.005,0.02 / exp:0.01')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--charset', default='utf-8')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--replay-latency', type=float, default=0)
+    parser.add_argument('--output', default=None, help='append the json result to this file')
+    args = parser.parse_args(argv)
+
+    site_config = {
+        'pages': args.pages, 'fanout': args.fanout, 'page_size': args.page_size, 'items': args.items,
+        'latency': args.latency, 'error_rate': args.error_rate, 'charset': args.charset, 'seed': args.seed,
+    }
+    spider_cls = SPIDERS.get(args.spider)
+
+    process, base_url = start_site(site_config)
+    try:
+        if args.engine == 'threaded':
+            result = crawl(spider_cls, base_url, args.pages, args.threads)
+        else:
+            path = os.path.join(tempfile.mkdtemp(), 'benchmark.cassette')
+            crawl(spider_cls, base_url, args.pages, args.threads, transport=Cassette(path, mode='record'))
+            process.terminate()
+            result = replay(spider_cls, base_url, args.pages, args.threads, path, latency=args.replay_latency)
+            os.remove(path)
+    finally:
+        process.terminate()
+
+    # 站点按页号确定性地返回 500，预期有错误页时结果中必须有错误
+    site = SyntheticSite(**site_config)
+    expected_errors = sum(site.is_error(n) for n in range(args.pages))
+    if expected_errors and not result['errors']:
+        print(f'Expected errors with --error-rate {args.error_rate} ({expected_errors} error pages), '
+              f'but the crawl reported none', file=sys.stderr)
+        return None
+
+    result = {
+        'espider': espider_version(),
+        'python': platform.python_version(),
+        'engine': args.engine,
+        'spider': args.spider,
+        'threads': args.threads,
+        'site': site_config,
+        **result,
+    }
+    line = json.dumps(result, ensure_ascii=False)
+    print(line)
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write(line + '\n')
+    return result
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,122 @@
+"""
+Response.text 归一化的耗时与内存对比
+
+legacy 为按处理分别遍历全文的旧实现（解码、逐个正则删除特殊字符、编码错误时重新解码），
+pipeline 为当前的 Response.text（编码在解码前确定，字符处理合并为一次）。
+内存为 tracemalloc 统计的每页峰值，结果为一行 json::
+
+    python -m benchmarks.normalize
+    python -m benchmarks.normalize --pages 50 --page-size 131072 --output bench_output.txt
+"""
+
+import argparse
+import json
+import platform
+import re
+import time
+import tracemalloc
+
+import requests.models
+from requests.structures import CaseInsensitiveDict
+
+from espider.parser.response import Response
+from espider.utils.encoding import body_declared_encoding
+
+from benchmarks.synthetic import SyntheticSite
+
+NORMALIZE = ('special_character', 'fail_encoding')
+
+LEGACY_PATTERNS = [re.compile('[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F]')]
+
+
+def build_corpus(pages=20, page_size=64 * 1024, dirty=True):
+    site = SyntheticSite(pages=pages, items=50, page_size=page_size)
+    corpus = []
+    for n in range(pages):
+        body = site.render(f'/page/{n}')[2]
+        # 混入少量控制字符
+        if dirty: body = body.replace(b'</li>', b'\x07</li>', 5)
+        corpus.append(body)
+    return corpus
+
+
+def build_response(body):
+    resp = requests.models.Response()
+    resp._content = body
+    resp._content_consumed = True
+    resp.status_code = 200
+    resp.url = 'http://127.0.0.1/page/0'
+    # 没有 charset 的 text/html，requests 默认为 ISO-8859-1
+    resp.headers = CaseInsensitiveDict({'Content-Type': 'text/html'})
+    resp.encoding = 'ISO-8859-1'
+    return Response(resp)
+
+
+def legacy(body):
+    text = str(body, 'ISO-8859-1', errors='replace')
+    for pattern in LEGACY_PATTERNS:
+        text = pattern.sub('', text)
+    encoding = body_declared_encoding(body)
+    if encoding:
+        text = str(body, encoding, errors='replace')
+        for pattern in LEGACY_PATTERNS:
+            text = pattern.sub('', text)
+    return text
+
+
+def pipeline(body):
+    response = build_response(body)
+    response.normalize = NORMALIZE
+    return response.text
+
+
+def measure(func, corpus, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for body in corpus:
+            func(body)
+    seconds = time.perf_counter() - start
+
+    peak = 0
+    for body in corpus:
+        tracemalloc.start()
+        func(body)
+        peak += tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'ms': round(seconds / (repeat * len(corpus)) * 1000, 3),
+        'peak_kb': round(peak / len(corpus) / 1024, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='espider text normalization benchmark')
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--page-size', type=int, default=64 * 1024)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--clean', action='store_true', help='do not insert control characters')
+    parser.add_argument('--output', default=None, help='append the json result to this file')
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(args.pages, args.page_size, dirty=not args.clean)
+    if any(legacy(_) != pipeline(_) for _ in corpus): raise AssertionError('pipeline output differs from legacy')
+
+    result = {
+        'python': platform.python_version(),
+        'pages': len(corpus),
+        'bytes': sum(len(_) for _ in corpus),
+        'dirty': not args.clean,
+        'legacy': measure(legacy, corpus, args.repeat),
+        'pipeline': measure(pipeline, corpus, args.repeat),
+    }
+    line = json.dumps(result)
+    print(line)
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write(line + '\n')
+    return result
+
+
+if __name__ == '__main__':
+    main()
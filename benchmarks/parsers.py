@@ -0,0 +1,108 @@
+"""
+解析后端对比：一致性检查与解析、css 查询耗时
+
+一致性检查在所有已安装的后端上执行 tests/conformance.py 中的 css 查询，结果必须与 lxml 完全一致；
+基准测试对语料中的每个页面分别统计解析和查询耗时，结果为一行 json::
+
+    python -m benchmarks.parsers --check
+    python -m benchmarks.parsers --corpus ./pages --repeat 5 --output bench_output.txt
+
+语料为目录下的 .html 文件（按 utf-8 读取 bytes），未指定时使用合成站点的页面
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import time
+
+from espider.parser.backends import available_backends, get_backend
+
+from benchmarks.synthetic import SyntheticSite
+from tests.conformance import check
+
+# 基准测试中的查询
+BENCH_QUERIES = [
+    'title::text',
+    'li.item::attr(data-id)',
+    'li.item .title::text',
+    'div.links a::attr(href)',
+    'p::text',
+    'a',
+]
+
+
+def load_corpus(path=None, pages=20, page_size=64 * 1024):
+    if path:
+        files = sorted(glob.glob(os.path.join(path, '*.html')))
+        if not files: raise ValueError(f'No .html files in {path}')
+        corpus = []
+        for file in files:
+            with open(file, 'rb') as f:
+                corpus.append(f.read())
+        return corpus
+
+    site = SyntheticSite(pages=pages, items=50, page_size=page_size)
+    return [site.render(f'/page/{n}')[2] for n in range(pages)]
+
+
+def bench(name, corpus, queries=BENCH_QUERIES, repeat=3):
+    backend = get_backend(name)
+    parse = query = 0
+    for _ in range(repeat):
+        for body in corpus:
+            start = time.perf_counter()
+            selector = backend.create(body=body, encoding='utf-8')
+            middle = time.perf_counter()
+            for q in queries:
+                selector.css(q).getall()
+            end = time.perf_counter()
+            parse += middle - start
+            query += end - middle
+
+    pages = len(corpus) * repeat
+    return {
+        'parse_ms': round(parse / pages * 1000, 3),
+        'query_ms': round(query / pages * 1000, 3),
+        'pages_per_sec': round(pages / (parse + query), 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='espider parser backend benchmark')
+    parser.add_argument('--check', action='store_true', help='only run the conformance check')
+    parser.add_argument('--backend', action='append', help='backends to compare, default all installed')
+    parser.add_argument('--corpus', default=None, help='directory of .html files')
+    parser.add_argument('--pages', type=int, default=20, help='synthetic pages when no corpus is given')
+    parser.add_argument('--page-size', type=int, default=64 * 1024)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None, help='append the json result to this file')
+    args = parser.parse_args(argv)
+
+    backends = args.backend or available_backends()
+    failures = check(backends)
+    for name, query, want, got in failures:
+        print(f'[{name}] {query}: lxml={want!r} {name}={got!r}', file=sys.stderr)
+    if args.check: return not failures
+
+    corpus = load_corpus(args.corpus, pages=args.pages, page_size=args.page_size)
+    result = {
+        'python': platform.python_version(),
+        'corpus': args.corpus or 'synthetic',
+        'pages': len(corpus),
+        'bytes': sum(len(_) for _ in corpus),
+        'conformance_failures': len(failures),
+        'backends': {name: bench(name, corpus, repeat=args.repeat) for name in backends},
+    }
+    line = json.dumps(result, ensure_ascii=False)
+    print(line)
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write(line + '\n')
+    return result
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,133 @@
+"""
+Request / Response 序列化对比：espider.utils.serialize 与 pickle
+
+Response 直接 pickle（经过 __getstate__），Request 是线程无法 pickle，对比的是 pickle 同样字段组成的 dict。
+结果为一行 json，包含每种对象的 dumps / loads 耗时（微秒）与序列化后的大小::
+
+    python -m benchmarks.serialize
+    python -m benchmarks.serialize --pages 50 --page-size 131072 --repeat 2000 --output bench_output.txt
+"""
+
+import argparse
+import datetime
+import json
+import pickle
+import platform
+import time
+
+import requests.models
+from requests.structures import CaseInsensitiveDict
+
+from espider.parser.response import Response
+from espider.spider import Spider
+from espider.utils import serialize
+
+from benchmarks.synthetic import SyntheticSite
+
+
+class BenchSpider(Spider):
+    def parse(self, response, *args, **kwargs):
+        pass
+
+
+def build_responses(pages=20, page_size=64 * 1024):
+    site = SyntheticSite(pages=pages, items=50, page_size=page_size)
+    responses = []
+    for n in range(pages):
+        status, content_type, body = site.render(f'/page/{n}')
+        resp = requests.models.Response()
+        resp._content = body
+        resp._content_consumed = True
+        resp.status_code = status
+        resp.reason = 'OK'
+        resp.url = f'http://127.0.0.1/page/{n}'
+        resp.headers = CaseInsensitiveDict({
+            'Content-Type': f'{content_type}; charset=utf-8',
+            'Content-Length': str(len(body)),
+            'Date': 'Mon, 19 Oct 2026 00:00:00 GMT',
+        })
+        resp.elapsed = datetime.timedelta(milliseconds=12)
+        responses.append(Response(resp))
+    return responses
+
+
+def build_requests(spider, count=20):
+    return [
+        spider.request(
+            f'http://127.0.0.1/page/{n}',
+            params={'page': n},
+            headers={'User-Agent': 'espider-bench', 'Accept': 'text/html'},
+            cookies={'session': 'x' * 32},
+            cb_args=(n, f'title {n}'),
+            cb_kwargs={'depth': 2},
+        )
+        for n in range(count)
+    ]
+
+
+def request_fields(request):
+    return {
+        'request_kwargs': request.request_kwargs,
+        'callback': request.callback.__name__,
+        'cb_args': request.func_args,
+        'cb_kwargs': request.func_kwargs,
+        'priority': request.priority,
+        'max_retry': request.max_retry,
+        'retry_times': request.retry_times,
+    }
+
+
+def timeit(func, objs, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for obj in objs:
+            func(obj)
+    return round((time.perf_counter() - start) / (repeat * len(objs)) * 1e6, 2)
+
+
+def bench(objs, dumps, loads, repeat):
+    data = [dumps(_) for _ in objs]
+    return {
+        'dumps_us': timeit(dumps, objs, repeat),
+        'loads_us': timeit(loads, data, repeat),
+        'bytes': round(sum(len(_) for _ in data) / len(data)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='espider serialization benchmark')
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--page-size', type=int, default=64 * 1024)
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--output', default=None, help='append the json result to this file')
+    args = parser.parse_args(argv)
+
+    spider = BenchSpider()
+    responses = build_responses(args.pages, args.page_size)
+    requests_ = build_requests(spider, args.pages)
+    fields = [request_fields(_) for _ in requests_]
+
+    result = {
+        'python': platform.python_version(),
+        'msgpack': serialize.msgpack is not None,
+        'pages': args.pages,
+        'page_size': args.page_size,
+        'response': {
+            'espider': bench(responses, serialize.dumps, serialize.loads, args.repeat),
+            'pickle': bench(responses, pickle.dumps, pickle.loads, args.repeat),
+        },
+        'request': {
+            'espider': bench(requests_, serialize.dumps, lambda _: serialize.loads(_, spider=spider), args.repeat),
+            'pickle': bench(fields, pickle.dumps, pickle.loads, args.repeat),
+        },
+    }
+    line = json.dumps(result)
+    print(line)
+    if args.output:
+        with open(args.output, 'a') as f:
+            f.write(line + '\n')
+    return result
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+本地合成站点，用于端到端基准测试
+
+页面图、页面大小、延迟分布、错误率、编码均可配置，同一 seed 下生成的站点完全一致::
+
+    site = SyntheticSite(pages=1000, fanout=10, page_size=20 * 1024, latency='uniform:0.005,0.02')
+    base_url = site.start()
+    ...
+    site.stop()
+
+路由:
+    /page/<n>   html 页面，包含 ``items`` 个条目和 ``fanout`` 个站内链接
+    /api/<n>    同一页面的 json 版本
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def parse_latency(latency):
+    """
+    const:0.01 / uniform:0.005,0.02 / exp:0.01（均值）/ 数字
+    """
+    if not latency: return lambda rng: 0
+    if isinstance(latency, (int, float)): return lambda rng: latency
+
+    kind, _, args = latency.partition(':')
+    args = [float(_) for _ in args.split(',') if _]
+    if kind == 'const':
+        return lambda rng: args[0]
+    elif kind == 'uniform':
+        return lambda rng: rng.uniform(*args)
+    elif kind == 'exp':
+        return lambda rng: rng.expovariate(1 / args[0])
+    raise ValueError(f'Invalid latency: {latency}')
+
+
+class SyntheticSite(object):
+    def __init__(self, pages=1000, fanout=10, page_size=16 * 1024, items=10, latency=None, error_rate=0.0,
+                 charset='utf-8', seed=0, host='127.0.0.1', port=0):
+        self.pages = pages
+        self.fanout = fanout
+        self.page_size = page_size
+        self.items = items
+        self.latency = latency
+        self.error_rate = error_rate
+        self.charset = charset
+        self.seed = seed
+        self.host = host
+        self.port = port
+
+        self._latency = parse_latency(latency)
+        self._server = None
+        self.hits = 0
+
+    @property
+    def base_url(self):
+        return f'http://{self.host}:{self._server.server_port}' if self._server else None
+
+    def start(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                site.hits += 1
+                status, content_type, body = site.render(self.path)
+                delay = site._latency(random.Random(f'{site.seed}{self.path}{site.hits}'))
+                if delay: time.sleep(delay)
+
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def links(self, n):
+        rng = random.Random(self.seed * 1000003 + n)
+        return [rng.randrange(self.pages) for _ in range(self.fanout)]
+
+    def is_error(self, n):
+        digest = hashlib.md5(f'{self.seed}:{n}'.encode()).digest()
+        return int.from_bytes(digest[:4], 'big') / 2 ** 32 < self.error_rate
+
+    def render(self, path):
+        kind, _, number = path.strip('/').partition('/')
+        try:
+            n = int(number)
+        except ValueError:
+            return 404, 'text/plain', b'not found'
+
+        if kind not in ('page', 'api') or not 0 <= n < self.pages:
+            return 404, 'text/plain', b'not found'
+        if self.is_error(n):
+            return 500, 'text/plain', b'server error'
+
+        items = [{'id': f'{n}-{i}', 'title': f'条目 {n}-{i}', 'price': (n * 31 + i) % 1000} for i in range(self.items)]
+        links = [f'/{kind}/{_}' for _ in self.links(n)]
+
+        if kind == 'api':
+            body = json.dumps({'page': n, 'items': items, 'links': links}, ensure_ascii=False)
+            return 200, 'application/json', body.encode('utf8')
+
+        html = [
+            f'<!DOCTYPE html><html><head><meta charset="{self.charset}"><title>Page {n}</title></head><body>',
+            '<ul class="items">',
+            *(f'<li class="item" data-id="{_["id"]}"><span class="title">{_["title"]}</span>'
+              f'<span class="price">{_["price"]}</span></li>' for _ in items),
+            '</ul><div class="links">',
+            *(f'<a href="{_}">{_}</a>' for _ in links),
+            '</div>',
+        ]
+        size = sum(len(_) for _ in html)
+        if size < self.page_size:
+            filler = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. '
+            html.append('<p class="filler">{}</p>'.format(filler * ((self.page_size - size) // len(filler) + 1)))
+        html.append('</body></html>')
+
+        body = ''.join(html).encode(self.charset, errors='xmlcharrefreplace')
+        return 200, f'text/html; charset={self.charset}', body
@@ -1,3 +1,6 @@
+import bisect
+import heapq
+import mmap
 import os
 from threading import RLock
 
@@ -47,3 +50,194 @@ class OpenCsv(object):
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.file.close()
+
+
+def _write_varint(buffer, value):
+    while value > 0x7f:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80: return value, pos
+        shift += 7
+
+
+class UrlSet(object):
+    """
+    精确去重集合，利用同站 url 前缀高度重复的特点压缩存储
+
+    新 url 先写入内存中的增量集合，达到 ``merge_size`` 后与有序的前缀压缩段（front coding）合并，
+    每 ``block_size`` 条记录存一个完整 key 作为重启点，查询时二分定位到块后顺序解码。
+    指定 ``path`` 时压缩段保存到磁盘并通过 mmap 读取，重启后可继续使用。
+    """
+
+    __MAGIC__ = b'ESPURLS1'
+
+    def __init__(self, path=None, merge_size=10000, block_size=16):
+        self.path = path
+        self.merge_size = merge_size
+        self.block_size = block_size
+
+        self._delta = set()
+        self._run = b''
+        self._run_size = 0
+        self._block_keys = []
+        self._block_offsets = []
+        self._file = None
+        self._lock = RLock()
+
+        if path and os.path.exists(path): self._load_run()
+
+    def add(self, url):
+        """
+        添加 url，已存在时返回 False
+        """
+        key = self._key(url)
+        with self._lock:
+            if key in self._delta or self._run_contains(key): return False
+            self._delta.add(key)
+            if len(self._delta) >= self.merge_size: self.merge()
+        return True
+
+    def __contains__(self, url):
+        key = self._key(url)
+        with self._lock:
+            return key in self._delta or self._run_contains(key)
+
+    def __len__(self):
+        return self._run_size + len(self._delta)
+
+    def __iter__(self):
+        """
+        按字典序遍历所有 url，可用于两次抓取之间的对比
+        """
+        with self._lock:
+            keys = list(heapq.merge(self._iter_run(), sorted(self._delta)))
+        for key in keys:
+            yield key.decode('utf8')
+
+    def merge(self):
+        """
+        将内存增量合并进压缩段
+        """
+        with self._lock:
+            if not self._delta: return
+
+            buffer = bytearray(self.__MAGIC__)
+            block_keys, block_offsets = [], []
+            previous = b''
+            size = 0
+            for key in heapq.merge(self._iter_run(), sorted(self._delta)):
+                if size % self.block_size == 0:
+                    block_keys.append(key)
+                    block_offsets.append(len(buffer))
+                    previous = b''
+                shared = _common_prefix(previous, key)
+                _write_varint(buffer, shared)
+                _write_varint(buffer, len(key) - shared)
+                buffer += key[shared:]
+                previous = key
+                size += 1
+
+            self._close_file()
+            if self.path:
+                tmp_path = self.path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(buffer)
+                os.replace(tmp_path, self.path)
+                self._open_file()
+            else:
+                self._run = bytes(buffer)
+
+            self._block_keys, self._block_offsets = block_keys, block_offsets
+            self._run_size = size
+            self._delta = set()
+
+    def close(self):
+        self.merge()
+        with self._lock:
+            self._close_file()
+            self._run = b''
+
+    @staticmethod
+    def _key(url):
+        return url.encode('utf8') if isinstance(url, str) else bytes(url)
+
+    def _run_contains(self, key):
+        index = bisect.bisect_right(self._block_keys, key) - 1
+        if index < 0: return False
+
+        for k in self._iter_block(index):
+            if k == key: return True
+            if k > key: return False
+        return False
+
+    def _iter_block(self, index):
+        data = self._run
+        pos = self._block_offsets[index]
+        end = self._block_offsets[index + 1] if index + 1 < len(self._block_offsets) else len(data)
+        key = b''
+        while pos < end:
+            shared, pos = _read_varint(data, pos)
+            length, pos = _read_varint(data, pos)
+            key = key[:shared] + data[pos:pos + length]
+            pos += length
+            yield key
+
+    def _iter_run(self):
+        for index in range(len(self._block_offsets)):
+            yield from self._iter_block(index)
+
+    def _load_run(self):
+        self._open_file()
+        data = self._run
+        if data[:len(self.__MAGIC__)] != self.__MAGIC__:
+            self._close_file()
+            raise ValueError(f'Invalid url set file: {self.path}')
+
+        # 重建块索引，共享前缀为 0 的记录都可以作为重启点，与写入时的 block_size 无关
+        pos, size = len(self.__MAGIC__), 0
+        key = b''
+        while pos < len(data):
+            offset = pos
+            shared, pos = _read_varint(data, pos)
+            length, pos = _read_varint(data, pos)
+            key = key[:shared] + data[pos:pos + length]
+            pos += length
+            if shared == 0:
+                self._block_keys.append(key)
+                self._block_offsets.append(offset)
+            size += 1
+        self._run_size = size
+
+    def _open_file(self):
+        self._file = open(self.path, 'rb')
+        if os.path.getsize(self.path):
+            self._run = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._run = b''
+
+    def _close_file(self):
+        if isinstance(self._run, mmap.mmap): self._run.close()
+        self._run = b''
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} size: {len(self)}, path: {self.path}>'
+
+
+def _common_prefix(a, b):
+    size = min(len(a), len(b))
+    i = 0
+    while i < size and a[i] == b[i]:
+        i += 1
+    return i
@@ -1,8 +1,33 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
 import redis
+from requests.structures import CaseInsensitiveDict
 from w3lib.url import canonicalize_url
+from espider.dbs import UrlSet
+from espider.parser.response import Response
 from espider.utils.tools import get_md5
 
 
+def request_fingerprint(request_kwargs, canonical_url=None):
+    """
+    request唯一表识
+    @return:
+    """
+    # url 归一化
+    args = [canonical_url or canonicalize_url(request_kwargs.get('url'))]
+
+    for arg in ["params", "data", "files", "auth", "cert", "json"]:
+        if request_kwargs.get(arg):
+            args.append(request_kwargs.get(arg))
+
+    return get_md5(*args)
+
+
 class BaseMiddleware(object):
 
     def process_request(self, request, *args, **kwargs):
@@ -77,20 +102,250 @@ class RequestFilter(BaseMiddleware):
 
     @staticmethod
     def _fingerprint(request):
-        """
-        request唯一表识
-        @return:
-        """
-        url = request.url
-        # url 归一化
-        url = canonicalize_url(url)
-        args = [url]
+        return request_fingerprint({**request.request_kwargs, 'url': request.url})
+
+    def close_middleware(self):
+        print('RequestFilter({}): Drop {} request'.format(self.priority, self.number))
+
 
-        for arg in ["params", "data", "files", "auth", "cert", "json"]:
-            if request.request_kwargs.get(arg):
-                args.append(request.requests_kwargs.get(arg))
+class SeenFilter(BaseMiddleware):
+    """
+    基于 UrlSet 的精确去重，不依赖 redis
 
-        return get_md5(*args)
+    key 为归一化后的 url，带请求体等参数时追加参数指纹，path 不为空时可跨进程持久化
+    """
+
+    def __init__(self, path=None, priority=None, merge_size=10000, block_size=16):
+        self.seen = UrlSet(path=path, merge_size=merge_size, block_size=block_size)
+        self.priority = priority
+        self.number = 0
+
+    def process_request(self, request, *args, **kwargs):
+
+        # 过滤层级，None 表示所有层级
+        if self.priority is not None and self.priority != request.priority: return request
+
+        # 重试和错误中间件重新发起的请求会再次经过 run()，已放行过的请求不再去重
+        if request.retry_times > 0 or getattr(request, '_seen_filter', None) is self: return request
+
+        if not self.seen.add(self._key(request)):
+            print('<SeenFilter> Drop: {}'.format(request.url))
+            self.number += 1
+            return 'drop'
+        else:
+            request._seen_filter = self
+            return request
+
+    @staticmethod
+    def _key(request):
+        url = canonicalize_url(request.url)
+        request_kwargs = request.request_kwargs
+        if any(request_kwargs.get(arg) for arg in ["params", "data", "files", "auth", "cert", "json"]):
+            return '{} {}'.format(url, request_fingerprint(request_kwargs, canonical_url=url))
+        return url
 
     def close_middleware(self):
-        print('RequestFilter({}): Drop {} request'.format(self.priority, self.number))
+        self.seen.close()
+        print('SeenFilter({}): Drop {} request'.format(self.priority, self.number))
+
+
+class HttpCacheMiddleware(BaseMiddleware):
+    """
+    本地 HTTP 缓存，响应保存在 sqlite 中，以请求指纹为 key
+
+    policy:
+        rfc     遵循 Cache-Control / Expires，过期后带 If-None-Match / If-Modified-Since 重新验证，304 视为命中
+        always  忽略响应头，缓存 ttl 秒（ttl 为 None 时永不过期），过期后同样尝试重新验证
+    max_size: 缓存 body 总字节数上限，超出时按最近访问时间淘汰（LRU）
+    """
+
+    __POLICIES__ = ['rfc', 'always']
+
+    def __init__(self, path=None, policy='rfc', ttl=None, max_size=None, methods=None, status=None):
+        assert policy in self.__POLICIES__, f'Invalid policy {policy}, must be one of {self.__POLICIES__}'
+
+        self.path = path or os.path.join('.espider', 'httpcache.db')
+        self.policy = policy
+        self.ttl = ttl
+        self.max_size = max_size
+        self.methods = methods or ['GET', 'HEAD']
+        self.status = status or [200]
+
+        if os.path.dirname(self.path): os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.RLock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, body BLOB, encoding TEXT, '
+            'stored_at REAL, accessed_at REAL, size INTEGER)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+        self.db.commit()
+        self.total_size = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+        self.count = {'Hit': 0, 'Miss': 0, 'Revalidated': 0, 'Stored': 0, 'Evicted': 0}
+
+    def process_request(self, request, *args, **kwargs):
+        if request.method not in self.methods: return request
+
+        key = self._key(request.request_kwargs)
+        row = self._get(key)
+        if not row:
+            self.count['Miss'] += 1
+            return request
+
+        url, status, headers, body, encoding, stored_at = row
+        headers = CaseInsensitiveDict(json.loads(headers))
+        if self._is_fresh(headers, stored_at):
+            self.count['Hit'] += 1
+            self._touch(key)
+            return self._build_response(url, status, headers, body, encoding)
+
+        # 过期，带验证头重新请求
+        validators = {}
+        if headers.get('ETag'): validators['If-None-Match'] = headers.get('ETag')
+        if headers.get('Last-Modified'): validators['If-Modified-Since'] = headers.get('Last-Modified')
+        if validators:
+            request.request_kwargs['headers'] = {**(request.request_kwargs.get('headers') or {}), **validators}
+
+        self.count['Miss'] += 1
+        return request
+
+    def process_response(self, response, *args, **kwargs):
+        request_kwargs = getattr(response, 'request_kwargs', None)
+        if getattr(response, 'from_cache', False) or not request_kwargs: return response
+        if request_kwargs.get('method') not in self.methods: return response
+
+        key = self._key(request_kwargs)
+        if response.status_code == 304:
+            row = self._get(key)
+            if not row: return response
+
+            url, status, headers, body, encoding, _ = row
+            headers = CaseInsensitiveDict(json.loads(headers))
+            headers.update({k: v for k, v in response.headers.items() if k.lower() not in ('content-length',)})
+            with self._lock:
+                self.db.execute(
+                    'UPDATE responses SET headers = ?, stored_at = ?, accessed_at = ? WHERE key = ?',
+                    (json.dumps(dict(headers)), time.time(), time.time(), key)
+                )
+                self.db.commit()
+
+            self.count['Revalidated'] += 1
+            cached = self._build_response(url, status, headers, body, encoding)
+            cached.cost_time, cached.retry_times = response.cost_time, response.retry_times
+            cached.request_kwargs = request_kwargs
+            return cached
+
+        if response.status_code in self.status and self._is_storable(response.headers):
+            self._store(key, response)
+
+        return response
+
+    def _key(self, request_kwargs):
+        return '{} {}'.format(request_kwargs.get('method'), request_fingerprint(request_kwargs))
+
+    def _get(self, key):
+        with self._lock:
+            return self.db.execute(
+                'SELECT url, status, headers, body, encoding, stored_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+
+    def _touch(self, key):
+        with self._lock:
+            self.db.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            self.db.commit()
+
+    def _store(self, key, response):
+        body = response.content or b''
+        now = time.time()
+        with self._lock:
+            row = self.db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            if row: self.total_size -= row[0]
+
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, response.url, response.status_code, json.dumps(dict(response.headers)), body,
+                 response._encoding, now, now, len(body))
+            )
+            self.total_size += len(body)
+            self.count['Stored'] += 1
+            self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        if not self.max_size: return
+
+        while self.total_size > self.max_size:
+            rows = self.db.execute('SELECT key, size FROM responses ORDER BY accessed_at LIMIT 100').fetchall()
+            if not rows: break
+
+            for key, size in rows:
+                if self.total_size <= self.max_size: break
+                self.db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.total_size -= size
+                self.count['Evicted'] += 1
+
+    def _is_storable(self, headers):
+        if self.policy == 'always': return True
+        cache_control = _parse_cache_control(headers.get('Cache-Control'))
+        return 'no-store' not in cache_control
+
+    def _is_fresh(self, headers, stored_at):
+        age = time.time() - stored_at
+        if self.policy == 'always': return self.ttl is None or age < self.ttl
+
+        cache_control = _parse_cache_control(headers.get('Cache-Control'))
+        if 'no-cache' in cache_control: return False
+
+        for directive in ('s-maxage', 'max-age'):
+            if cache_control.get(directive):
+                try:
+                    return age < int(cache_control.get(directive))
+                except ValueError:
+                    pass
+
+        date = _parse_http_date(headers.get('Date'))
+        expires = _parse_http_date(headers.get('Expires'))
+        if headers.get('Expires'):
+            return bool(expires and date) and age < expires - date
+
+        # 启发式过期时间: (Date - Last-Modified) * 10%
+        last_modified = _parse_http_date(headers.get('Last-Modified'))
+        if date and last_modified and date > last_modified:
+            return age < (date - last_modified) * 0.1
+
+        return False
+
+    @staticmethod
+    def _build_response(url, status, headers, body, encoding):
+        response = Response()
+        response._content = body
+        response._content_consumed = True
+        response.status_code = status
+        response.headers = headers
+        response.url = url
+        response._encoding = encoding
+        response.from_cache = True
+        return response
+
+    def close_middleware(self):
+        with self._lock:
+            self.db.close()
+        print('HttpCacheMiddleware: {}'.format(', '.join(f'{k}: {v}' for k, v in self.count.items())))
+
+
+def _parse_cache_control(value):
+    directives = {}
+    for directive in (value or '').split(','):
+        key, _, v = directive.strip().partition('=')
+        if key: directives[key.lower()] = v.strip('"') or True
+    return directives
+
+
+def _parse_http_date(value):
+    if not value: return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
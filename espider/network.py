@@ -5,9 +5,9 @@ from queue import Queue
 import urllib3
 from espider.settings import REQUEST_KEYS, DEFAULT_METHOD_VALUE
 from espider.parser.response import Response
-from espider.utils.tools import args_split, PriorityQueue, headers_to_dict, cookies_to_dict, json_to_dict
+from espider.utils.tools import args_split, PriorityQueue, headers_to_dict, cookies_to_dict, json_to_dict, get_md5
 import espider.utils.requests as requests
-from espider.middlewares import BaseMiddleware
+from espider.middlewares import BaseMiddleware, request_fingerprint
 from espider.pipelines import BasePipeline
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -36,6 +36,8 @@ class Request(threading.Thread):
         self.callback = kwargs.get('callback')
         self.session = kwargs.get('session')
         self.show_detail = kwargs.get('show_detail')
+        self.normalize = kwargs.get('normalize')
+        self.parser = kwargs.get('parser')
         self.retry_times = 0
         self.is_start = False
         self.success = False
@@ -63,11 +65,26 @@ class Request(threading.Thread):
         self.is_start = True
 
         # 加载中间件
+        start = time.time()
         request = _load_download_middleware(request=self, middlewares=self.downloader.middlewares)
+        if isinstance(request, Response):  # 中间件直接返回响应，如缓存命中
+            self._process_callback(request, start)
+            return
         if request == 'DROP': return
         if request: self.__dict__.update(request.__dict__)
 
-        start = time.time()
+        # 合并进行中的相同请求
+        inflight_key = self._inflight_key()
+        if inflight_key:
+            entry, is_leader = self.downloader.inflight.join(inflight_key)
+            if not is_leader:
+                entry.event.wait()
+                if entry.response is not None:
+                    self._process_callback(entry.response.copy(), start)
+                    return
+                # 首个请求失败，自行请求
+                inflight_key = None
+
         try:
             if self.show_detail:
                 print('{} Start request {} [{}] body: {} ...'.format(
@@ -76,11 +93,11 @@ class Request(threading.Thread):
                     self.method,
                     self.request_kwargs.get('body') or self.request_kwargs.get('json')))
 
-            if self.session:
-                self.request_kwargs.pop('cookies', None)
-                response = self.session.request(**self.request_kwargs)
+            transport = self.downloader.transport
+            if transport:
+                response = transport.fetch(self.request_kwargs, self._download)
             else:
-                response = requests.request(**self.request_kwargs)
+                response = self._download()
 
             if self.show_detail:
                 print('{} Downloaded request {} [{}] body: {}'.format(
@@ -91,13 +108,19 @@ class Request(threading.Thread):
 
         except Exception as e:
             self.error = True
+            if inflight_key: self.downloader.inflight.resolve(inflight_key)
 
             # 处理错误请求
             result = _load_error_middleware(self, middlewares=self.downloader.middlewares, exception=e)
             self._process_result(result, start)
 
         else:
-            if response.status_code != 200 and self.retry_times < self.max_retry:
+            if inflight_key:
+                self.downloader.inflight.resolve(
+                    inflight_key, response.copy() if response.status_code == 200 else None
+                )
+
+            if response.status_code not in (200, 304) and self.retry_times < self.max_retry:
                 self.retry_times += 1
                 time.sleep(self.retry_times * 0.1)
 
@@ -108,6 +131,32 @@ class Request(threading.Thread):
             else:
                 self._process_callback(response, start)
 
+    def _download(self):
+        if self.session:
+            self.request_kwargs.pop('cookies', None)
+            return Response(self.session.request(**self.request_kwargs))
+        else:
+            return requests.request(**self.request_kwargs)
+
+    def _inflight_key(self):
+        if self.downloader.inflight is None or self.method not in ('GET', 'HEAD'): return None
+        # 流式响应的 body 无法共享
+        if self.request_kwargs.get('stream'): return None
+
+        # headers、cookies、代理和 session 不同时可能是不同用户的页面，不能共享响应
+        kwargs = self.request_kwargs
+        headers = sorted((str(k).lower(), str(v)) for k, v in (kwargs.get('headers') or {}).items())
+        cookies = kwargs.get('cookies') or {}
+        if isinstance(cookies, dict):
+            cookies = sorted((str(k), str(v)) for k, v in cookies.items())
+        else:
+            cookies = sorted((c.name, c.value, c.domain, c.path) for c in cookies)
+        proxies = sorted((kwargs.get('proxies') or {}).items())
+        session = id(self.session) if self.session is not None else None
+        return '{} {}'.format(
+            self.method, get_md5(request_fingerprint(kwargs), headers, cookies, proxies, session)
+        )
+
     def _process_result(self, result, start):
         if isinstance(result, Request):
             self.__dict__.update(result.__dict__)
@@ -116,10 +165,12 @@ class Request(threading.Thread):
             self._process_callback(result, start)
 
     def _process_callback(self, response, start):
-        if response.status_code == 200: self.success = True
-
         response.cost_time = '{:.3f}'.format(time.time() - start)
         response.retry_times = self.retry_times
+        response.request_kwargs = self.request_kwargs
+        if self.normalize is not None and not getattr(self.callback, 'raw_callback', False):
+            response.normalize = self.normalize
+        if self.parser is not None: response.parser = self.parser
 
         # 加载中间件
         response_ = _load_download_middleware(
@@ -127,6 +178,8 @@ class Request(threading.Thread):
         )
         if response_: response = response_
 
+        if response.status_code == 200: self.success = True
+
         if not self.success:  # 处理失败的请求
             result = _load_failed_middleware(self, response, middlewares=self.downloader.middlewares)
 
@@ -139,8 +192,6 @@ class Request(threading.Thread):
         if self.callback:
             assert isinstance(self.downloader, Downloader)
 
-            charset = response.css('meta::attr(content)').re_first('charset=(.*)')
-            if charset: response.encoding = charset
             result = self.callback(response, *self.func_args, **self.func_kwargs)
 
             if result:
@@ -149,6 +200,8 @@ class Request(threading.Thread):
                     for _ in result:
                         if isinstance(_, Request):
                             self.downloader.push(_)
+                        elif isinstance(_, list):
+                            self.downloader.push_many(_)
                         elif isinstance(_, dict):
                             self.downloader.push_item(_)
                         elif isinstance(_, tuple):
@@ -162,6 +215,8 @@ class Request(threading.Thread):
 
                 elif isinstance(result, Request):
                     self.downloader.push(result)
+                elif isinstance(result, list):
+                    self.downloader.push_many(result)
                 elif isinstance(result, dict):
                     self.downloader.push_item(result)
                 else:
@@ -169,10 +224,61 @@ class Request(threading.Thread):
                         result, self.callback.__name__
                     ))
 
+            # 回调结束，释放解析树，回调中保留的 response 只剩 body
+            release = getattr(response, 'release', None)
+            if release is not None: release()
+
     def __repr__(self):
         return f'<{self.name} {self.__class__.__name__} {self.method}:{self.url} priority:{self.priority}>'
 
 
+class InflightRegistry(object):
+    """
+    进行中的请求登记表，相同指纹的请求等待首个请求完成后共享其响应
+
+    key 包括请求指纹、headers、cookies、代理和 session，凭据不同的请求不会合并
+    """
+
+    class Entry(object):
+        __slots__ = ['event', 'response']
+
+        def __init__(self):
+            self.event = threading.Event()
+            self.response = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.number = 0
+
+    def join(self, key):
+        """
+        登记请求，返回 (entry, is_leader)，is_leader 为 False 时需等待 entry.event
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = self.Entry()
+                return entry, True
+
+            self.number += 1
+            return entry, False
+
+    def resolve(self, key, response=None):
+        """
+        发布响应，response 为 None 时表示请求失败，等待者各自重新请求
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+
+        if entry:
+            entry.response = response
+            entry.event.set()
+
+    def __len__(self):
+        return len(self._entries)
+
+
 class Downloader(object):
     def __init__(self, max_thread=None, wait_time=0, end_callback=None, **kwargs):
         self.request_pool = PriorityQueue()
@@ -186,6 +292,8 @@ class Downloader(object):
         self.close_countdown = kwargs.get('close_countdown') or 3
         self.distribute_item = kwargs.get('distribute_item') or True
         self._close = False
+        self.inflight = InflightRegistry() if kwargs.get('coalesce') else None
+        self.transport = kwargs.get('transport')
         assert isinstance(self.item_filter, Iterable), 'item_filter must be a iterable object'
 
         # 插件
@@ -195,9 +303,15 @@ class Downloader(object):
         self._pipelines = []
 
     def push(self, request):
-        assert isinstance(request, Request), f'task must be a {Request.__name__} object.'
+        _check_request(request)
         self.request_pool.push(request, request.priority)
 
+    def push_many(self, requests):
+        requests = list(requests)
+        for index, request in enumerate(requests):
+            _check_request(request, index)
+        self.request_pool.push_many((request, request.priority) for request in requests)
+
     def push_item(self, item):
         self.item_pool.put(item)
 
@@ -266,15 +380,18 @@ class Downloader(object):
                         time.sleep(1)
                     elif countdown != -1 or self._close:
                         # 关闭管道
-                        for pipeline in self._pipelines:
+                        for pipeline in (_.get('pipeline') for _ in self._pipelines):
                             if hasattr(pipeline, 'close_pipeline'): pipeline.close_pipeline()
 
                         # 关闭中间件
-                        for middleware in self._middlewares:
+                        for middleware in (_.get('middleware') for _ in self._middlewares):
                             if hasattr(middleware, 'close_middleware'): middleware.close_middleware()
 
+                        if hasattr(self.transport, 'close'): self.transport.close()
+
                         if self.end_callback: self.end_callback()
                         msg = f'All task is done. Success: {self.count.get("Success")}, Retry: {self.count.get("Retry")}, Failed: {self.count.get("Failed")}, Error: {self.count.get("Error")}'
+                        if self.inflight is not None: msg += f', Coalesced: {self.inflight.number}'
                         print(msg)
                         self._close = True
                     else:
@@ -344,6 +461,13 @@ class Downloader(object):
         )
 
 
+def _check_request(request, index=None):
+    # 不用 assert，python -O 下也要检查
+    if not isinstance(request, Request):
+        position = '' if index is None else f' at index {index}'
+        raise TypeError(f'task must be a {Request.__name__} object, got {type(request).__name__}{position}: {request!r}')
+
+
 def _process_callback_args(args):
     assert isinstance(args[0], dict), 'yield item, args, kwargs,  item must be a dict'
     args_, kwargs = args_split(args[1:])
@@ -361,6 +485,7 @@ def _load_download_middleware(request=None, response=None, middlewares=None, arg
             if hasattr(middleware, 'process_request'):
                 result = middleware.process_request(request, *request.func_args, **request.func_kwargs)
                 if isinstance(result, str) and result.upper() == 'DROP': return result.upper()
+                if isinstance(result, Response): return result
                 if result: request = result
 
         return request
@@ -0,0 +1,244 @@
+"""
+HTML 解析后端
+
+lxml: 默认后端，支持 xpath 和 css，见 ``selector.Selector``
+lexbor: 基于 selectolax 的 lexbor 引擎（HTML5），只支持 css，解析和 css 查询更快，需要安装 selectolax
+
+lexbor 后端不支持 xpath：xpath、xpath_values、xpath_map 以及 ExtractionPlan 会抛出 TypeError，
+需要 xpath 的爬虫请使用 lxml 后端。后端的 supports_xpath 属性表示是否支持
+
+按爬虫选择::
+
+    __custom_setting__ = {'request': {'parser': 'lexbor'}}
+"""
+
+import re
+from urllib.parse import urljoin
+
+from parsel.utils import extract_regex, iflatten, shorten
+
+from espider.parser.selector import CannotRemoveElementWithoutRoot, Selector, SelectorList
+from espider.utils.tools import RegexMap, compile_regex_map, search
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+# parsel 的 css 扩展 ::text、::attr(name)，前面有空白时作用于所有后代节点
+_PSEUDO_ELEMENT = re.compile(r'^(.*?)(\s*)::(text|attr\(\s*([^)\s]+)\s*\))\s*$', re.S)
+
+_LINK_ATTRIBUTES = ('href', 'src', 'action', 'background', 'cite', 'codebase', 'data', 'longdesc', 'poster')
+
+
+class LxmlBackend(object):
+    name = 'lxml'
+    available = True
+    supports_xpath = True
+
+    @staticmethod
+    def create(text=None, body=None, encoding=None, base_url=None):
+        return Selector(text=text, body=body, encoding=encoding, base_url=base_url)
+
+
+class LexborBackend(object):
+    name = 'lexbor'
+    available = LexborHTMLParser is not None
+    supports_xpath = False
+
+    @staticmethod
+    def create(text=None, body=None, encoding=None, base_url=None):
+        return LexborSelector(text=text, body=body, encoding=encoding, base_url=base_url)
+
+
+BACKENDS = {}
+
+
+def register_backend(backend):
+    """
+    注册解析后端，backend 需要 name、available 属性和 create(text, body, encoding, base_url) 方法
+    """
+    BACKENDS[backend.name] = backend
+
+
+def get_backend(name):
+    backend = BACKENDS.get(name or 'lxml')
+    if backend is None: raise ValueError(f'Invalid parser {name}, must be in {sorted(BACKENDS)}')
+    if not backend.available: raise ImportError(f'Parser {name} is not available, please install its dependency')
+    return backend
+
+
+def available_backends():
+    return [name for name, backend in BACKENDS.items() if backend.available]
+
+
+register_backend(LxmlBackend)
+register_backend(LexborBackend)
+
+
+class LexborSelector(object):
+    """
+    与 :class:`Selector` 接口一致的 css 选择器，基于 selectolax 的 lexbor 引擎，不支持 xpath
+
+    root 为 LexborHTMLParser（文档）、LexborNode（节点）或 str（::text、::attr 的结果）
+    xpath 相关方法抛出 TypeError
+    """
+
+    __slots__ = ['root', '_expr', '_serialized']
+
+    supports_xpath = False
+
+    selectorlist_cls = SelectorList
+
+    def __init__(self, text=None, type=None, root=None, base_url=None, _expr=None, body=None, encoding=None):
+        if LexborHTMLParser is None: raise ImportError('LexborSelector requires selectolax')
+        if type not in (None, 'html'): raise ValueError('LexborSelector only supports html')
+
+        if text is not None:
+            root = LexborHTMLParser(text)
+        elif body is not None:
+            if (encoding or 'utf-8').lower().replace('_', '-') in ('utf-8', 'utf8'):
+                root = LexborHTMLParser(body)
+            else:
+                root = LexborHTMLParser(body.decode(encoding, errors='replace'))
+        elif root is None:
+            raise ValueError("Selector needs either text or root argument")
+
+        self.root = root
+        self._expr = _expr
+        self._serialized = None
+
+    def __getstate__(self):
+        raise TypeError("can't pickle Selector objects")
+
+    def _wrap(self, root, expr):
+        selector = LexborSelector.__new__(LexborSelector)
+        selector.root = root
+        selector._expr = expr
+        selector._serialized = None
+        return selector
+
+    def css(self, query):
+        if isinstance(self.root, str): return self.selectorlist_cls([])
+
+        match = _PSEUDO_ELEMENT.match(query)
+        if not match:
+            return self.selectorlist_cls([self._wrap(node, query) for node in self.root.css(query)])
+
+        query, descendant, pseudo, attr = match.groups()
+        if query.strip():
+            nodes = self.root.css(query)
+        else:
+            # 单独的 ::text 与 parsel 一致，取所有后代文本
+            nodes, descendant = [self._node], True
+        wrap = self._wrap
+        result = self.selectorlist_cls()
+        for node in nodes:
+            if node is None: continue
+            if attr is not None:
+                value = node.attributes.get(attr, False)
+                if value is not False: result.append(wrap(value or '', query))
+            else:
+                children = node.traverse(include_text=True) if descendant else node.iter(include_text=True)
+                result.extend(wrap(child.text(deep=False), query) for child in children if child.is_text_node)
+        return result
+
+    css_values = css
+
+    def css_map(self, query_map):
+        return self._query_from_map(self.css, query_map)
+
+    def xpath(self, query, namespaces=None, **kwargs):
+        raise TypeError('The lexbor parser does not support xpath, use the lxml parser instead')
+
+    xpath_values = xpath_map = xpath
+
+    @property
+    def _node(self):
+        root = self.root
+        return root.root if isinstance(root, LexborHTMLParser) else root
+
+    def re(self, regex, replace_entities=True):
+        return extract_regex(regex, self.get(), replace_entities=replace_entities)
+
+    def re_first(self, regex, default=None, replace_entities=True):
+        return next(iflatten(self.re(regex, replace_entities=replace_entities)), default)
+
+    def re_map(self, regex_map, replace_entities=True):
+        return self._re_map(compile_regex_map(regex_map), replace_entities=replace_entities)
+
+    def re_map_first(self, regex_map, default=None, replace_entities=True):
+        return self._re_map(
+            compile_regex_map(regex_map), first=True, default=default, replace_entities=replace_entities
+        )
+
+    def _re_map(self, regex_map, first=False, default=None, replace_entities=True):
+        data = {}
+        for key, pattern in regex_map.items():
+            if isinstance(pattern, RegexMap):
+                data[key] = self._re_map(pattern, first=first, default=default, replace_entities=replace_entities)
+            elif first:
+                data[key] = self.re_first(pattern, default=default, replace_entities=replace_entities)
+            else:
+                data[key] = self.re(pattern, replace_entities=replace_entities)
+        return data
+
+    _query_from_map = Selector._query_from_map
+    query_from_map = Selector.query_from_map
+
+    def find(self, key, data=None, target_type=None):
+        return search(key=key, data=data or self.get(), target_type=target_type)
+
+    def get(self):
+        if self._serialized is None:
+            root = self.root
+            self._serialized = root if isinstance(root, str) else root.html or ''
+        return self._serialized
+
+    extract = get
+
+    def getall(self):
+        return [self.get()]
+
+    @property
+    def attrib(self):
+        node = self._node
+        if isinstance(node, str) or node is None: return {}
+        return {k: v or '' for k, v in node.attributes.items()}
+
+    def remove(self):
+        node = self._node
+        if isinstance(node, str) or node is None:
+            raise CannotRemoveElementWithoutRoot(
+                "The node you're trying to remove has no root, "
+                "are you trying to remove a pseudo-element?"
+            )
+        node.decompose()
+        self._serialized = None
+
+    def make_links_absolute(self, base_url):
+        """
+        将链接属性补全为绝对链接，对应 lxml 的 make_links_absolute
+        """
+        if isinstance(self.root, str): return
+        for name in _LINK_ATTRIBUTES:
+            for node in self.root.css(f'[{name}]'):
+                value = node.attributes.get(name)
+                if not value: continue
+                try:
+                    node.attrs[name] = urljoin(base_url, value.strip())
+                except ValueError:
+                    # 无法解析的链接保持原样，与 lxml 一致
+                    pass
+        self._serialized = None
+
+    def __bool__(self):
+        return bool(self.get())
+
+    __nonzero__ = __bool__
+
+    def __str__(self):
+        data = repr(shorten(self.get(), width=40))
+        return "<%s css=%r data=%s>" % (type(self).__name__, self._expr, data)
+
+    __repr__ = __str__
@@ -0,0 +1,146 @@
+"""
+链接提取
+
+遍历一次解析树取出链接，补全为绝对链接后按规则过滤、去重::
+
+    extractor = LinkExtractor(allow=r'/page/\\d+', deny_domains=['ads.example.com'])
+    urls = response.extract_links(extractor)
+    spider.downloader.push_many(extractor.extract_requests(response, spider, callback=spider.parse_page))
+
+LinkExtractor 只保存编译后的规则，可以在爬虫中创建一次，在多个线程中复用。
+"""
+
+import re
+from functools import lru_cache
+from urllib.parse import urljoin, urlsplit
+
+from w3lib.url import canonicalize_url
+
+from espider.parser.selector import Selector
+
+
+# 同一站点的页面间导航链接大量重复，缓存规范化结果
+_canonicalize_url = lru_cache(maxsize=8192)(canonicalize_url)
+
+
+@lru_cache(maxsize=128)
+def _compile_patterns(patterns):
+    # 每个正则单独编译，保留预编译正则的 flags 和 (?i) 等全局内联 flags
+    if not patterns: return None
+    return tuple(p if isinstance(p, re.Pattern) else re.compile(p) for p in patterns)
+
+
+def _search(patterns, url):
+    return any(p.search(url) for p in patterns)
+
+
+def _as_tuple(value):
+    if value is None: return ()
+    if isinstance(value, (str, re.Pattern)): return (value,)
+    return tuple(value)
+
+
+class LinkExtractor(object):
+    """
+    tags / attrs: 取链接的标签和属性，默认 a、area 的 href
+    allow / deny: 正则或正则列表，匹配补全后的链接，deny 优先
+    allow_domains / deny_domains: 域名列表，包括子域名
+    deny_extensions: 忽略的扩展名，如 ('jpg', 'pdf')
+    canonicalize: 是否规范化链接（排序参数、去掉 fragment 等），去重始终基于规范化后的链接
+    unique: 是否在页面内去重
+    """
+
+    def __init__(self, allow=(), deny=(), allow_domains=(), deny_domains=(), deny_extensions=None,
+                 tags=('a', 'area'), attrs=('href',), canonicalize=True, unique=True):
+        self.allow = _compile_patterns(_as_tuple(allow))
+        self.deny = _compile_patterns(_as_tuple(deny))
+        self.allow_domains = self._domains(allow_domains)
+        self.deny_domains = self._domains(deny_domains)
+        self.deny_extensions = tuple(
+            '.' + ext.lower().lstrip('.') for ext in _as_tuple(deny_extensions)
+        )
+        self.tags = _as_tuple(tags)
+        self.attrs = _as_tuple(attrs)
+        self.canonicalize = canonicalize
+        self.unique = unique
+
+    @staticmethod
+    def _domains(domains):
+        domains = {_.lower().lstrip('.') for _ in _as_tuple(domains)}
+        # (完整域名, 子域名后缀)，用于 host == d 或 host.endswith('.d')
+        return (frozenset(domains), tuple('.' + _ for _ in domains)) if domains else None
+
+    def extract_links(self, response):
+        """
+        返回过滤后的链接字符串列表，按页面中的顺序
+        """
+        selector = response.selector
+        base_url = response._cached_base_url or response.url or ''
+
+        links, seen, seen_raw = [], set(), set()
+        for value in self._iter_values(selector):
+            value = value.strip()
+            if not value or value.startswith('#'): continue
+            if self.unique:
+                if value in seen_raw: continue
+                seen_raw.add(value)
+
+            url = urljoin(base_url, value)
+            parts = urlsplit(url)
+            if parts.scheme not in ('http', 'https'): continue
+            if not self._allowed(url, parts): continue
+
+            canonical = _canonicalize_url(url)
+            if self.unique:
+                if canonical in seen: continue
+                seen.add(canonical)
+            links.append(canonical if self.canonicalize else url)
+        return links
+
+    def extract_requests(self, response, spider, callback=None, **kwargs):
+        """
+        返回 spider.request 创建的请求列表，可直接传给 ``Downloader.push_many``
+        """
+        return [spider.request(url, callback=callback, **kwargs) for url in self.extract_links(response)]
+
+    def _iter_values(self, selector):
+        root = selector.root
+        attrs = self.attrs
+        if isinstance(selector, Selector):
+            if not hasattr(root, 'iter'): return
+            # 按标签遍历在 lxml 中完成，比 iterlinks 逐个元素检查属性快得多
+            for element in root.iter(*self.tags):
+                for attr in attrs:
+                    value = element.get(attr)
+                    if value is not None: yield value
+        else:
+            # 其他后端使用 css 选择器
+            if isinstance(root, str): return
+            query = ','.join(f'{tag}[{attr}]' for tag in self.tags for attr in attrs)
+            for node in root.css(query):
+                for attr in attrs:
+                    value = node.attributes.get(attr)
+                    if value: yield value
+
+    def _allowed(self, url, parts):
+        if self.allow_domains or self.deny_domains:
+            host = (parts.hostname or '').lower()
+            if self.allow_domains and not self._match_domain(host, self.allow_domains): return False
+            if self.deny_domains and self._match_domain(host, self.deny_domains): return False
+
+        if self.deny_extensions and parts.path.lower().endswith(self.deny_extensions): return False
+        if self.deny is not None and _search(self.deny, url): return False
+        if self.allow is not None and not _search(self.allow, url): return False
+        return True
+
+    @staticmethod
+    def _match_domain(host, domains):
+        names, suffixes = domains
+        return host in names or host.endswith(suffixes)
+
+    def __repr__(self):
+        return '<{} allow={} deny={}>'.format(
+            self.__class__.__name__,
+            [_.pattern for _ in self.allow] if self.allow else None,
+            [_.pattern for _ in self.deny] if self.deny else None,
+        )
@@ -0,0 +1,99 @@
+"""
+Response.text 的归一化
+
+按作用阶段分为三类，同一阶段的处理合并执行，整篇文本最多多一次拷贝:
+
+    decode  解码前选择编码，如 fail_encoding，不产生额外的文本
+    text    解码后的字符替换/删除，所有启用的字符表合并为一张表，一次处理完成
+    tree    作用于解析树，如 absolute_links，见 ``Response.selector``
+
+字符表处理: 纯 ASCII 文本用 ``str.translate``，其他文本用合并后的字符类正则
+（非 ASCII 文本上 translate 逐字符查表，比正则慢一个数量级），没有需要处理的字符时不拷贝。
+
+自定义归一化::
+
+    register_normalization('nbsp', table={'\\xa0': ' '})
+    register_normalization('strip', func=str.strip)
+
+    __custom_setting__ = {'request': {'normalize': ['special_character', 'nbsp']}}
+"""
+
+import re
+from functools import lru_cache
+
+FAIL_ENCODING = "ISO-8859-1"
+
+# 控制字符（保留 \t \n \r），对应原来的正则 [\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F]
+SPECIAL_CHARACTER_TABLE = dict.fromkeys([*range(0x00, 0x09), 0x0b, 0x0c, *range(0x0e, 0x20), *range(0x7f, 0xa0)])
+
+DECODE, TEXT, TREE = 'decode', 'text', 'tree'
+
+# 名称 -> (阶段, 字符表, 函数)，按注册顺序执行
+_NORMALIZATIONS = {}
+
+
+def register_normalization(name, table=None, func=None, stage=None):
+    """
+    注册 text 阶段的归一化，table 为 {字符或码位: 替换字符串或 None（删除）}，func 为 str -> str 的函数，
+    同时指定时先查表再执行 func。decode、tree 阶段由 Response 实现，只注册名称
+    """
+    stage = stage or TEXT
+    if stage not in (DECODE, TEXT, TREE): raise ValueError(f'Invalid stage {stage}')
+    if table is not None: table = {k if isinstance(k, int) else ord(k): v for k, v in table.items()}
+    _NORMALIZATIONS[name] = (stage, table, func)
+    build_pipeline.cache_clear()
+
+
+def normalizations():
+    return tuple(_NORMALIZATIONS)
+
+
+def stage_of(name):
+    try:
+        return _NORMALIZATIONS[name][0]
+    except KeyError:
+        raise ValueError(f'Invalid normalization {name}, must be in {normalizations()}')
+
+
+@lru_cache(maxsize=64)
+def build_pipeline(names):
+    """
+    返回 text 阶段的处理函数，没有需要执行的处理时返回 None
+    """
+    table, funcs = {}, []
+    for name in names:
+        stage, table_, func = _NORMALIZATIONS[name]
+        if stage != TEXT: continue
+        if table_: table.update(table_)
+        if func: funcs.append(func)
+
+    if not table and not funcs: return None
+    return TextPipeline(table, funcs)
+
+
+class TextPipeline(object):
+    __slots__ = ['table', 'funcs', 'regex', '_replace']
+
+    def __init__(self, table=None, funcs=None):
+        self.table = table or {}
+        self.funcs = tuple(funcs or ())
+        self.regex = None
+        self._replace = ''
+
+        if self.table:
+            self.regex = re.compile('[{}]'.format(''.join(re.escape(chr(_)) for _ in sorted(self.table))))
+            if any(_ for _ in self.table.values()):
+                table = self.table
+                self._replace = lambda m: table[ord(m.group())] or ''
+
+    def __call__(self, text):
+        if self.regex is not None and text:
+            text = text.translate(self.table) if text.isascii() else self.regex.sub(self._replace, text)
+        for func in self.funcs:
+            text = func(text)
+        return text
+
+
+register_normalization('absolute_links', stage=TREE)
+register_normalization('special_character', table=SPECIAL_CHARACTER_TABLE)
+register_normalization('fail_encoding', stage=DECODE)
@@ -0,0 +1,259 @@
+"""
+Extraction plans: compile a field map once, run it on many pages
+"""
+
+import re
+
+from cssselect.parser import SelectorError
+from cssselect.xpath import ExpressionError
+from lxml import etree
+from parsel.utils import extract_regex
+
+from espider.parser.selector import Selector, _ctgroup, _css_cache, _st, compile_xpath
+
+_PREFIXES = ('re:', 'css:', 'xpath:')
+
+
+def classify_query(query, type=None):
+    """
+    判断 query 类型，返回 (kind, query)，kind 为 're'、'css' 或 'xpath'
+
+    可用 're:'、'css:'、'xpath:' 前缀显式指定，否则以 '/'、'./'、'../' 开头视为 xpath，
+    能被解析为 css 的视为 css，其余视为正则
+    """
+    for prefix in _PREFIXES:
+        if query.startswith(prefix): return prefix[:-1], query[len(prefix):]
+
+    if query.startswith(('/', './', '../', '(/', '(./')): return 'xpath', query
+
+    st = _st(type)
+    try:
+        _css_cache.get((st, query), lambda: _ctgroup[st]['_csstranslator'].css_to_xpath(query))
+    except (SelectorError, ExpressionError):
+        return 're', query
+    return 'css', query
+
+
+def _split_steps(xpath):
+    """
+    按顶层的 '/' 切分 xpath，忽略 [] () 与引号内的 '/'，'//' 切分出空字符串
+    """
+    steps, depth, quote, start = [], 0, None, 0
+    for i, c in enumerate(xpath):
+        if quote:
+            if c == quote: quote = None
+        elif c in '"\'':
+            quote = c
+        elif c in '[(':
+            depth += 1
+        elif c in '])':
+            depth -= 1
+        elif c == '/' and depth == 0:
+            steps.append(xpath[start:i])
+            start = i + 1
+    steps.append(xpath[start:])
+    return steps
+
+
+class _Field(object):
+    __slots__ = ['key', 'kind', 'query', 'xpath', 'regex']
+
+    def __init__(self, key, kind, query, xpath=None, regex=None):
+        self.key = key
+        self.kind = kind
+        self.query = query
+        self.xpath = xpath
+        self.regex = regex
+
+
+class _Batch(object):
+    """
+    共享前缀的 xpath 字段，前缀只执行一次，再在每个前缀节点上执行相对路径
+    """
+
+    __slots__ = ['prefix', 'fields', 'suffixes']
+
+    def __init__(self, prefix, fields, suffixes):
+        self.prefix = prefix
+        self.fields = fields
+        self.suffixes = suffixes
+
+
+class ExtractionPlan(object):
+    """
+    把字段映射编译一次：区分正则 / css / xpath，预编译正则与 xpath，并合并前缀相同的 xpath，
+    之后 ``run`` 直接在 lxml 树上执行，不再逐页解释映射::
+
+        plan = ExtractionPlan({
+            'title': 'h1::text',
+            'link': '//div[@class="item"]/a/@href',
+            'name': '//div[@class="item"]/a/text()',
+            'price': r'price: (\\d+)',
+        })
+        for item in plan.run(response): ...
+
+    ``first`` 为 True 时返回 dict，每个字段取第一个结果；否则与 ``Selector.xpath_map`` 等一致，
+    按序号把各字段的结果组合为 list of dict。嵌套的 dict 会编译为子 plan。
+    """
+
+    def __init__(self, field_map, first=False, type=None, namespaces=None):
+        self.first = first
+        self.type = st = _st(type)
+        self.namespaces = namespaces
+        self._tostring_method = _ctgroup[st]['_tostring_method']
+
+        self.keys = list(field_map.keys())
+        self._fields = []
+        self._plans = {}
+
+        for key, value in field_map.items():
+            if isinstance(value, dict):
+                self._plans[key] = ExtractionPlan(value, first=first, type=type, namespaces=namespaces)
+            elif isinstance(value, str):
+                self._fields.append(self._compile_field(key, value))
+            else:
+                raise TypeError(f'query not support {value.__class__}: {key}')
+
+        self._batches = self._compile_batches()
+        batched = {f.key for b in self._batches for f in b.fields}
+        self._single = [f for f in self._fields if f.key not in batched]
+        self._has_regex = any(f.kind == 're' for f in self._fields)
+
+    def _compile_field(self, key, query):
+        kind, query = classify_query(query, type=self.type)
+        if kind == 're':
+            return _Field(key, kind, query, regex=re.compile(query))
+
+        xpath = query
+        if kind == 'css':
+            xpath = _css_cache.get((self.type, query), lambda: _ctgroup[self.type]['_csstranslator'].css_to_xpath(query))
+        return _Field(key, kind, query, xpath=self._compile_xpath(xpath))
+
+    def _compile_xpath(self, xpath):
+        try:
+            return compile_xpath(xpath, namespaces=self._namespaces())
+        except etree.XPathError as exc:
+            raise ValueError(u'XPath error: %s in %s' % (exc, xpath))
+
+    def _namespaces(self):
+        namespaces = dict(Selector._default_namespaces)
+        if self.namespaces: namespaces.update(self.namespaces)
+        return namespaces
+
+    def _compile_batches(self):
+        fields = [f for f in self._fields if f.kind == 'xpath' and f.query.startswith('/')]
+        steps = {f.key: _split_steps(f.query) for f in fields}
+
+        counts = {}
+        for f in fields:
+            s = steps.get(f.key)
+            for k in range(1, len(s)):
+                counts[tuple(s[:k])] = counts.get(tuple(s[:k]), 0) + 1
+
+        # 每个字段选择与其他字段共享的最长前缀，前缀须以元素步骤结尾，剩余部分须从子节点开始
+        groups = {}
+        for f in fields:
+            s = steps.get(f.key)
+            for k in range(len(s) - 1, 0, -1):
+                prefix = tuple(s[:k])
+                if counts.get(prefix, 0) < 2 or not s[k] or not prefix[-1]: continue
+                if prefix[-1].startswith('@') or prefix[-1].endswith(')') and '(' in prefix[-1].split('[')[0]: continue
+                groups.setdefault(prefix, []).append((f, './' + '/'.join(s[k:])))
+                break
+
+        batches = []
+        for prefix, members in groups.items():
+            # 前缀不含谓词时单独执行的开销很小，逐节点执行后缀反而更慢
+            if len(members) < 2 or not any('[' in step for step in prefix): continue
+            batches.append(_Batch(
+                self._compile_xpath('/'.join(prefix)),
+                [f for f, _ in members],
+                [self._compile_xpath(suffix) for _, suffix in members],
+            ))
+        return batches
+
+    def run(self, source):
+        """
+        ``source`` 可以是 Response 或 Selector
+        """
+        selector = getattr(source, 'selector', source)
+        # css / xpath 字段在 lxml 树上执行，其他后端无法运行
+        if not getattr(selector, 'supports_xpath', True) and any(f.kind != 're' for f in self._fields):
+            raise TypeError('ExtractionPlan requires the lxml parser, got {}'.format(type(selector).__name__))
+        root = selector.root
+        text = None
+        if self._has_regex:
+            text = source.text if hasattr(source, 'selector') else selector.get()
+
+        results = {}
+        for batch in self._batches:
+            self._run_batch(batch, root, results)
+
+        for field in self._single:
+            if field.kind == 're':
+                results[field.key] = extract_regex(field.regex, text)
+            else:
+                results[field.key] = self._values(field.xpath(root)) if isinstance(root, etree._Element) else []
+
+        for key, plan in self._plans.items():
+            results[key] = plan.run(source)
+
+        return self._combine(results)
+
+    def _run_batch(self, batch, root, results):
+        nodes = batch.prefix(root) if isinstance(root, etree._Element) else []
+        if not all(isinstance(n, etree._Element) for n in nodes) or _is_nested(nodes):
+            # 前缀节点互相嵌套时结果顺序无法保证，退回完整 xpath
+            for field in batch.fields:
+                results[field.key] = self._values(field.xpath(root))
+            return
+
+        for field, suffix in zip(batch.fields, batch.suffixes):
+            values = []
+            for node in nodes:
+                values.extend(self._values(suffix(node)))
+            results[field.key] = values
+
+    def _values(self, result):
+        if type(result) is not list: result = [result]
+
+        values = []
+        for x in result:
+            if isinstance(x, etree._Element):
+                values.append(etree.tostring(x, method=self._tostring_method, encoding='unicode', with_tail=False))
+            elif x is True:
+                values.append(u'1')
+            elif x is False:
+                values.append(u'0')
+            else:
+                values.append(str(x))
+        return values
+
+    def _combine(self, results):
+        if self.first:
+            return {
+                key: results.get(key) if key in self._plans else next(iter(results.get(key)), None)
+                for key in self.keys
+            }
+
+        data = {
+            key: results.get(key) if key in self._plans else [v for v in results.get(key) if v.strip()]
+            for key in self.keys
+        }
+        if not data: return []
+
+        size = len(data.get(self.keys[0]))
+        return [{k: v[i] if i < len(v) else None for k, v in data.items()} for i in range(size)]
+
+    def __repr__(self):
+        fields = ', '.join(f'{f.key}:{f.kind}' for f in self._fields)
+        return f'<{self.__class__.__name__} fields: [{fields}], batches: {len(self._batches)}>'
+
+
+def _is_nested(nodes):
+    if len(nodes) < 2: return False
+    node_set = set(nodes)
+    for node in nodes:
+        for ancestor in node.iterancestors():
+            if ancestor in node_set: return True
+    return False
@@ -1,9 +1,11 @@
 import copy
 import datetime
 import os
+from functools import lru_cache
+from itertools import chain
 import re as _re
+import warnings
 
-import chardet
 import requests.models
 from urllib.parse import urlparse, urlunparse, urljoin
 from urllib3.exceptions import (
@@ -18,10 +20,14 @@ from requests.utils import (
     iter_slices, guess_json_utf
 )
 from requests.status_codes import codes
-from espider.utils.bs4_dammit import UnicodeDammit
-from espider.parser.selector import Selector
+from espider.parser.backends import get_backend
+from espider.parser.links import LinkExtractor
+from espider.parser.normalize import DECODE, FAIL_ENCODING, build_pipeline, normalizations, stage_of
+from espider.parser.selector import Selector, iterparse
+from espider.utils.tools import JsonIndex, search
 from requests.models import HTTPError, REDIRECT_STATI, codes
-from w3lib.encoding import http_content_type_encoding, html_body_declared_encoding
+from w3lib.encoding import http_content_type_encoding
+from espider.utils.encoding import PRESCAN_SIZE, body_declared_encoding, detect_encoding, encoding_memory
 import webbrowser
 
 try:
@@ -29,19 +35,39 @@ try:
 except ImportError:
     import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 DEFAULT_REDIRECT_LIMIT = 30
 CONTENT_CHUNK_SIZE = 10 * 1024
 ITER_CHUNK_SIZE = 512
+ITERPARSE_CHUNK_SIZE = 64 * 1024
+
+# 第一个非空白字符，跳过 utf-8 BOM
+_FIRST_BYTE = _re.compile(rb'(?:\xef\xbb\xbf)?\s*(\S)')
+_UTF8 = ('utf-8', 'utf8', 'utf_8')
+_NOTSET = object()
 
-FAIL_ENCODING = "ISO-8859-1"
+# 兼容旧名称，由 normalize 中注册的 special_character 生成，Response 已不再使用
+SPECIAL_CHARACTER_PATTERNS = [build_pipeline(('special_character',)).regex]
+SPECIAL_CHARACTERS = [pattern.pattern for pattern in SPECIAL_CHARACTER_PATTERNS]
 
-SPECIAL_CHARACTERS = [
-    "[\x00-\x08\x0B\x0C\x0E-\x1F\x7F-\x9F]"
-]
 
-SPECIAL_CHARACTER_PATTERNS = [
-    _re.compile(special_character) for special_character in SPECIAL_CHARACTERS
-]
+@lru_cache(maxsize=256)
+def _compile_bytes(regex, flags=0):
+    if isinstance(regex, _re.Pattern): return regex
+    return _re.compile(regex.encode('utf-8') if isinstance(regex, str) else regex, flags)
+
+
+def raw_callback(func):
+    """
+    标记回调只使用 content（re_bytes、between 等），请求的 normalize 设置不再作用于响应，
+    text 和 selector 只在回调中显式访问时才会构建
+    """
+    func.raw_callback = True
+    return func
 
 
 def _copy_cookie_jar(jar):
@@ -69,7 +95,52 @@ class Response(object):
         'encoding', 'reason', 'cookies', 'elapsed', 'request'
     ]
 
+    # 固定属性放在 slots 中，__dict__ 保留给中间件等设置的自定义属性（request_kwargs、from_cache 等）
+    __slots__ = (
+        '_content', '_content_consumed', '_next', 'status_code', '_headers', 'raw', 'url', '_encoding',
+        'history', 'reason', '_cookies', 'elapsed', 'request', 'cost_time', 'retry_times',
+        '_cached_selector', '_cached_base_url', '_apparent_encoding', '_apparent_checked', '_declared_encoding',
+        '_normalize', '_cached_raw_text', '_cached_text', '_parser', '_cached_json', '_cached_json_index',
+        '__dict__', '__weakref__',
+    )
+
     def __init__(self, resp=None):
+        self._reset()
+
+        # init response content，requests.Response 的 __bool__ 为 ok，不能用真值判断
+        if resp is not None:
+            attr_map = {
+                'status_code': 'status'
+            }
+            if isinstance(resp, requests.models.Response):
+                # 只取需要的属性，不保留 connection 等对象
+                self._content = resp._content
+                self._content_consumed = resp._content_consumed
+                self._next = resp._next
+                self.status_code = resp.status_code
+                self._headers = resp.headers
+                self.raw = resp.raw
+                self.url = resp.url
+                # requests 对没有 charset 的 text/* 默认 ISO-8859-1，只保留 header 中明确声明的编码
+                if resp.encoding and 'charset=' in (resp.headers.get('Content-Type') or '').lower():
+                    self._encoding = resp.encoding
+                self.history = resp.history
+                self.reason = resp.reason
+                self._cookies = resp.cookies
+                self.elapsed = resp.elapsed
+                self.request = resp.request
+
+                # body 已读取，立即释放连接
+                if self._content_consumed: self._release_raw()
+            else:
+                if hasattr(resp, 'text'):
+                    self._content = resp.text.encode('utf-8')
+                    self._encoding = 'utf-8'
+
+                for k, v in attr_map.items():
+                    if hasattr(resp, v): setattr(self, k, resp.__dict__.get(v))
+
+    def _reset(self):
         self._content = False
         self._content_consumed = False
         self._next = None
@@ -77,14 +148,12 @@ class Response(object):
         #: Integer Code of responded HTTP Status, e.g. 404 or 200.
         self.status_code = None
 
-        #: Case-insensitive Dictionary of Response Headers.
-        #: For example, ``headers['content-encoding']`` will return the
-        #: value of a ``'Content-Encoding'`` response header.
-        self.headers = CaseInsensitiveDict()
+        #: Case-insensitive Dictionary of Response Headers, built on first access.
+        self._headers = None
 
         #: File-like object representation of response (for advanced usage).
         #: Use of ``raw`` requires that ``stream=True`` be set on the request.
-        #: This requirement does not apply for use internally to Requests.
+        #: It is released (set to None) as soon as the body has been read.
         self.raw = None
 
         #: Final URL location of Response.
@@ -101,8 +170,8 @@ class Response(object):
         #: Textual reason of responded HTTP Status, e.g. "Not Found" or "OK".
         self.reason = None
 
-        #: A CookieJar of Cookies the server sent back.
-        self.cookies = cookiejar_from_dict({})
+        #: A CookieJar of Cookies the server sent back, built on first access.
+        self._cookies = None
 
         #: The amount of time elapsed between sending the request
         #: and the arrival of the response (as a timedelta).
@@ -122,20 +191,70 @@ class Response(object):
 
         # for selector
         self._cached_selector = None
+        self._cached_base_url = None
 
-        # init response content
-        if resp:
-            attr_map = {
-                'status_code': 'status'
-            }
-            if isinstance(resp, requests.models.Response):
-                self.__dict__.update(resp.__dict__)
-            else:
-                if hasattr(resp, 'text'):
-                    self._content = resp.text.encode(chardet.detect(resp.text.encode())['encoding'], errors='replace')
+        # for encoding
+        self._apparent_encoding = None
+        self._apparent_checked = False
 
-                for k, v in attr_map.items():
-                    if hasattr(resp, v): self.__dict__[k] = resp.__dict__.get(v)
+        # 页面声明的编码，只扫描 body 头部字节，首次需要编码时获取
+        self._declared_encoding = False
+
+        # for text
+        self._normalize = ()
+        self._cached_raw_text = None
+        self._cached_text = None
+
+        # for selector backend
+        self._parser = 'lxml'
+
+        # for json
+        self._cached_json = _NOTSET
+        self._cached_json_index = None
+
+    @property
+    def headers(self):
+        if self._headers is None: self._headers = CaseInsensitiveDict()
+        return self._headers
+
+    @headers.setter
+    def headers(self, val):
+        self._headers = val
+
+    @property
+    def cookies(self):
+        if self._cookies is None: self._cookies = cookiejar_from_dict({})
+        return self._cookies
+
+    @cookies.setter
+    def cookies(self, val):
+        self._cookies = val
+
+    def copy(self):
+        """
+        浅拷贝，共享 content 等数据，用于合并请求时各自回调
+        """
+        response = self.__class__.__new__(self.__class__)
+        for name in Response.__slots__:
+            if name not in ('__dict__', '__weakref__'): setattr(response, name, getattr(self, name))
+        response.__dict__.update(self.__dict__)
+        return response
+
+    def release(self):
+        """
+        释放解析结果（selector 树、text、json），保留 content，之后访问时重新构建
+        回调结束后由下载器调用，避免回调中保留 response 的引用时整棵树无法回收
+        """
+        self._cached_selector = None
+        self._cached_raw_text = None
+        self._cached_text = None
+        self._cached_json = _NOTSET
+        self._cached_json_index = None
+
+    def _release_raw(self):
+        raw, self.raw = self.raw, None
+        release_conn = getattr(raw, 'release_conn', None)
+        if release_conn is not None: release_conn()
 
     def __enter__(self):
         return self
@@ -152,6 +271,7 @@ class Response(object):
         return {attr: getattr(self, attr, None) for attr in self.__attrs__}
 
     def __setstate__(self, state):
+        self._reset()
         for name, value in state.items():
             setattr(self, name, value)
 
@@ -220,8 +340,31 @@ class Response(object):
 
     @property
     def apparent_encoding(self):
-        """The apparent encoding, provided by the chardet library."""
-        return chardet.detect(self.content)['encoding']
+        """The apparent encoding, guessed from a bounded sample of the content.
+
+        The result is remembered per host, so later pages from the same site
+        skip detection until decoding with it produces replacement characters.
+        """
+        if self._apparent_encoding is None:
+            host = urlparse(self.url).netloc if self.url else None
+            encoding = encoding_memory.get(host)
+            if not encoding:
+                encoding = detect_encoding(self.content)
+                encoding_memory.remember(host, encoding)
+            self._apparent_encoding = encoding
+        return self._apparent_encoding
+
+    def _redetect_encoding(self):
+        """
+        样本或缓存的编码解码出错时，检测全文并更新该 host 的记录
+        """
+        host = urlparse(self.url).netloc if self.url else None
+        encoding_memory.forget(host)
+        encoding = detect_encoding(self.content, sample_size=None)
+        encoding_memory.remember(host, encoding)
+        self._apparent_encoding = encoding
+        self._apparent_checked = True
+        return encoding
 
     def iter_content(self, chunk_size=1, decode_unicode=False):
         """Iterates over the response data.  When stream=True is set on the
@@ -261,6 +404,8 @@ class Response(object):
                     yield chunk
 
             self._content_consumed = True
+            # body 读取完毕，释放连接
+            self._release_raw()
 
         if self._content_consumed and isinstance(self._content, bool):
             raise StreamConsumedError()
@@ -327,7 +472,41 @@ class Response(object):
         self._encoding = val
 
     def __clear_cache(self):
-        self.__dict__["_cached_selector"] = None
+        self.release()
+        self._cached_base_url = None
+
+    @property
+    def normalize(self):
+        """
+        访问 text 时执行的归一化，取值为已注册归一化的子集（见 ``normalize.normalizations``），True 表示全部
+        """
+        return self._normalize
+
+    @normalize.setter
+    def normalize(self, val):
+        if val is True: val = normalizations()
+        val = tuple(val or ())
+        stages = {stage_of(name) for name in val + self._normalize}
+
+        if val != self._normalize:
+            self._cached_selector = None
+            self._cached_text = None
+            # 解码阶段的归一化会改变 raw_text
+            if DECODE in stages: self._cached_raw_text = None
+        self._normalize = val
+
+    @property
+    def parser(self):
+        """
+        构建 selector 使用的解析后端，见 ``backends``，默认 lxml
+        """
+        return self._parser
+
+    @parser.setter
+    def parser(self, val):
+        val = get_backend(val).name
+        if val != self._parser: self._cached_selector = None
+        self._parser = val
 
     def _headers_encoding(self):
         """
@@ -347,8 +526,9 @@ class Response(object):
         """
         从html xml等获取<meta charset="编码">
         """
-
-        return html_body_declared_encoding(self.content)
+        if self._declared_encoding is False:
+            self._declared_encoding = body_declared_encoding(self.content)
+        return self._declared_encoding
 
     @property
     def content(self):
@@ -370,40 +550,63 @@ class Response(object):
         # since we exhausted the data.
         return self._content
 
+    @property
+    def raw_text(self):
+        """Content of the response, in unicode, without text normalizations.
+
+        If Response.encoding is None, encoding will be guessed, see
+        ``apparent_encoding``. The decoded text is cached until ``encoding`` is set.
+        """
+        if self._cached_raw_text is None:
+            self._cached_raw_text = self._decode()
+        return self._cached_raw_text
+
     @property
     def text(self):
         """Content of the response, in unicode.
 
-        If Response.encoding is None, encoding will be guessed using
-        ``chardet``.
-
-        The encoding of the response content is determined based solely on HTTP
-        headers, following RFC 2616 to the letter. If you can take advantage of
-        non-HTTP knowledge to make a better guess at the encoding, you should
-        set ``r.encoding`` appropriately before accessing this property.
+        Same as ``raw_text`` unless text normalizations are enabled through
+        ``Response.normalize`` (per spider with the ``normalize`` request
+        setting), in which case they run in a single pass on first access and
+        the result is cached. Links are never rewritten here, see ``selector``.
         """
+        pipeline = build_pipeline(self._normalize)
+        if pipeline is None: return self.raw_text
+
+        if self._cached_text is None:
+            # 只保留归一化后的文本，raw_text 在单独访问时再解码
+            content = self._cached_raw_text
+            self._cached_text = pipeline(self._decode() if content is None else content)
 
-        # Try charset from content-type
+        return self._cached_text
+
+    def _text_encoding(self):
+        """
+        解码使用的编码，开启 fail_encoding 时，header 缺省的 ISO-8859-1 改用页面声明或检测的编码
+        """
         encoding = self.encoding
+        if encoding is None: return self.apparent_encoding
+
+        if 'fail_encoding' in self._normalize and encoding.upper() == FAIL_ENCODING:
+            encoding = self._body_declared_encoding() or self.apparent_encoding or encoding
+        return encoding
 
+    def _decode(self):
         if not self.content:
             return str('')
 
-        # Fallback to auto-detected encoding.
-        if self.encoding is None:
-            encoding = self.apparent_encoding
+        # Try charset from content-type, fallback to auto-detected encoding.
+        encoding = self._text_encoding()
 
         # Decode unicode from given encoding.
         try:
             content = str(self.content, encoding, errors='replace')
-            # 补全链接
-            content = self._absolute_links(content)
-            # 删除特殊字符
-            content = self._del_special_character(content)
-            # 编码矫正
-            if self.encoding and self.encoding.upper() == FAIL_ENCODING:
-                content = self._get_unicode_html(content)
 
+            # 猜测的编码解码出现替换字符时，重新检测全文
+            if self.encoding is None and not self._apparent_checked and '\ufffd' in content:
+                redetected = self._redetect_encoding()
+                if redetected and redetected != encoding:
+                    content = str(self.content, redetected, errors='replace')
         except (LookupError, TypeError):
             # A LookupError is raised if the encoding was not found which could
             # indicate a misspelling or similar mistake.
@@ -418,9 +621,26 @@ class Response(object):
     def json(self, **kwargs):
         r"""Returns the json-encoded content of a response, if any.
 
+        Without ``kwargs`` the body is parsed once (with ``orjson`` if installed)
+        and the same object is returned on every call.
+
         :param \*\*kwargs: Optional arguments that ``json.loads`` takes.
         :raises ValueError: If the response body does not contain valid json.
         """
+        if kwargs: return self._loads_json(**kwargs)
+
+        if self._cached_json is _NOTSET: self._cached_json = self._loads_json()
+        return self._cached_json
+
+    def _loads_json(self, **kwargs):
+        if orjson is not None and not kwargs and (self.encoding or 'utf-8').lower() in _UTF8:
+            content = self.content or b''
+            if content.startswith(b'\xef\xbb\xbf'): content = content[3:]
+            try:
+                return orjson.loads(content)
+            except orjson.JSONDecodeError:
+                # 非 utf-8 等情况交给下面处理
+                pass
 
         if not self.encoding and self.content and len(self.content) > 3:
             # No encoding set. JSON RFC 4627 section 3 states we should expect
@@ -490,15 +710,16 @@ class Response(object):
 
         *Note: Should not normally need to be called explicitly.*
         """
+        if self.raw is None: return
+
         if not self._content_consumed:
             self.raw.close()
 
-        release_conn = getattr(self.raw, 'release_conn', None)
-        if release_conn is not None:
-            release_conn()
+        self._release_raw()
 
-    def _make_absolute(self, link):
+    def _make_absolute(self, link, base_url=None):
         """Makes a given link absolute."""
+        base_url = base_url or self.url
         try:
 
             link = link.strip()
@@ -508,11 +729,11 @@ class Response(object):
 
             # If link is relative, then join it with base_url.
             if not parsed["netloc"]:
-                return urljoin(self.url, link)
+                return urljoin(base_url, link)
 
             # Link is absolute; if it lacks a scheme, add one from base_url.
             if not parsed["scheme"]:
-                parsed["scheme"] = urlparse(self.url).scheme
+                parsed["scheme"] = urlparse(base_url).scheme
 
                 # Reconstruct the URL to incorporate the new scheme.
                 parsed = (v for v in parsed.values())
@@ -528,49 +749,40 @@ class Response(object):
         # Link is absolute and complete with scheme; nothing to be done here.
         return link
 
-    def _absolute_links(self, text):
-        regexs = [
-            r'(<(?i)a.*?href\s*?=\s*?["\'])(.+?)(["\'])',  # a
-            r'(<(?i)img.*?src\s*?=\s*?["\'])(.+?)(["\'])',  # img
-            r'(<(?i)link.*?href\s*?=\s*?["\'])(.+?)(["\'])',  # css
-            r'(<(?i)script.*?src\s*?=\s*?["\'])(.+?)(["\'])',  # js
-        ]
+    def urljoin(self, link):
+        """
+        以页面基准 url（含 <base href>）补全链接
+        """
+        return self._make_absolute(link, base_url=self.base_url)
 
-        for regex in regexs:
-            def replace_href(text):
-                # html = text.group(0)
-                link = text.group(2)
-                absolute_link = self._make_absolute(link)
+    @property
+    def base_url(self):
+        if self._cached_base_url is None:
+            self.selector
+        return self._cached_base_url
 
-                # return re.sub(regex, r'\1{}\3'.format(absolute_link), html) # 使用正则替换，个别字符不支持。如该网址源代码http://permit.mep.gov.cn/permitExt/syssb/xxgk/xxgk!showImage.action?dataid=0b092f8115ff45c5a50947cdea537726
-                return text.group(1) + absolute_link + text.group(3)
+    def _make_links_absolute(self, root):
+        """
+        在 lxml 树上一次性补全 a/img/link/script 等全部链接
+        """
+        if not hasattr(root, 'rewrite_links'): return
+        base_url = self._cached_base_url
 
-            text = _re.sub(regex, replace_href, text, flags=_re.S)
+        def link_repl(href):
+            try:
+                return urljoin(base_url, href)
+            except ValueError:
+                # 无法解析的链接保持原样
+                return href
 
-        return text
+        # make_links_absolute 内部的 rewrite_links 会再次处理 <base href>，且不忽略错误链接
+        root.rewrite_links(link_repl, resolve_base_href=False)
 
     def _del_special_character(self, text):
         """
         删除特殊字符
         """
-        for special_character_pattern in SPECIAL_CHARACTER_PATTERNS:
-            text = special_character_pattern.sub("", text)
-
-        return text
-
-    def _get_unicode_html(self, html):
-        if not html or not isinstance(html, bytes):
-            return html
-
-        converted = UnicodeDammit(html, is_html=True)
-        if not converted.unicode_markup:
-            raise Exception(
-                "Failed to detect encoding of article HTML, tried: %s"
-                % ", ".join(converted.tried_encodings)
-            )
-
-        html = converted.unicode_markup
-        return html
+        return build_pipeline(('special_character',))(text)
 
     @property
     def to_dict(self):
@@ -586,26 +798,96 @@ class Response(object):
 
         return response_dict
 
+    def _sniff(self):
+        # (第一个非空白字节, 小写的 Content-Type)
+        match = _FIRST_BYTE.match(self.content or b'')
+        content_type = (self.headers.get('Content-Type') or '').lower()
+        return match.group(1) if match else None, content_type
+
     @property
-    def is_html(self):
+    def is_json(self):
+        """
+        body 以 { 或 [ 开头，Content-Type 声明为 json（或没有 Content-Type）时不解析 body，
+        Content-Type 不一致时（很多接口返回 text/html、text/plain）以 body 能否解析为准
+        """
+        first, content_type = self._sniff()
+        if first not in (b'{', b'['): return False
+        if not content_type or 'json' in content_type: return True
+
         try:
             self.json()
-        except:
+        except ValueError:
             return False
         else:
             return True
 
+    @property
+    def is_html(self):
+        """
+        已废弃，与 is_json 相同（旧名称，body 为 json 时返回 True）
+        """
+        warnings.warn('Response.is_html is deprecated, use Response.is_json', DeprecationWarning, stacklevel=2)
+        return self.is_json
+
     @property
     def selector(self):
         if self._cached_selector is None:
-            self._cached_selector = Selector(self.text)
+            backend = get_backend(self._parser)
+            if build_pipeline(self._normalize) is not None:
+                # 需要文本归一化时基于 text 构建
+                selector = backend.create(text=self.text, base_url=self.url)
+            else:
+                # 直接从 bytes 解析，避免 decode / encode 往返
+                selector = backend.create(body=self.content or b'', encoding=self._text_encoding(), base_url=self.url)
+
+            if isinstance(selector, Selector):
+                base_href = selector.root.xpath('head/base/@href') if hasattr(selector.root, 'xpath') else None
+            else:
+                base_href = selector.css('head base::attr(href)').getall()
+            self._cached_base_url = urljoin(self.url or '', base_href[0].strip()) if base_href else self.url
+
+            # 补全链接
+            if 'absolute_links' in self._normalize:
+                if isinstance(selector, Selector):
+                    self._make_links_absolute(selector.root)
+                    selector.changed()
+                else:
+                    selector.make_links_absolute(self._cached_base_url)
+
+            self._cached_selector = selector
         return self._cached_selector
 
+    @property
+    def json_index(self):
+        """
+        json 数据的 key 索引，首次访问时建立，见 ``tools.JsonIndex``
+        """
+        if self._cached_json_index is None: self._cached_json_index = JsonIndex(self.json())
+        return self._cached_json_index
+
+    def extract_links(self, link_extractor=None, **kwargs):
+        """
+        提取页面中的链接，返回绝对链接的列表，参数见 ``links.LinkExtractor``
+        """
+        if link_extractor is None: link_extractor = LinkExtractor(**kwargs)
+        return link_extractor.extract_links(self)
+
     def find(self, key, data=None, target_type=None):
-        return self.selector.find(key=key, data=data, target_type=target_type)
+        if data is not None: return search(key, data=data, target_type=target_type)
+        return self.json_index.search(key, target_type=target_type)
 
     def find_map(self, map, data=None, target_type=None, **kwargs):
-        return self.selector.find_map(map, data=data, target_type=target_type, **kwargs)
+        return {
+            k: self.find_map(v, data=data, target_type=target_type) if isinstance(v, dict)
+            else self.find(v, data=data, target_type=target_type)
+            for k, v in map.items()
+        }
+
+    def query(self, path):
+        """
+        JSONPath 查询，见 ``tools.JsonIndex.query``
+        """
+        return self.json_index.query(path)
 
     def css(self, query):
         return self.selector.css(query)
@@ -640,6 +922,70 @@ class Response(object):
     def query_from_map(self, map: dict, **kwargs):
         return self.selector.query_from_map(map, **kwargs)
 
+    def re_bytes(self, regex, flags=0):
+        """
+        在 content 上执行正则，返回 bytes 结果列表，不解码也不解析 html
+        regex 为 str 时按 utf-8 编码
+        """
+        return _compile_bytes(regex, flags).findall(self.content or b'')
+
+    def re_bytes_first(self, regex, default=None, flags=0):
+        match = _compile_bytes(regex, flags).search(self.content or b'')
+        if not match: return default
+        return match.group(1) if match.re.groups else match.group()
+
+    def between(self, start, end, default=None, view=False):
+        """
+        content 中第一个 start 与其后第一个 end 之间的 bytes，找不到时返回 default
+        view 为 True 时返回 memoryview，不复制数据
+        """
+        result = next(self._iter_between(start, end, view), None)
+        return default if result is None else result
+
+    def between_all(self, start, end, view=False):
+        return list(self._iter_between(start, end, view))
+
+    def _iter_between(self, start, end, view):
+        content = self.content or b''
+        if isinstance(start, str): start = start.encode('utf-8')
+        if isinstance(end, str): end = end.encode('utf-8')
+        # 空标记每次都匹配在同一位置，无法前进
+        if not start or not end: raise ValueError('start and end must not be empty')
+        data = memoryview(content) if view else content
+
+        pos = 0
+        while True:
+            i = content.find(start, pos)
+            if i < 0: return
+            i += len(start)
+            j = content.find(end, i)
+            if j < 0: return
+            yield data[i:j]
+            pos = j + len(end)
+
+    def iterparse(self, tag, type=None, namespaces=None, chunk_size=ITERPARSE_CHUNK_SIZE):
+        """
+        流式解析，边读取 body 边返回匹配 tag 的节点，见 ``selector.iterparse``
+        请求时设置 stream=True 才能在下载过程中解析，否则基于已读取的 content 分块解析
+        type 默认根据 Content-Type 判断 xml / html
+        """
+        content_type = self.headers.get('Content-Type') or ''
+        if type is None: type = 'xml' if 'xml' in content_type else 'html'
+
+        chunks = self.iter_content(chunk_size)
+        encoding = self._encoding or http_content_type_encoding(content_type)
+        if not encoding and type == 'html':
+            # html 从头部字节中获取编码
+            head = []
+            for chunk in chunks:
+                head.append(chunk)
+                if sum(map(len, head)) >= PRESCAN_SIZE: break
+            first = b''.join(head)
+            encoding = body_declared_encoding(first) or detect_encoding(first)
+            chunks = chain((first,), chunks)
+
+        return iterparse(chunks, tag, type=type, encoding=encoding, namespaces=namespaces, base_url=self.url)
+
     def open(self, path=None, save=False):
         self.save_html(path)
         if not path: path = 'index.html'
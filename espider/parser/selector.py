@@ -2,7 +2,10 @@
 XPath selectors based on lxml
 """
 
+import codecs
 import sys
+import threading
+from collections import OrderedDict
 
 import six
 from lxml import etree, html
@@ -10,7 +13,7 @@ from lxml import etree, html
 from parsel.utils import flatten, iflatten, extract_regex, shorten
 from parsel.csstranslator import HTMLTranslator, GenericTranslator
 
-from espider.utils.tools import search
+from espider.utils.tools import RegexMap, compile_regex_map, search
 
 
 class CannotRemoveElementWithoutRoot(Exception):
@@ -37,6 +40,104 @@ _ctgroup = {
 }
 
 
+class QueryCache(object):
+    """
+    进程级 LRU 缓存，所有 Selector 共享，用于缓存 css → xpath 的转换结果和编译后的 xpath（见 ``PooledXPath``）
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, factory):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        # 编译失败时异常直接抛出，不缓存
+        value = factory()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+
+_css_cache = QueryCache()
+_xpath_cache = QueryCache()
+
+
+def query_cache_info():
+    """
+    css 转换缓存与 xpath 编译缓存的命中统计
+    """
+    return {'css': _css_cache.info(), 'xpath': _xpath_cache.info()}
+
+
+def query_cache_clear():
+    _css_cache.clear()
+    _xpath_cache.clear()
+
+
+class PooledXPath(object):
+    """
+    可在多线程中共享的 etree.XPath
+
+    lxml 对同一个 XPath 对象的调用加锁串行执行，这里每次调用从空闲列表取一个编译好的对象，
+    用完放回，没有空闲对象时再编译一个，编译次数最多为同时执行的线程数
+    """
+
+    __slots__ = ['path', 'namespaces', 'smart_strings', '_free']
+
+    def __init__(self, path, namespaces=None, smart_strings=False):
+        self.path = path
+        self.namespaces = dict(namespaces) if namespaces else None
+        self.smart_strings = smart_strings
+        # 创建时编译一次，表达式错误时直接抛出
+        self._free = [self._compile()]
+
+    def _compile(self):
+        return etree.XPath(self.path, namespaces=self.namespaces, smart_strings=self.smart_strings)
+
+    def __call__(self, root, **kwargs):
+        # list 的 pop / append 在 GIL 下是原子操作
+        try:
+            evaluator = self._free.pop()
+        except IndexError:
+            evaluator = self._compile()
+        try:
+            return evaluator(root, **kwargs)
+        finally:
+            self._free.append(evaluator)
+
+    def __repr__(self):
+        return '<%s %r>' % (type(self).__name__, self.path)
+
+
+def compile_xpath(query, namespaces=None, smart_strings=False):
+    """
+    从缓存获取编译后的 xpath（``PooledXPath``），key 为 query 与 namespaces
+    """
+    key = (query, tuple(sorted(namespaces.items())) if namespaces else (), smart_strings)
+    return _xpath_cache.get(key, lambda: PooledXPath(query, namespaces=namespaces, smart_strings=smart_strings))
+
+
 def _st(st):
     if st is None:
         return 'html'
@@ -46,11 +147,22 @@ def _st(st):
         raise ValueError('Invalid type: %s' % st)
 
 
-def create_root_node(text, parser_cls, base_url=None):
+def create_root_node(text, parser_cls, base_url=None, encoding=None):
     """Create root node for text using given parser class.
+
+    ``text`` may also be the raw ``bytes`` of the document in ``encoding``,
+    which are handed to the lxml parser without a decode/encode round-trip.
     """
-    body = text.strip().replace('\x00', '').encode('utf8') or b'<html/>'
-    parser = parser_cls(recover=True, encoding='utf8')
+    if isinstance(text, bytes):
+        body = text.lstrip()
+        # utf-16/32 中 \x00 为正常字节
+        if b'\x00' in body and not (encoding or '').lower().startswith(('utf-16', 'utf-32', 'utf_16', 'utf_32')):
+            body = body.replace(b'\x00', b'')
+        body = body or b'<html/>'
+        parser = parser_cls(recover=True, encoding=encoding)
+    else:
+        body = text.strip().replace('\x00', '').encode('utf8') or b'<html/>'
+        parser = parser_cls(recover=True, encoding='utf8')
     root = etree.fromstring(body, parser=parser, base_url=base_url)
     if root is None:
         root = etree.fromstring(b'<html/>', parser=parser, base_url=base_url)
@@ -92,7 +204,24 @@ class SelectorList(list):
 
             selector.xpath('//a[href=$url]', url="http://www.example.com")
         """
-        return self.__class__(flatten([x.xpath(xpath, namespaces=namespaces, **kwargs) for x in self]))
+        result = self.__class__()
+        for x in self:
+            result.extend(x.xpath(xpath, namespaces=namespaces, **kwargs))
+        return result
+
+    def xpath_values(self, xpath, namespaces=None, **kwargs):
+        """
+        Call the ``.xpath_values()`` method for each element in this list and
+        return their results joined in one :class:`ValueList`.
+        """
+        result = None
+        for x in self:
+            values = x.xpath_values(xpath, namespaces=namespaces, **kwargs)
+            if result is None:
+                result = values
+            else:
+                result.extend(list.__iter__(values))
+        return result if result is not None else ValueList()
 
     def css(self, query):
         """
@@ -101,7 +230,24 @@ class SelectorList(list):
 
         ``query`` is the same argument as the one in :meth:`Selector.css`
         """
-        return self.__class__(flatten([x.css(query) for x in self]))
+        result = self.__class__()
+        for x in self:
+            result.extend(x.css(query))
+        return result
+
+    def css_values(self, query):
+        """
+        Call the ``.css_values()`` method for each element in this list and
+        return their results joined in one :class:`ValueList`.
+        """
+        result = None
+        for x in self:
+            values = x.css_values(query)
+            if result is None:
+                result = values
+            else:
+                result.extend(list.__iter__(values))
+        return result if result is not None else ValueList()
 
     def re(self, regex, replace_entities=True):
         """
@@ -168,6 +314,76 @@ class SelectorList(list):
             x.remove()
 
 
+class ValueList(list):
+    """
+    Raw results of :meth:`Selector.xpath_values`. Text and attribute results
+    are plain strings; element results are kept as lxml nodes and only wrapped
+    in a :class:`Selector` (sharing the parent's namespaces) when accessed.
+    ``getall()`` / ``get()`` serialize without creating any Selector.
+    """
+
+    def __init__(self, values=(), namespaces=None, type=None, expr=None, doc=None):
+        super(ValueList, self).__init__(values)
+        self.namespaces = namespaces
+        self.type = type
+        self.expr = expr
+        self.doc = doc
+
+    def _wrap(self, value):
+        if isinstance(value, etree._Element):
+            return Selector._from_result(value, self.expr, self.namespaces, self.type, self.doc)
+        return value
+
+    def __getitem__(self, pos):
+        o = super(ValueList, self).__getitem__(pos)
+        if isinstance(pos, slice):
+            return self.__class__(o, namespaces=self.namespaces, type=self.type, expr=self.expr, doc=self.doc)
+        return self._wrap(o)
+
+    def __iter__(self):
+        for value in super(ValueList, self).__iter__():
+            yield self._wrap(value)
+
+    def getall(self):
+        method = _ctgroup[self.type or 'html']['_tostring_method']
+        return [_serialize(x, method) for x in super(ValueList, self).__iter__()]
+
+    extract = getall
+
+    def get(self, default=None):
+        for x in super(ValueList, self).__iter__():
+            return _serialize(x, _ctgroup[self.type or 'html']['_tostring_method'])
+        return default
+
+    extract_first = get
+
+
+def _serialize(value, method):
+    if isinstance(value, etree._Element):
+        return etree.tostring(value, method=method, encoding='unicode', with_tail=False)
+    if value is True:
+        return u'1'
+    if value is False:
+        return u'0'
+    return six.text_type(value)
+
+
+class _Document(object):
+    """
+    同一棵树上所有 Selector 共享的状态，树被修改时 generation 加一，序列化缓存随之失效
+    """
+    __slots__ = ('generation', 'source')
+
+    def __init__(self, source=None):
+        self.generation = 0
+        # 原始文本，str 或 (bytes, encoding)，树未修改时根节点可直接复用
+        self.source = source
+
+    def changed(self):
+        self.generation += 1
+        self.source = None
+
+
 class Selector(object):
     """
     :class:`Selector` allows you to select parts of an XML or HTML text using CSS
@@ -175,6 +391,9 @@ class Selector(object):
 
     ``text`` is a ``unicode`` object in Python 2 or a ``str`` object in Python 3
 
+    ``body`` is the raw ``bytes`` of the document, parsed directly with the given
+    ``encoding`` (falls back to decoding in Python if lxml doesn't know it).
+
     ``type`` defines the selector type, it can be ``"html"``, ``"xml"`` or ``None`` (default).
     If ``type`` is ``None``, the selector defaults to ``"html"``.
 
@@ -182,7 +401,7 @@ class Selector(object):
     See [`lxml` documentation](https://lxml.de/api/index.html) ``lxml.etree.fromstring`` for more information.
     """
 
-    __slots__ = ['text', 'namespaces', 'type', '_expr', 'root',
+    __slots__ = ['text', 'namespaces', 'type', '_expr', 'root', '_doc', '_serialized',
                  '__weakref__', '_parser', '_csstranslator', '_tostring_method']
 
     _default_type = None
@@ -201,7 +420,7 @@ class Selector(object):
     selectorlist_cls = SelectorList
 
     def __init__(self, text=None, type=None, namespaces=None, root=None,
-                 base_url=None, _expr=None):
+                 base_url=None, _expr=None, body=None, encoding=None):
         self.type = st = _st(type or self._default_type)
         self._parser = _ctgroup[st]['_parser']
         self._csstranslator = _ctgroup[st]['_csstranslator']
@@ -213,23 +432,59 @@ class Selector(object):
                     six.text_type, text.__class__)
                 raise TypeError(msg)
             root = self._get_root(text, base_url)
+            source = text
+        elif body is not None:
+            if not isinstance(body, bytes):
+                raise TypeError("body argument should be of type bytes, got %s" % body.__class__)
+            try:
+                root = self._get_root(body, base_url, encoding=encoding)
+                source = (body, encoding)
+            except LookupError:
+                # libxml2 不支持的编码由 python 解码，python 也不支持时与 Response.text 一样按 utf-8 解码
+                try:
+                    source = body.decode(encoding or 'utf8', errors='replace')
+                except LookupError:
+                    source = body.decode('utf8', errors='replace')
+                root = self._get_root(source, base_url)
         elif root is None:
             raise ValueError("Selector needs either text or root argument")
+        else:
+            source = None
 
         self.namespaces = dict(self._default_namespaces)
         if namespaces is not None:
             self.namespaces.update(namespaces)
         self.root = root
         self._expr = _expr
+        self._doc = _Document(source)
+        self._serialized = None
+
+    @classmethod
+    def _from_result(cls, root, expr, namespaces, type, doc):
+        """
+        为 xpath 结果节点创建 Selector，跳过 __init__，与父节点共享 namespaces（register_namespace 时复制）
+        """
+        selector = cls.__new__(cls)
+        group = _ctgroup[type]
+        selector.type = type
+        selector._parser = group['_parser']
+        selector._csstranslator = group['_csstranslator']
+        selector._tostring_method = group['_tostring_method']
+        selector.namespaces = namespaces
+        selector.root = root
+        selector._expr = expr
+        selector._doc = doc
+        selector._serialized = None
+        return selector
 
     def __getstate__(self):
         raise TypeError("can't pickle Selector objects")
 
-    def _get_root(self, text, base_url=None):
-        return create_root_node(text, self._parser, base_url=base_url)
+    def _get_root(self, text, base_url=None, encoding=None):
+        return create_root_node(text, self._parser, base_url=base_url, encoding=encoding)
 
     def find(self, key, data=None, target_type=None):
-        return search(key=key, data=data or self.get(), target_type=target_type)
+        return search(key=key, data=data or self._text(), target_type=target_type)
 
     def find_map(self, map, data=None, target_type=None, **kwargs):
         return self._query_from_map(self.find, map, data=data, target_type=target_type, **kwargs)
@@ -252,31 +507,41 @@ class Selector(object):
 
             selector.xpath('//a[href=$url]', url="http://www.example.com")
         """
-        try:
-            xpathev = self.root.xpath
-        except AttributeError:
+        if not isinstance(self.root, etree._Element):
             return self.selectorlist_cls([])
 
-        nsp = dict(self.namespaces)
-        if namespaces is not None:
-            nsp.update(namespaces)
+        from_result = self._from_result
+        nsp, st, doc = self.namespaces, self.type, self._doc
+        return self.selectorlist_cls(
+            [from_result(x, query, nsp, st, doc) for x in self._xpath(query, namespaces=namespaces, **kwargs)]
+        )
+
+    def xpath_values(self, query, namespaces=None, **kwargs):
+        """
+        Same as :meth:`xpath`, but return a :class:`ValueList`: text and
+        attribute results are plain strings, element results are wrapped in a
+        :class:`Selector` only when accessed. Use it when extracting many
+        values, e.g. all cells of a large table.
+        """
+        if not isinstance(self.root, etree._Element):
+            return ValueList(namespaces=self.namespaces, type=self.type, expr=query, doc=self._doc)
+
+        return ValueList(self._xpath(query, namespaces=namespaces, **kwargs),
+                         namespaces=self.namespaces, type=self.type, expr=query, doc=self._doc)
+
+    def _xpath(self, query, namespaces=None, **kwargs):
+        nsp = self.namespaces
+        if namespaces is not None and namespaces is not nsp:
+            nsp = dict(nsp, **namespaces)
         try:
-            result = xpathev(query, namespaces=nsp,
-                             smart_strings=self._lxml_smart_strings,
-                             **kwargs)
+            xpathev = compile_xpath(query, namespaces=nsp, smart_strings=self._lxml_smart_strings)
+            result = xpathev(self.root, **kwargs)
         except etree.XPathError as exc:
             msg = u"XPath error: %s in %s" % (exc, query)
             msg = msg if six.PY3 else msg.encode('unicode_escape')
             six.reraise(ValueError, ValueError(msg), sys.exc_info()[2])
 
-        if type(result) is not list:
-            result = [result]
-
-        result = [self.__class__(root=x, _expr=query,
-                                 namespaces=self.namespaces,
-                                 type=self.type)
-                  for x in result]
-        return self.selectorlist_cls(result)
+        return result if type(result) is list else [result]
 
     def xpath_map(self, query_map, namespaces=None, **kwargs):
         return self._query_from_map(self.xpath, query_map, namespaces=namespaces, **kwargs)
@@ -294,11 +559,17 @@ class Selector(object):
         """
         return self.xpath(self._css2xpath(query))
 
+    def css_values(self, query):
+        """
+        Same as :meth:`css`, but return a :class:`ValueList`, see :meth:`xpath_values`.
+        """
+        return self.xpath_values(self._css2xpath(query))
+
     def css_map(self, query_map):
         return self._query_from_map(self.css, query_map)
 
     def _css2xpath(self, query):
-        return self._csstranslator.css_to_xpath(query)
+        return _css_cache.get((self.type, query), lambda: self._csstranslator.css_to_xpath(query))
 
     def re(self, regex, replace_entities=True):
         """
@@ -313,10 +584,26 @@ class Selector(object):
         Passing ``replace_entities`` as ``False`` switches off these
         replacements.
         """
-        return extract_regex(regex, self.get(), replace_entities=replace_entities)
+        return extract_regex(regex, self._text(), replace_entities=replace_entities)
 
     def re_map(self, regex_map, replace_entities=True):
-        return self._query_from_map(self.re, regex_map, replace_entities=replace_entities)
+        """
+        Apply every regex of ``regex_map`` (``{key: regex | nested dict}``) and
+        return a dict with the same keys and the :meth:`re` results. Patterns
+        are compiled once and the text is serialized once.
+        """
+        return self._re_map(compile_regex_map(regex_map), replace_entities=replace_entities)
+
+    def _re_map(self, regex_map, first=False, default=None, replace_entities=True):
+        data = {}
+        for key, pattern in regex_map.items():
+            if isinstance(pattern, RegexMap):
+                data[key] = self._re_map(pattern, first=first, default=default, replace_entities=replace_entities)
+            elif first:
+                data[key] = self.re_first(pattern, default=default, replace_entities=replace_entities)
+            else:
+                data[key] = self.re(pattern, replace_entities=replace_entities)
+        return data
 
     def re_first(self, regex, default=None, replace_entities=True):
         """
@@ -332,7 +619,9 @@ class Selector(object):
         return next(iflatten(self.re(regex, replace_entities=replace_entities)), default)
 
     def re_map_first(self, regex_map, default=None, replace_entities=True):
-        return self._query_from_map(self.re_first, regex_map, default=default, replace_entities=replace_entities)
+        return self._re_map(
+            compile_regex_map(regex_map), first=True, default=default, replace_entities=replace_entities
+        )
 
     def query_from_map(self, map: dict, **kwargs):
         data = {}
@@ -379,21 +668,45 @@ class Selector(object):
         Serialize and return the matched nodes in a single unicode string.
         Percent encoded content is unquoted.
         """
-        try:
-            return etree.tostring(self.root,
-                                  method=self._tostring_method,
-                                  encoding='unicode',
-                                  with_tail=False)
-        except (AttributeError, TypeError):
-            if self.root is True:
-                return u'1'
-            elif self.root is False:
-                return u'0'
-            else:
-                return six.text_type(self.root)
+        doc = self._doc
+        cached = self._serialized
+        if cached is not None and cached[0] == doc.generation: return cached[1]
+
+        text = _serialize(self.root, self._tostring_method)
+        self._serialized = (doc.generation, text)
+        return text
 
     extract = get
 
+    def _text(self):
+        """
+        re / find 使用的文本：根节点且树未被修改时直接复用原始文本，否则使用缓存的序列化结果
+        """
+        doc = self._doc
+        source = doc.source
+        if source is None or not self._is_document_root(): return self.get()
+
+        if isinstance(source, tuple):
+            body, encoding = source
+            try:
+                source = body.decode(encoding or 'utf8', errors='replace')
+            except LookupError:
+                source = body.decode('utf8', errors='replace')
+            doc.source = source
+        return source
+
+    def _is_document_root(self):
+        root = self.root
+        return isinstance(root, etree._Element) and root.getparent() is None and self._expr is None
+
+    def changed(self):
+        """
+        Invalidate the cached serialization of every selector on this document.
+        Call it after modifying ``root`` in place (``remove()`` and
+        ``remove_namespaces()`` do it for you).
+        """
+        self._doc.changed()
+
     def getall(self):
         """
         Serialize and return the matched node in a 1-element list of unicode strings.
@@ -403,9 +716,13 @@ class Selector(object):
     def register_namespace(self, prefix, uri):
         """
         Register the given namespace to be used in this :class:`Selector`.
-        Without registering namespaces you can't select or extract data from
-        non-standard namespaces. See :ref:`selector-examples-xml`.
+        Selectors returned by later :meth:`xpath` calls inherit it; selectors
+        created before, and the selector this one was selected from, are not
+        affected. Without registering namespaces you can't select or extract
+        data from non-standard namespaces. See :ref:`selector-examples-xml`.
         """
+        # 子节点与父节点共享 namespaces，写入前复制
+        self.namespaces = dict(self.namespaces)
         self.namespaces[prefix] = uri
 
     def remove_namespaces(self):
@@ -422,6 +739,7 @@ class Selector(object):
                     el.attrib[an.split('}', 1)[1]] = el.attrib.pop(an)
         # remove namespace declarations
         etree.cleanup_namespaces(self.root)
+        self._doc.changed()
 
     def remove(self):
         """
@@ -446,6 +764,7 @@ class Selector(object):
                 "The node you're trying to remove has no parent, "
                 "are you trying to remove a root element?"
             )
+        self._doc.changed()
 
     @property
     def attrib(self):
@@ -468,3 +787,120 @@ class Selector(object):
         return "<%s xpath=%r data=%s>" % (type(self).__name__, self._expr, data)
 
     __repr__ = __str__
+
+
+_pullparsers = {
+    'html': etree.HTMLPullParser,
+    'xml': etree.XMLPullParser,
+}
+
+
+def iterparse(chunks, tag, type=None, encoding=None, namespaces=None, base_url=None):
+    """
+    Incrementally parse the document from an iterable of ``bytes`` (or ``str``)
+    chunks and yield a :class:`Selector` for every element matching ``tag`` as
+    soon as its end tag has been fed.
+
+    ``tag`` is a tag name (namespaces are ignored unless given as ``{uri}name``)
+    or a short path of tag names such as ``"urlset/url"``, which also checks
+    the ancestors of the matched element. A sequence of them matches any.
+
+    Every matched element is cleared, together with its already processed
+    siblings, once the consumer asks for the next one. Elements outside a
+    matching element are cleared as soon as they end, whether they match or
+    not, so memory stays constant whatever the document size (elements nested
+    in an element whose tag matches are kept until that one ends). Extract the
+    data you need inside the loop and do not keep the yielded selectors around.
+    """
+    st = _st(type)
+    names, paths = [], []
+    for path in ([tag] if isinstance(tag, str) else tag):
+        steps = [step for step in path.split('/') if step]
+        if not steps: raise ValueError('Invalid tag: %r' % path)
+        name = steps[-1]
+        names.append(name if name.startswith('{') or name == '*' else '{*}' + name)
+        paths.append((_localname(name), [_localname(step) for step in reversed(steps[:-1])]))
+    # 只有 tag 名时无需检查祖先节点
+    if not any(parents for _, parents in paths): paths = None
+
+    parser_cls = _pullparsers[st]
+    # 不按 tag 过滤事件，未匹配的节点也要释放
+    kwargs = dict(events=('start', 'end'), base_url=base_url, recover=True, huge_tree=True)
+    if st == 'xml': kwargs['resolve_entities'] = False
+
+    decoder = None
+    try:
+        parser = parser_cls(encoding=encoding, **kwargs)
+    except LookupError:
+        # lxml 不支持的编码在 python 中增量解码
+        parser = parser_cls(**kwargs)
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+
+    nsp = dict(Selector._default_namespaces)
+    if namespaces is not None: nsp.update(namespaces)
+    doc = _Document()
+
+    # 未结束的候选节点（tag 匹配）数量，大于 0 时其中的节点需要保留
+    opened = [0]
+
+    def drain():
+        for event, elem in parser.read_events():
+            candidate = _match_tag(elem.tag, names)
+            if event == 'start':
+                if candidate: opened[0] += 1
+                continue
+
+            if candidate:
+                opened[0] -= 1
+                if not paths or _match_path(elem, paths):
+                    yield Selector._from_result(elem, tag, nsp, st, doc)
+            # 嵌套在候选节点中的节点（包括匹配的节点）由外层节点结束时一起释放
+            if opened[0]: continue
+
+            # 释放已处理的节点
+            elem.clear(keep_tail=True)
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+    for chunk in chunks:
+        if not chunk: continue
+        if decoder is not None: chunk = decoder.decode(chunk)
+        parser.feed(chunk)
+        yield from drain()
+
+    if decoder is not None: parser.feed(decoder.decode(b'', final=True))
+    try:
+        parser.close()
+    except etree.XMLSyntaxError:
+        # 空文档
+        pass
+    yield from drain()
+
+
+def _localname(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _match_tag(tag, names):
+    if not isinstance(tag, str): return False
+    for name in names:
+        if name == '*' or name == tag: return True
+        if name.startswith('{*}') and _localname(tag) == name[3:]: return True
+    return False
+
+
+def _match_path(elem, paths):
+    name = _localname(elem.tag)
+    for last, parents in paths:
+        if (last == '*' or last == name) and _match_ancestors(elem, parents): return True
+    return False
+
+
+def _match_ancestors(elem, parents):
+    for name in parents:
+        elem = elem.getparent()
+        if elem is None or not isinstance(elem.tag, str): return False
+        if name != '*' and _localname(elem.tag) != name: return False
+    return True
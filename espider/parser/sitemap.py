@@ -0,0 +1,178 @@
+"""
+流式解析 sitemap / sitemap index / RSS / Atom，支持 gzip，不把整个文档读入内存
+"""
+
+import codecs
+import re
+import zlib
+from urllib.parse import urljoin, urlsplit
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from itertools import chain
+
+from espider.parser.selector import iterparse, _localname
+
+SITEMAP_CHUNK_SIZE = 64 * 1024
+
+# 匹配的节点，sitemap index 中的 sitemap 为子 sitemap，其余为页面
+SITEMAP_TAGS = ('sitemapindex/sitemap', 'urlset/url', 'channel/item', 'feed/entry')
+
+_GZIP_MAGIC = b'\x1f\x8b'
+_ROBOTS_SITEMAP = re.compile(r'^\s*sitemap\s*:\s*(\S+)', re.I | re.M)
+_W3C_DATE = re.compile(r'^(\d{4})(?:-(\d{2}))?$')
+
+
+def iter_sitemap(chunks, base_url=None, max_size=None):
+    """
+    从 bytes 块中逐条解析 sitemap 条目，返回 dict：
+    loc: 链接，lastmod: datetime 或 None，type: 'sitemap' 子 sitemap / 'url' 页面
+    gzip 压缩和纯文本（每行一个链接）格式自动识别，max_size 限制 gzip 解压后的大小
+    """
+    first, chunks = _head(chunks, len(codecs.BOM_UTF8))
+    if not first: return
+
+    if first.startswith(_GZIP_MAGIC):
+        first, chunks = _head(gunzip(chain((first,), chunks), max_size=max_size), len(codecs.BOM_UTF8))
+
+    # 去掉 utf-8 BOM 再判断格式
+    if first.startswith(codecs.BOM_UTF8):
+        first, chunks = _head(chain((first[len(codecs.BOM_UTF8):],), chunks), 1)
+    chunks = chain((first,), chunks)
+
+    if not first.lstrip().startswith(b'<'):
+        yield from _iter_text_sitemap(chunks)
+        return
+
+    for node in iterparse(chunks, SITEMAP_TAGS, type='xml', base_url=base_url):
+        entry = _parse_entry(node.root, base_url)
+        if entry: yield entry
+
+
+def _head(chunks, size):
+    """
+    读取至少 size 字节的头部（数据不足时为全部数据），返回 (头部, 剩余块的迭代器)
+    """
+    chunks = iter(chunks)
+    head = b''
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= size: break
+    return head, chunks
+
+
+def iter_sitemap_response(response, chunk_size=SITEMAP_CHUNK_SIZE, max_size=None):
+    """
+    解析 Response，请求时设置 stream=True 则边下载边解析
+    """
+    return iter_sitemap(response.iter_content(chunk_size), base_url=response.url, max_size=max_size)
+
+
+def sitemap_urls_from_robots(text):
+    """
+    robots.txt 中声明的 sitemap 链接
+    """
+    return _ROBOTS_SITEMAP.findall(text or '')
+
+
+def gunzip(chunks, max_size=None):
+    """
+    增量解压 gzip 数据块，max_size 限制解压后的总大小，防止解压炸弹
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    size = 0
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        size += len(data)
+        if max_size and size > max_size: raise ValueError(f'Decompressed size exceeds {max_size} bytes')
+        if data: yield data
+
+        # 多个 gzip 成员拼接
+        while decompressor.eof and decompressor.unused_data:
+            unused = decompressor.unused_data
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            data = decompressor.decompress(unused)
+            size += len(data)
+            if max_size and size > max_size: raise ValueError(f'Decompressed size exceeds {max_size} bytes')
+            if data: yield data
+
+    data = decompressor.flush()
+    if data: yield data
+
+
+def parse_lastmod(value):
+    """
+    解析 W3C Datetime（sitemap、Atom）和 RFC 822（RSS）格式的时间，返回带时区的 datetime，无时区时视为 UTC
+    """
+    if isinstance(value, datetime):
+        date = value
+    else:
+        value = (value or '').strip()
+        if not value: return None
+
+        match = _W3C_DATE.match(value)
+        try:
+            if match:
+                date = datetime(int(match.group(1)), int(match.group(2) or 1), 1)
+            else:
+                date = datetime.fromisoformat(value[:-1] + '+00:00' if value[-1] in 'zZ' else value)
+        except ValueError:
+            try:
+                date = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+
+    if date.tzinfo is None: date = date.replace(tzinfo=timezone.utc)
+    return date
+
+
+def _parse_entry(elem, base_url=None):
+    name = _localname(elem.tag)
+    loc = lastmod = None
+
+    for child in elem:
+        if not isinstance(child.tag, str): continue
+        tag = _localname(child.tag)
+
+        if tag == 'loc':
+            loc = child.text
+        elif tag == 'link':
+            # Atom 的链接在 href 属性中，优先 rel="alternate"
+            href = child.get('href')
+            if href is None:
+                loc = loc or child.text
+            elif child.get('rel', 'alternate') == 'alternate' or not loc:
+                loc = href
+        elif tag in ('lastmod', 'pubDate', 'updated') or (tag == 'published' and not lastmod):
+            lastmod = child.text
+
+    loc = (loc or '').strip()
+    if not loc: return None
+
+    return {
+        'loc': urljoin(base_url, loc) if base_url else loc,
+        'lastmod': parse_lastmod(lastmod),
+        'type': 'sitemap' if name == 'sitemap' else 'url',
+    }
+
+
+def _iter_text_sitemap(chunks):
+    rest = b''
+    for chunk in chunks:
+        lines = (rest + chunk).split(b'\n')
+        rest = lines.pop()
+        for line in lines:
+            entry = _text_entry(line)
+            if entry: yield entry
+
+    entry = _text_entry(rest)
+    if entry: yield entry
+
+
+def _text_entry(line):
+    line = line.strip().decode('utf-8', errors='replace')
+    if not line: return None
+
+    # 只保留 http(s) 链接，忽略 html 错误页等非链接内容
+    parts = urlsplit(line)
+    if parts.scheme not in ('http', 'https') or not parts.netloc or ' ' in line: return None
+    return {'loc': line, 'lastmod': None, 'type': 'url'}
@@ -4,12 +4,15 @@ class DownloaderSetting(object):
         self.wait_time = 0
         self.close_countdown = 3
         self.distribute_item = True
+        self.coalesce = False
 
 
 class RequestSetting(object):
-    def _init__(self):
+    def __init__(self):
         self.max_retry = 0
         self.timeout = None
+        self.normalize = None
+        self.parser = None
 
 
 class Settings(object):
@@ -1,9 +1,11 @@
+import re
 import threading
 import random
 import time
 from collections.abc import Generator
 from espider.network import Request, Downloader
 from espider.parser.response import Response
+from espider.parser.sitemap import iter_sitemap_response, parse_lastmod, sitemap_urls_from_robots
 from espider.settings import Settings, USER_AGENT_LIST
 from espider.utils import requests
 from espider.utils.tools import human_time
@@ -17,13 +19,16 @@ class Spider(object):
     __custom_setting__ = {
         'request': {
             'max_retry': 0,
-            'timeout': None
+            'timeout': None,
+            'normalize': None,
+            'parser': None
         },
         'download': {
             'max_thread': 1,
             'wait_time': 0,
             'close_countdown': 3,
-            'distribute_item': True
+            'distribute_item': True,
+            'coalesce': False
         }
     }
 
@@ -161,3 +166,67 @@ class Spider(object):
     def end(self):
         cost_time = human_time(time.time() - self.start_time - self.downloader.close_countdown)
         print('Time: {} day {} hour {} minute {:.3f} second'.format(*cost_time))
+
+
+class SitemapSpider(Spider):
+    """
+    从 sitemap / robots.txt / RSS / Atom 开始抓取，流式解析，边解析边将请求加入队列
+
+    sitemap_urls: 入口，可以是 sitemap、sitemap index、robots.txt 或 feed 链接
+    sitemap_rules: [(正则, 回调)]，页面链接匹配的第一条规则决定回调，回调可以是方法名
+    sitemap_follow: 需要跟进的子 sitemap 链接正则
+    sitemap_since: 只抓取 lastmod 不早于该时间的条目，datetime 或时间字符串，没有 lastmod 的条目保留
+    sitemap_max_size: gzip sitemap 解压后的大小上限
+    """
+
+    sitemap_urls = ()
+    sitemap_rules = [('', 'parse')]
+    sitemap_follow = ['']
+    sitemap_since = None
+    sitemap_max_size = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._sitemap_rules = [
+            (re.compile(regex) if isinstance(regex, str) else regex,
+             getattr(self, callback) if isinstance(callback, str) else callback)
+            for regex, callback in self.sitemap_rules
+        ]
+        self._sitemap_follow = [re.compile(_) if isinstance(_, str) else _ for _ in self.sitemap_follow]
+        self._sitemap_since = parse_lastmod(self.sitemap_since)
+
+    def start_requests(self, *args, **kwargs):
+        for url in self.sitemap_urls:
+            yield self.sitemap_request(url)
+
+    def sitemap_request(self, url, **kwargs):
+        return self.request(url, callback=self._parse_sitemap, stream=True, **kwargs)
+
+    def sitemap_filter(self, entries):
+        """
+        过滤 sitemap 条目，子类可重写，entries 为 dict 迭代器：loc, lastmod, type
+        """
+        return entries
+
+    def _parse_sitemap(self, response, *args, **kwargs):
+        # 错误页不是 sitemap
+        if response.status_code != 200: return
+
+        if response.url.endswith('/robots.txt'):
+            for url in sitemap_urls_from_robots(response.text):
+                yield self.sitemap_request(url)
+            return
+
+        entries = iter_sitemap_response(response, max_size=self.sitemap_max_size)
+        for entry in self.sitemap_filter(entries):
+            lastmod, loc = entry.get('lastmod'), entry.get('loc')
+            if self._sitemap_since and lastmod and lastmod < self._sitemap_since: continue
+
+            if entry.get('type') == 'sitemap':
+                if any(regex.search(loc) for regex in self._sitemap_follow): yield self.sitemap_request(loc)
+            else:
+                for regex, callback in self._sitemap_rules:
+                    if regex.search(loc):
+                        yield self.request(loc, callback=callback)
+                        break
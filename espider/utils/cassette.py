@@ -0,0 +1,158 @@
+import datetime
+import json
+import os
+import random
+import struct
+import threading
+import time
+import zlib
+
+import requests.models
+from requests.exceptions import ConnectionError
+from requests.structures import CaseInsensitiveDict
+
+from espider.middlewares import request_fingerprint
+from espider.parser.response import Response
+
+
+class Cassette(object):
+    """
+    记录 / 回放下载器的全部请求，用于离线、可复现的基准测试
+
+    mode:
+        record  正常请求并将响应追加写入 cassette 文件
+        replay  不访问网络，按请求指纹返回记录的响应，响应仍经过 Response 构造与回调流程
+    latency: 回放延迟（秒），可为数字或 (min, max) 区间
+    strict: 回放时未命中是否抛出 ConnectionError，为 False 时回退为真实请求
+
+    文件格式: 文件头 + 若干条记录，每条记录为 [meta 长度, body 长度] + meta(json) + zlib 压缩后的 body，
+    打开时只读取 meta 建立索引，body 在回放时按需读取解压。
+
+    用法::
+
+        spider.downloader.transport = Cassette('site.cassette', mode='record')
+    """
+
+    __MAGIC__ = b'ESPCAS1\n'
+    __HEADER__ = struct.Struct('>II')
+
+    def __init__(self, path, mode='replay', latency=0, strict=True, compress_level=6):
+        assert mode in ('record', 'replay'), f'Invalid mode {mode}'
+
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.strict = strict
+        self.compress_level = compress_level
+
+        self.index = {}
+        self._cursor = {}
+        self._lock = threading.Lock()
+        self.count = {'Recorded': 0, 'Replayed': 0, 'Missed': 0}
+
+        if mode == 'record':
+            exists = os.path.exists(path) and os.path.getsize(path)
+            self._file = open(path, 'ab+')
+            if not exists: self._file.write(self.__MAGIC__)
+        else:
+            self._file = open(path, 'rb')
+        self._load_index()
+
+    def fetch(self, request_kwargs, download):
+        key = self._key(request_kwargs)
+        if self.mode == 'record':
+            response = download()
+            self.record(key, response)
+            return response
+
+        record = self._next_record(key)
+        if record is None:
+            self.count['Missed'] += 1
+            if self.strict:
+                raise ConnectionError(f'Cassette miss: {request_kwargs.get("method")} {request_kwargs.get("url")}')
+            return download()
+
+        self._sleep()
+        self.count['Replayed'] += 1
+        return self._build_response(*record)
+
+    def record(self, key, response):
+        meta = json.dumps({
+            'key': key,
+            'url': response.url,
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': dict(response.headers),
+            'encoding': response._encoding,
+            'elapsed': response.elapsed.total_seconds(),
+        }).encode('utf8')
+        body = zlib.compress(response.content or b'', self.compress_level)
+
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell() + self.__HEADER__.size + len(meta)
+            self._file.write(self.__HEADER__.pack(len(meta), len(body)) + meta + body)
+            self.index.setdefault(key, []).append((json.loads(meta), offset, len(body)))
+            self.count['Recorded'] += 1
+
+    def _load_index(self):
+        self._file.seek(0)
+        if self._file.read(len(self.__MAGIC__)) != self.__MAGIC__:
+            raise ValueError(f'Invalid cassette file: {self.path}')
+
+        while True:
+            header = self._file.read(self.__HEADER__.size)
+            if len(header) < self.__HEADER__.size: break
+
+            meta_size, body_size = self.__HEADER__.unpack(header)
+            meta = json.loads(self._file.read(meta_size))
+            offset = self._file.tell()
+            self.index.setdefault(meta.get('key'), []).append((meta, offset, body_size))
+            self._file.seek(body_size, os.SEEK_CUR)
+
+    def _next_record(self, key):
+        records = self.index.get(key)
+        if not records: return None
+
+        # 同一请求记录多次时依次回放，之后重复最后一条
+        with self._lock:
+            cursor = self._cursor.get(key, 0)
+            self._cursor[key] = cursor + 1
+            meta, offset, size = records[min(cursor, len(records) - 1)]
+            self._file.seek(offset)
+            body = self._file.read(size)
+
+        return meta, zlib.decompress(body)
+
+    def _sleep(self):
+        latency = self.latency
+        if isinstance(latency, (tuple, list)): latency = random.uniform(*latency)
+        if latency: time.sleep(latency)
+
+    @staticmethod
+    def _key(request_kwargs):
+        return '{} {}'.format(request_kwargs.get('method'), request_fingerprint(request_kwargs))
+
+    @staticmethod
+    def _build_response(meta, body):
+        resp = requests.models.Response()
+        resp._content = body
+        resp._content_consumed = True
+        resp.status_code = meta.get('status')
+        resp.reason = meta.get('reason')
+        resp.headers = CaseInsensitiveDict(meta.get('headers'))
+        resp.url = meta.get('url')
+        # 回放的响应保留录制时的耗时
+        resp.elapsed = datetime.timedelta(seconds=meta.get('elapsed') or 0)
+
+        response = Response(resp)
+        response._encoding = meta.get('encoding')
+        return response
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed: self._file.close()
+        print('Cassette({}): {}'.format(self.mode, ', '.join(f'{k}: {v}' for k, v in self.count.items())))
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.mode}: {self.path}, requests: {len(self.index)}>'
@@ -0,0 +1,248 @@
+"""
+字节级编码探测，不解码全文、不构建 DOM
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+from w3lib.encoding import read_bom, resolve_encoding
+
+# 编码猜测后端，优先使用速度更快的实现
+try:
+    import cchardet
+
+
+    def _detect(data):
+        return cchardet.detect(data)['encoding']
+except ImportError:
+    try:
+        import charset_normalizer
+
+
+        def _detect(data):
+            match = charset_normalizer.from_bytes(data).best()
+            return match.encoding if match else None
+    except ImportError:
+        import chardet
+
+
+        def _detect(data):
+            return chardet.detect(data)['encoding']
+
+# 规范中 prescan 只看前 1024 字节，实际页面 meta 前常有大段 script，这里放宽到 4KB
+PRESCAN_SIZE = 4096
+
+# 编码猜测只取 body 头部样本
+DETECT_SIZE = 16 * 1024
+
+_SPACE = b'\t\n\x0c\r '
+_XML_DECLARATION = re.compile(rb'^\s*<\?xml[^>]*?encoding\s*=\s*["\']([A-Za-z0-9._:-]+)["\']')
+
+
+def body_declared_encoding(data, limit=PRESCAN_SIZE):
+    """
+    BOM > xml 声明 > HTML5 meta prescan，均未找到时返回 None
+    """
+    if not data: return None
+
+    encoding, _ = read_bom(data[:4])
+    if encoding: return encoding
+
+    head = bytes(data[:limit])
+    match = _XML_DECLARATION.match(head)
+    if match:
+        encoding = _resolve(match.group(1))
+        if encoding: return encoding
+
+    return prescan_encoding(head, limit=limit)
+
+
+def detect_encoding(data, sample_size=DETECT_SIZE):
+    """
+    猜测编码，sample_size 为 None 时检测全文
+    """
+    if not data: return None
+
+    encoding = _detect(bytes(data[:sample_size]) if sample_size else bytes(data))
+    if not encoding: return None
+
+    # 样本全为 ascii 时，按其超集 utf-8 解码后续内容
+    if encoding.lower() == 'ascii' and sample_size and len(data) > sample_size: return 'utf-8'
+    return resolve_encoding(encoding) or encoding.lower()
+
+
+class EncodingMemory(object):
+    """
+    按 host 记录编码猜测结果，同站后续页面直接复用
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, host):
+        if not host: return None
+        with self._lock:
+            encoding = self._data.get(host)
+            if encoding: self._data.move_to_end(host)
+            return encoding
+
+    def remember(self, host, encoding):
+        if not host or not encoding: return
+        with self._lock:
+            self._data[host] = encoding
+            self._data.move_to_end(host)
+            if len(self._data) > self.maxsize: self._data.popitem(last=False)
+
+    def forget(self, host):
+        with self._lock:
+            self._data.pop(host, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+encoding_memory = EncodingMemory()
+
+
+def prescan_encoding(data, limit=PRESCAN_SIZE):
+    """
+    HTML5 规范的 meta charset 预扫描算法（prescan a byte stream to determine its encoding）
+    """
+    data = bytes(data[:limit])
+    end = len(data)
+    pos = 0
+
+    while True:
+        pos = data.find(b'<', pos)
+        if pos == -1: return None
+
+        if data.startswith(b'<!--', pos):
+            pos = data.find(b'-->', pos + 2)
+            if pos == -1: return None
+            pos += 3
+
+        elif data[pos + 1:pos + 5].lower() == b'meta' and data[pos + 5:pos + 6] and data[pos + 5] in b'\t\n\x0c\r /':
+            pos += 5
+            seen, got_pragma, need_pragma, charset = set(), False, None, None
+            while True:
+                name, value, pos = _get_attribute(data, pos, end)
+                if name is None: break
+                if name in seen: continue
+                seen.add(name)
+
+                if name == b'http-equiv':
+                    if value == b'content-type': got_pragma = True
+                elif name == b'content':
+                    if charset is None:
+                        charset = _charset_from_content(value)
+                        if charset: need_pragma = True
+                elif name == b'charset':
+                    charset, need_pragma = value, False
+
+            if need_pragma is None or (need_pragma and not got_pragma) or not charset: continue
+
+            encoding = _resolve(charset)
+            if encoding: return encoding
+
+        elif data[pos + 1:pos + 2].isalpha() or (data[pos + 1:pos + 2] == b'/' and data[pos + 2:pos + 3].isalpha()):
+            # 跳过标签名和属性
+            while pos < end and data[pos] not in b'\t\n\x0c\r >':
+                pos += 1
+            while True:
+                name, _, pos = _get_attribute(data, pos, end)
+                if name is None: break
+
+        elif data[pos + 1:pos + 2] in (b'!', b'/', b'?'):
+            pos = data.find(b'>', pos)
+            if pos == -1: return None
+            pos += 1
+
+        else:
+            pos += 1
+
+
+def _get_attribute(data, pos, end):
+    """
+    返回 (name, value, pos)，遇到 '>' 或数据结束时 name 为 None
+    """
+    while pos < end and data[pos] in b'\t\n\x0c\r /':
+        pos += 1
+    if pos >= end or data[pos] == 0x3e: return None, None, pos
+
+    name = bytearray()
+    while True:
+        if pos >= end: return bytes(name), b'', pos
+
+        c = data[pos]
+        if c == 0x3d and name:
+            pos += 1
+            break
+        elif c in _SPACE:
+            while pos < end and data[pos] in _SPACE:
+                pos += 1
+            if pos < end and data[pos] == 0x3d:
+                pos += 1
+                break
+            return bytes(name), b'', pos
+        elif c in b'/>':
+            return bytes(name), b'', pos
+
+        name.append(c + 0x20 if 0x41 <= c <= 0x5a else c)
+        pos += 1
+
+    while pos < end and data[pos] in _SPACE:
+        pos += 1
+    if pos >= end: return bytes(name), b'', pos
+
+    c = data[pos]
+    if c in b'"\'':
+        close = data.find(bytes((c,)), pos + 1)
+        if close == -1: return bytes(name), data[pos + 1:].lower(), end
+        return bytes(name), data[pos + 1:close].lower(), close + 1
+    elif c == 0x3e:
+        return bytes(name), b'', pos
+
+    start = pos
+    while pos < end and data[pos] not in b'\t\n\x0c\r >':
+        pos += 1
+    return bytes(name), data[start:pos].lower(), pos
+
+
+def _charset_from_content(value):
+    pos = 0
+    while True:
+        pos = value.find(b'charset', pos)
+        if pos == -1: return None
+        pos += 7
+
+        while pos < len(value) and value[pos] in _SPACE:
+            pos += 1
+        if value[pos:pos + 1] != b'=': continue
+        pos += 1
+        while pos < len(value) and value[pos] in _SPACE:
+            pos += 1
+        if pos >= len(value): return None
+
+        c = value[pos]
+        if c in b'"\'':
+            close = value.find(bytes((c,)), pos + 1)
+            return value[pos + 1:close] if close != -1 else None
+
+        start = pos
+        while pos < len(value) and value[pos] not in b'\t\n\x0c\r ;':
+            pos += 1
+        return value[start:pos]
+
+
+def _resolve(label):
+    encoding = resolve_encoding(label.strip().decode('ascii', 'ignore'))
+    # 规范要求 meta 中声明的 utf-16 按 utf-8 处理
+    if encoding and encoding.startswith('utf-16'): return 'utf-8'
+    return encoding
@@ -0,0 +1,396 @@
+"""
+Request / Response 的二进制序列化，用于缓存、断点续爬、多进程解析和分布式队列
+
+格式: 魔数 b'ESPS' + 版本号(1 字节) + 类型(1 字节，Q: Request，R: Response) + msgpack 编码的数组
+
+    Request:  [url, method, request_kwargs, callback, cb_args, cb_kwargs,
+               priority, max_retry, retry_times, normalize, parser, session]
+    Response: [url, status, reason, headers, encoding, elapsed, body]
+
+新版本只在数组末尾追加字段，读取时缺少的字段取默认值。
+msgpack 没有元组类型，request_kwargs 中 timeout、auth、cert 的元组读取时还原为元组。
+
+callback 只记录名称: 爬虫的方法记录方法名，其他函数记录 ``模块:限定名``，
+反序列化 Request 时需要传入爬虫，从爬虫上取回 callback、downloader 和 session::
+
+    data = dumps(request)
+    request = loads(data, spider=spider)
+
+body 作为 msgpack bin 直接写入，不经过中间拷贝；``dump`` 写入文件时完全不拷贝 body。
+``loads`` 会把 body 复制一次为 bytes（lxml、正则和 json 解析都需要 bytes），
+只需要转发或写入 body 时可用 ``unpackb(data, copy=False)``，bin 返回 data 的 memoryview 切片，不复制。
+
+安装 msgpack 时使用其 C 实现，否则使用内置的纯 Python 实现，两者格式一致。
+"""
+
+import datetime
+import importlib
+import struct
+from collections.abc import Mapping
+
+from requests.structures import CaseInsensitiveDict
+
+from espider.network import Request
+from espider.parser.response import Response
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MAGIC = b'ESPS'
+VERSION = 1
+
+KIND_REQUEST = b'Q'
+KIND_RESPONSE = b'R'
+
+_HEADER_SIZE = len(MAGIC) + 2
+
+_TUPLE_KWARGS = ('timeout', 'auth', 'cert')
+
+_UINT8 = struct.Struct('>B')
+_UINT16 = struct.Struct('>H')
+_UINT32 = struct.Struct('>I')
+_UINT64 = struct.Struct('>Q')
+_INT8 = struct.Struct('>b')
+_INT16 = struct.Struct('>h')
+_INT32 = struct.Struct('>i')
+_INT64 = struct.Struct('>q')
+_FLOAT32 = struct.Struct('>f')
+_FLOAT64 = struct.Struct('>d')
+
+
+def packb(obj):
+    return b''.join(_pack_parts(obj))
+
+
+def unpackb(data, copy=True):
+    """
+    copy 为 False 时 bin 返回 data 的 memoryview 切片（纯 Python 实现），data 需保持不变
+    """
+    if msgpack is not None and copy:
+        return msgpack.unpackb(data, raw=False, use_list=True, strict_map_key=False)
+
+    view = memoryview(data).cast('B')
+    obj, pos = _unpack(view, 0, copy)
+    if pos != len(view): raise ValueError(f'Extra data after position {pos}')
+    return obj
+
+
+def dumps(obj):
+    return b''.join(_dump_parts(obj))
+
+
+def dump(obj, fp):
+    """
+    写入文件对象，body 直接写入，不拼接
+    """
+    fp.writelines(_dump_parts(obj))
+
+
+def loads(data, spider=None):
+    view = memoryview(data).cast('B')
+    kind = _check_header(view)
+    fields = unpackb(view[_HEADER_SIZE:])
+
+    if kind == KIND_RESPONSE: return _load_response(fields)
+    if kind == KIND_REQUEST:
+        if spider is None: raise ValueError('Loading a Request requires the spider it belongs to')
+        return _load_request(fields, spider)
+    raise ValueError(f'Unknown object type {kind!r}')
+
+
+def _check_header(view):
+    if len(view) < _HEADER_SIZE or view[:len(MAGIC)] != MAGIC: raise ValueError('Invalid espider serialized data')
+
+    version = view[len(MAGIC)]
+    if version > VERSION: raise ValueError(f'Unsupported version {version}, current version is {VERSION}')
+    return bytes(view[len(MAGIC) + 1:_HEADER_SIZE])
+
+
+def _dump_parts(obj):
+    if isinstance(obj, Response):
+        kind, fields = KIND_RESPONSE, _dump_response(obj)
+    elif isinstance(obj, Request):
+        kind, fields = KIND_REQUEST, _dump_request(obj)
+    else:
+        raise TypeError(f'Can only serialize Request or Response objects, got {type(obj).__name__}')
+
+    parts = [MAGIC + bytes((VERSION,)) + kind]
+    parts.extend(_pack_parts(fields))
+    return parts
+
+
+def _dump_response(response):
+    elapsed = response.elapsed
+    return [
+        response.url,
+        response.status_code,
+        response.reason,
+        dict(response.headers) if response._headers else {},
+        response._encoding,
+        elapsed.total_seconds() if elapsed else 0.0,
+        response.content or b'',
+    ]
+
+
+def _load_response(fields):
+    url, status, reason, headers, encoding, elapsed, body = _fields(fields, 7)
+
+    response = Response()
+    response._content = body or b''
+    response._content_consumed = True
+    response.status_code = status
+    response.reason = reason
+    response.headers = CaseInsensitiveDict(headers)
+    response.url = url
+    response._encoding = encoding
+    response.elapsed = datetime.timedelta(seconds=elapsed or 0)
+    return response
+
+
+def _dump_request(request):
+    request_kwargs = {
+        k: v for k, v in request.request_kwargs.items() if k not in ('url', 'method') and v is not None
+    }
+    return [
+        request.url,
+        request.method,
+        request_kwargs,
+        _callback_name(request.callback),
+        list(request.func_args),
+        request.func_kwargs,
+        request.priority,
+        request.max_retry,
+        request.retry_times,
+        request.normalize,
+        request.parser,
+        request.session is not None,
+    ]
+
+
+def _load_request(fields, spider):
+    (
+        url, method, request_kwargs, callback, cb_args, cb_kwargs,
+        priority, max_retry, retry_times, normalize, parser, session
+    ) = _fields(fields, 12)
+
+    # requests 只接受元组形式的 timeout / auth / cert
+    request_kwargs = request_kwargs or {}
+    for key in _TUPLE_KWARGS:
+        if isinstance(request_kwargs.get(key), list): request_kwargs[key] = tuple(request_kwargs[key])
+
+    request = Request(
+        url,
+        method=method or '',
+        downloader=spider.downloader,
+        callback=_resolve_callback(callback, spider),
+        cb_args=tuple(cb_args or ()),
+        cb_kwargs=cb_kwargs,
+        priority=priority,
+        max_retry=max_retry,
+        normalize=normalize,
+        parser=parser,
+        session=getattr(spider, 'session', None) if session else None,
+        show_detail=getattr(spider, 'show_request_detail', None),
+        **request_kwargs
+    )
+    request.retry_times = retry_times or 0
+    return request
+
+
+def _fields(fields, size):
+    if len(fields) < size: fields = list(fields) + [None] * (size - len(fields))
+    return fields[:size]
+
+
+def _callback_name(callback):
+    if callback is None: return None
+
+    name = callback.__name__
+    if getattr(callback, '__self__', None) is not None: return name
+
+    qualname = getattr(callback, '__qualname__', name)
+    if '<' in qualname:
+        raise ValueError(f'Can not serialize callback {qualname}, use a spider method or a module function')
+    return f'{callback.__module__}:{qualname}'
+
+
+def _resolve_callback(name, spider):
+    if name is None: return None
+    if ':' not in name: return getattr(spider, name)
+
+    module, _, qualname = name.partition(':')
+    obj = importlib.import_module(module)
+    for attr in qualname.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
+def _pack_parts(obj):
+    if msgpack is not None: return _pack_msgpack(obj)
+
+    parts = []
+    _pack(obj, parts)
+    return parts
+
+
+def _pack_msgpack(obj):
+    # body 单独写入，避免 msgpack 内部缓冲区的拷贝
+    if isinstance(obj, list) and obj and isinstance(obj[-1], (bytes, bytearray, memoryview)):
+        body = memoryview(obj[-1]).cast('B')
+        parts = [_array_header(len(obj))]
+        parts.extend(msgpack.packb(_, use_bin_type=True, default=_msgpack_default) for _ in obj[:-1])
+        parts.append(_bin_header(len(body)))
+        parts.append(body)
+        return parts
+    return [msgpack.packb(obj, use_bin_type=True, default=_msgpack_default)]
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, Mapping): return dict(obj)
+    raise TypeError(f'Can not serialize object of type {type(obj).__name__}')
+
+
+def _pack(obj, parts):
+    if obj is None:
+        parts.append(b'\xc0')
+    elif obj is True:
+        parts.append(b'\xc3')
+    elif obj is False:
+        parts.append(b'\xc2')
+    elif isinstance(obj, int):
+        parts.append(_pack_int(obj))
+    elif isinstance(obj, float):
+        parts.append(b'\xcb' + _FLOAT64.pack(obj))
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        parts.append(_str_header(len(data)))
+        parts.append(data)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        data = memoryview(obj).cast('B') if isinstance(obj, memoryview) else obj
+        parts.append(_bin_header(len(data)))
+        parts.append(data)
+    elif isinstance(obj, (list, tuple)):
+        parts.append(_array_header(len(obj)))
+        for item in obj:
+            _pack(item, parts)
+    elif isinstance(obj, Mapping):
+        parts.append(_map_header(len(obj)))
+        for key, value in obj.items():
+            _pack(key, parts)
+            _pack(value, parts)
+    else:
+        raise TypeError(f'Can not serialize object of type {type(obj).__name__}')
+
+
+def _pack_int(n):
+    if 0 <= n < 0x80: return _UINT8.pack(n)
+    if -0x20 <= n < 0: return _INT8.pack(n)
+    if n > 0:
+        if n <= 0xff: return b'\xcc' + _UINT8.pack(n)
+        if n <= 0xffff: return b'\xcd' + _UINT16.pack(n)
+        if n <= 0xffffffff: return b'\xce' + _UINT32.pack(n)
+        if n <= 0xffffffffffffffff: return b'\xcf' + _UINT64.pack(n)
+    else:
+        if n >= -0x80: return b'\xd0' + _INT8.pack(n)
+        if n >= -0x8000: return b'\xd1' + _INT16.pack(n)
+        if n >= -0x80000000: return b'\xd2' + _INT32.pack(n)
+        if n >= -0x8000000000000000: return b'\xd3' + _INT64.pack(n)
+    raise OverflowError(f'Integer {n} out of range')
+
+
+def _str_header(n):
+    if n < 0x20: return _UINT8.pack(0xa0 | n)
+    if n <= 0xff: return b'\xd9' + _UINT8.pack(n)
+    if n <= 0xffff: return b'\xda' + _UINT16.pack(n)
+    return b'\xdb' + _UINT32.pack(n)
+
+
+def _bin_header(n):
+    if n <= 0xff: return b'\xc4' + _UINT8.pack(n)
+    if n <= 0xffff: return b'\xc5' + _UINT16.pack(n)
+    return b'\xc6' + _UINT32.pack(n)
+
+
+def _array_header(n):
+    if n < 0x10: return _UINT8.pack(0x90 | n)
+    if n <= 0xffff: return b'\xdc' + _UINT16.pack(n)
+    return b'\xdd' + _UINT32.pack(n)
+
+
+def _map_header(n):
+    if n < 0x10: return _UINT8.pack(0x80 | n)
+    if n <= 0xffff: return b'\xde' + _UINT16.pack(n)
+    return b'\xdf' + _UINT32.pack(n)
+
+
+# 定长类型: 类型字节 -> (struct, 值类型)
+_FIXED = {
+    0xca: _FLOAT32, 0xcb: _FLOAT64,
+    0xcc: _UINT8, 0xcd: _UINT16, 0xce: _UINT32, 0xcf: _UINT64,
+    0xd0: _INT8, 0xd1: _INT16, 0xd2: _INT32, 0xd3: _INT64,
+}
+
+# 变长类型: 类型字节 -> 长度的 struct
+_STR = {0xd9: _UINT8, 0xda: _UINT16, 0xdb: _UINT32}
+_BIN = {0xc4: _UINT8, 0xc5: _UINT16, 0xc6: _UINT32}
+_ARRAY = {0xdc: _UINT16, 0xdd: _UINT32}
+_MAP = {0xde: _UINT16, 0xdf: _UINT32}
+
+
+def _unpack(view, pos, copy):
+    b = view[pos]
+    pos += 1
+
+    if b < 0x80: return b, pos
+    if b >= 0xe0: return b - 0x100, pos
+    if 0xa0 <= b <= 0xbf: return _unpack_str(view, pos, b & 0x1f)
+    if 0x90 <= b <= 0x9f: return _unpack_array(view, pos, b & 0x0f, copy)
+    if 0x80 <= b <= 0x8f: return _unpack_map(view, pos, b & 0x0f, copy)
+    if b == 0xc0: return None, pos
+    if b == 0xc2: return False, pos
+    if b == 0xc3: return True, pos
+
+    fmt = _FIXED.get(b)
+    if fmt is not None: return fmt.unpack_from(view, pos)[0], pos + fmt.size
+
+    for table in (_STR, _BIN, _ARRAY, _MAP):
+        fmt = table.get(b)
+        if fmt is None: continue
+
+        n = fmt.unpack_from(view, pos)[0]
+        pos += fmt.size
+        if table is _STR: return _unpack_str(view, pos, n)
+        if table is _ARRAY: return _unpack_array(view, pos, n, copy)
+        if table is _MAP: return _unpack_map(view, pos, n, copy)
+
+        end = pos + n
+        if end > len(view): raise ValueError('Truncated data')
+        data = view[pos:end]
+        return (bytes(data) if copy else data), end
+
+    raise ValueError(f'Unsupported type byte 0x{b:02x} at position {pos - 1}')
+
+
+def _unpack_str(view, pos, n):
+    end = pos + n
+    if end > len(view): raise ValueError('Truncated data')
+    return str(view[pos:end], 'utf-8'), end
+
+
+def _unpack_array(view, pos, n, copy):
+    items = []
+    for _ in range(n):
+        item, pos = _unpack(view, pos, copy)
+        items.append(item)
+    return items, pos
+
+
+def _unpack_map(view, pos, n, copy):
+    data = {}
+    for _ in range(n):
+        key, pos = _unpack(view, pos, copy)
+        value, pos = _unpack(view, pos, copy)
+        data[key] = value
+    return data, pos
@@ -2,12 +2,17 @@ import hashlib
 import heapq
 import random
 import time
-from functools import wraps
+from functools import lru_cache, wraps
 import json as Json
 import re
 from collections import defaultdict
 from collections.abc import Iterable, Callable
 
+try:
+    import re2
+except ImportError:
+    re2 = None
+
 
 class PriorityQueue:
     def __init__(self):
@@ -18,6 +23,22 @@ class PriorityQueue:
         heapq.heappush(self._queue, (-priority, self.index, item))
         self.index += 1
 
+    def push_many(self, items):
+        """
+        批量插入 [(item, priority)]，数量多于队列长度时合并后重建堆
+        """
+        entries = []
+        for item, priority in items:
+            entries.append((-priority, self.index, item))
+            self.index += 1
+
+        if len(entries) > len(self._queue):
+            self._queue.extend(entries)
+            heapq.heapify(self._queue)
+        else:
+            for entry in entries:
+                heapq.heappush(self._queue, entry)
+
     def pop(self, default=None):
         return heapq.heappop(self._queue)[-1] if self._queue else default
 
@@ -40,13 +61,6 @@ def fn_timer(func):
     return wrapper
 
 
-def _flatten(item):
-    for k, v in item.items():
-        if isinstance(v, dict):
-            yield from _flatten(v)
-        yield k, v
-
-
 def json_to_dict(json):
     if isinstance(json, dict): return json
 
@@ -120,18 +134,138 @@ def dict_to_json(json: dict):
 
 
 def search(key, data=None, target_type=None):
-    my_dict = defaultdict(list)
-    for k, v in _flatten(data):
-        my_dict[k].append(v)
-
-    if isinstance(key, Iterable) and not isinstance(key, (str, bytes)):
-        return {
-            k: [_ for _ in my_dict.get(k) if isinstance(_, target_type)] if target_type else my_dict.get(k)
-            for k in key
-        }
-    else:
-        result = [_ for _ in my_dict.get(key) if isinstance(_, target_type)] if target_type else my_dict.get(key)
-        return result[0] if result and len(result) == 1 else result
+    return JsonIndex(data).search(key, target_type=target_type)
+
+
+# $.a.b[0]、$..key、[*]、.*、['key']
+_JSON_PATH_TOKEN = re.compile(r"""\.\.([^.\[\]]+)|\.([^.\[\]]+)|\[(-?\d+|\*)\]|\[['"]([^'"]+)['"]\]""")
+
+
+class JsonIndex(object):
+    """
+    json 数据的 key 索引，遍历一次（包括 list 中的元素），之后按 key 查找为 O(1)
+    同一个 key 的结果按遍历顺序排列，子节点在父节点之前
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self._values = defaultdict(list)
+        self._paths = None
+        self._build(data, self._values)
+
+    def _build(self, node, values):
+        if isinstance(node, dict):
+            for k, v in node.items():
+                if isinstance(v, (dict, list)): self._build(v, values)
+                values[k].append(v)
+        elif isinstance(node, list):
+            for v in node:
+                if isinstance(v, (dict, list)): self._build(v, values)
+
+    def _build_paths(self, node, path, paths):
+        if isinstance(node, dict):
+            for k, v in node.items():
+                if isinstance(v, (dict, list)): self._build_paths(v, path + (k,), paths)
+                paths[k].append(path + (k,))
+        elif isinstance(node, list):
+            for i, v in enumerate(node):
+                if isinstance(v, (dict, list)): self._build_paths(v, path + (i,), paths)
+
+    def __contains__(self, key):
+        return key in self._values
+
+    def __len__(self):
+        return len(self._values)
+
+    def keys(self):
+        return self._values.keys()
+
+    def get(self, key, target_type=None):
+        """
+        key 对应的所有值，不存在时返回空列表
+        """
+        values = self._values.get(key) or []
+        return [_ for _ in values if isinstance(_, target_type)] if target_type else list(values)
+
+    def paths(self, key):
+        """
+        key 对应的所有路径，与 get 的结果一一对应，首次调用时生成
+        """
+        if self._paths is None:
+            self._paths = defaultdict(list)
+            self._build_paths(self.data, (), self._paths)
+        return list(self._paths.get(key) or [])
+
+    def search(self, key, target_type=None):
+        """
+        与 tools.search 一致：单个结果直接返回值，key 为列表时返回 dict
+        """
+        if isinstance(key, Iterable) and not isinstance(key, (str, bytes)):
+            return {k: self._search(k, target_type) for k in key}
+        else:
+            result = self._search(key, target_type)
+            return result[0] if result and len(result) == 1 else result
+
+    def _search(self, key, target_type):
+        values = self._values.get(key)
+        if values is None: return [] if target_type else None
+        return [_ for _ in values if isinstance(_, target_type)] if target_type else list(values)
+
+    def query(self, path):
+        """
+        简单的 JSONPath 查询，返回结果列表，支持 $.a.b、$..key、[0]、[-1]、[*]、.*、['a.b']
+        以 $.. 开头时直接使用索引
+        """
+        path = path.strip()
+        if path.startswith('$'): path = path[1:]
+        if path and path[0] not in '.[': path = '.' + path
+
+        tokens, pos = [], 0
+        for match in _JSON_PATH_TOKEN.finditer(path):
+            if match.start() != pos: raise ValueError(f'Invalid json path: {path}')
+            pos = match.end()
+            tokens.append(match.groups())
+        if pos != len(path): raise ValueError(f'Invalid json path: {path}')
+
+        nodes = [self.data]
+        for i, (descendant, child, index, quoted) in enumerate(tokens):
+            if descendant is not None:
+                if i == 0 and descendant != '*':
+                    nodes = self.get(descendant)
+                else:
+                    nodes = [v for node in nodes for v in _descendants(node, descendant)]
+            elif index is not None:
+                nodes = [v for node in nodes if isinstance(node, list) for v in _index(node, index)]
+            else:
+                nodes = [v for node in nodes for v in _children(node, quoted if child is None else child)]
+        return nodes
+
+
+def _children(node, key):
+    if isinstance(node, dict):
+        if key == '*': return list(node.values())
+        return [node[key]] if key in node else []
+    if isinstance(node, list) and key == '*': return node
+    return []
+
+
+def _index(node, index):
+    if index == '*': return node
+    index = int(index)
+    return [node[index]] if -len(node) <= index < len(node) else []
+
+
+def _descendants(node, key):
+    result = []
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if isinstance(v, (dict, list)): result.extend(_descendants(v, key))
+            if key == '*' or k == key: result.append(v)
+    elif isinstance(node, list):
+        for v in node:
+            if isinstance(v, (dict, list)): result.extend(_descendants(v, key))
+            if key == '*': result.append(v)
+    return result
 
 
 def strip(*args, data=None, strip_key=False):
@@ -265,27 +399,8 @@ def flatten(data):
             yield k, v
 
 
-def re_search(re_map, data, flags=None, index=None):
-    s = False
-    if isinstance(re_map, str): re_map, s = {'_': re_map}, True
-    result = {}
-    for key, pattern in re_map.items():
-        if isinstance(pattern, str):
-            r = re.search(pattern, data, flags=flags or 0)
-            if not r and not flags:
-                r = re.search(pattern, data, flags=re.S)
-        elif isinstance(pattern, re.Pattern):
-            r = pattern.search(data)
-        elif isinstance(pattern, dict):
-            r = re_search(pattern, data, flags=flags, index=index)
-        else:
-            raise Exception(f'Type Error ... re_search not support {type(pattern)}')
-
-        result[key] = r
-
-    result_g = _get_group_data(result, index=index)
-
-    return result_g if not s else result_g.get('_')
+def re_search(re_map, data, flags=None, index=None, backend=None):
+    return compile_regex_map(re_map, flags=flags, backend=backend).search(data, index=index)
 
 
 def _get_group_data(data, index=None):
@@ -304,26 +419,176 @@ def _get_group_data(data, index=None):
     return result_g
 
 
-def re_findall(re_map, data, flags=None, iter=False):
-    s = False
-    if isinstance(re_map, str): re_map, s = {'_': re_map}, True
-
-    result = {}
-    for key, pattern in re_map.items():
-        if isinstance(pattern, str):
-            r = re.finditer(pattern, data, flags=flags or 0) if iter else re.findall(pattern, data, flags=flags or 0)
-            if not r and not flags:
-                r = re.search(pattern, data, flags=re.S)
-        elif isinstance(pattern, re.Pattern):
-            r = pattern.finditer(data) if iter else pattern.findall(data)
-        elif isinstance(pattern, dict):
-            r = re_findall(pattern, data, flags=flags, iter=iter)
-        else:
-            raise Exception(f'Type Error ... re_search not support {type(pattern)}')
+def re_findall(re_map, data, flags=None, iter=False, backend=None):
+    return compile_regex_map(re_map, flags=flags, backend=backend).findall(data, iter=iter)
 
-        result[key] = r
 
-    return result if not s else result.get('_')
+# re2 支持的 flag 对应的内联写法
+_RE2_FLAGS = ((re.I, 'i'), (re.M, 'm'), (re.S, 's'))
+
+
+def _has_dot(pattern):
+    """
+    pattern 中是否有字符集之外未转义的 '.'，没有时 re.S 不影响匹配结果
+    """
+    escaped = in_class = False
+    for c in pattern:
+        if escaped:
+            escaped = False
+        elif c == '\\':
+            escaped = True
+        elif in_class:
+            if c == ']': in_class = False
+        elif c == '[':
+            in_class = True
+        elif c == '.':
+            return True
+    return False
+
+
+def _re2_compile(pattern, flags):
+    if re2 is None or flags & ~(re.I | re.M | re.S | re.U): return None
+    inline = ''.join(c for f, c in _RE2_FLAGS if flags & f)
+    try:
+        return re2.compile(f'(?{inline}){pattern}' if inline else pattern)
+    except re2.error:
+        # 反向引用、环视等 re2 不支持的语法
+        return None
+
+
+class RegexMap(object):
+    """
+    预编译的正则 map，供 re_search、re_findall 和 Selector.re_map 使用
+
+    re_map 为正则字符串、编译好的正则或 {key: 正则 | 嵌套 dict}，字符串正则只编译一次
+    未指定 flags 时，匹配失败会以 re.S 重试，只有正则中包含 '.' 时才编译重试用的正则
+
+    backend='re2' 且安装了 google-re2 时，re2 支持的正则使用 re2，
+    并用 re2.Set 一次扫描找出有匹配的 key，没有匹配的 key 不再单独扫描。
+    标准库 re 中多个正则合并为一个分支正则反而比逐个扫描慢，因此默认逐个扫描
+    """
+
+    def __init__(self, re_map, flags=None, backend=None):
+        if backend not in (None, 're', 're2'): raise ValueError(f'Invalid regex backend: {backend}')
+
+        self.single = not isinstance(re_map, dict)
+        if self.single: re_map = {'_': re_map}
+
+        self.flags = flags
+        self.backend = backend if backend == 're2' and re2 is not None else 're'
+        self.patterns = {}
+        self._fallbacks = {}
+        self._set = None
+
+        for key, pattern in re_map.items():
+            if isinstance(pattern, str):
+                self.patterns[key] = self._compile(pattern, flags or 0)
+                if not flags and _has_dot(pattern): self._fallbacks[key] = self._compile(pattern, re.S)
+            elif isinstance(pattern, re.Pattern):
+                self.patterns[key] = pattern
+            elif isinstance(pattern, dict):
+                self.patterns[key] = RegexMap(pattern, flags=flags, backend=backend)
+            else:
+                raise Exception(f'Type Error ... re_search not support {type(pattern)}')
+
+        if self.backend == 're2': self._set = self._build_set(re_map)
+
+    def _compile(self, pattern, flags):
+        if self.backend == 're2':
+            compiled = _re2_compile(pattern, flags)
+            if compiled is not None: return compiled
+        return re.compile(pattern, flags)
+
+    def _build_set(self, re_map):
+        keys = [k for k, v in re_map.items() if isinstance(v, str)]
+        if len(keys) < 2: return None
+
+        regex_set = re2.Set.SearchSet()
+        for key in keys:
+            # 有 re.S 重试的正则按 re.S 预筛，结果是不带 re.S 时的超集
+            flags = re.S if key in self._fallbacks else self.flags or 0
+            inline = ''.join(c for f, c in _RE2_FLAGS if flags & f)
+            if flags & ~(re.I | re.M | re.S | re.U): return None
+            try:
+                regex_set.Add(f'(?{inline}:{re_map[key]})' if inline else re_map[key])
+            except re2.error:
+                return None
+        regex_set.Compile()
+        return keys, regex_set
+
+    def _candidates(self, data):
+        """
+        可能有匹配的 key，None 表示全部
+        """
+        if self._set is None: return None
+        keys, regex_set = self._set
+        matched = set(keys[i] for i in regex_set.Match(data) or ())
+        return matched | {k for k in self.patterns if k not in keys}
+
+    def items(self):
+        return self.patterns.items()
+
+    def search(self, data, index=None):
+        candidates = self._candidates(data)
+        result = {}
+        for key, pattern in self.patterns.items():
+            if isinstance(pattern, RegexMap):
+                r = pattern.search(data, index=index)
+            elif candidates is not None and key not in candidates:
+                r = None
+            else:
+                r = pattern.search(data)
+                if not r and key in self._fallbacks: r = self._fallbacks[key].search(data)
+            result[key] = r
+
+        result_g = _get_group_data(result, index=index)
+        return result_g if not self.single else result_g.get('_')
+
+    def findall(self, data, iter=False):
+        candidates = self._candidates(data)
+        result = {}
+        for key, pattern in self.patterns.items():
+            if isinstance(pattern, RegexMap):
+                r = pattern.findall(data, iter=iter)
+            elif candidates is not None and key not in candidates:
+                r = (_ for _ in ()) if iter else []
+            else:
+                r = list(pattern.finditer(data)) if iter else pattern.findall(data)
+                if not r and key in self._fallbacks:
+                    pattern = self._fallbacks[key]
+                    r = pattern.finditer(data) if iter else pattern.findall(data)
+                elif iter:
+                    r = (_ for _ in r)
+            result[key] = r
+
+        return result if not self.single else result.get('_')
+
+
+@lru_cache(maxsize=512)
+def _cached_regex_map(frozen, flags, backend):
+    return RegexMap(_thaw(frozen), flags=flags, backend=backend)
+
+
+def _freeze(re_map):
+    if isinstance(re_map, dict): return tuple((k, _freeze(v)) for k, v in re_map.items()), True
+    return re_map, False
+
+
+def _thaw(frozen):
+    value, is_dict = frozen
+    return {k: _thaw(v) for k, v in value} if is_dict else value
+
+
+def compile_regex_map(re_map, flags=None, backend=None):
+    """
+    返回 RegexMap，相同的 re_map 只编译一次
+    """
+    if isinstance(re_map, RegexMap): return re_map
+    try:
+        return _cached_regex_map(_freeze(re_map), flags, backend)
+    except TypeError:
+        # 不可 hash 的值
+        return RegexMap(re_map, flags=flags, backend=backend)
 
 
 def merge(*args, overwrite=False):
@@ -376,9 +641,19 @@ class DictFactory(object):
     def __init__(self, data):
         assert isinstance(data, dict), 'item must be a dict'
         self.data = data
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None or self._index.data is not self.data: self._index = JsonIndex(self.data)
+        return self._index
 
     def search(self, key, data=None, target_type=None):
-        return search(key, data=data or self.data, target_type=target_type)
+        if data: return search(key, data=data, target_type=target_type)
+        return self.index.search(key, target_type=target_type)
+
+    def query(self, path):
+        return self.index.query(path)
 
     def strip(self, *args, data=None, strip_key=False):
         return strip(*args, data=data or self.data, strip_key=strip_key)
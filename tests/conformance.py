@@ -0,0 +1,85 @@
+"""
+解析后端一致性用例，所有后端的结果必须与 lxml 以及这里记录的期望值一致
+
+tests/test_parser_backends.py 和 ``python -m benchmarks.parsers --check`` 共用
+"""
+
+from espider.parser.backends import get_backend
+
+CONFORMANCE_HTML = '''<!DOCTYPE html>
+<html><head><title>Conformance &amp; test</title><base href="/base/"></head>
+<body>
+<ul class="items">
+  <li class="item first" data-id="1"><span class="title">One</span> <span class="price">10</span></li>
+  <li class="item" data-id="2"><span class="title">Two &lt;2&gt;</span> <span class="price">20</span></li>
+  <li class="item" data-id="3" hidden><span class="title">Three</span><span class="price"></span></li>
+</ul>
+<div id="main"><p>Lead <b>bold</b> tail</p><p class="note">中文 note</p>
+<a href="/a?x=1&amp;y=2">A</a><a href="b.html" rel="next">B</a><a>no href</a></div>
+<table><tr><td>1</td><td>2</td></tr><tr><td>3</td><td>4</td></tr></table>
+</body></html>'''
+
+# (css 查询, 结果处理, 期望值)：getall 返回字符串列表，count 返回节点数
+CONFORMANCE_CASES = [
+    ('title::text', 'getall', ['Conformance & test']),
+    ('li.item::attr(data-id)', 'getall', ['1', '2', '3']),
+    ('li.item .title::text', 'getall', ['One', 'Two <2>', 'Three']),
+    ('li.item .price::text', 'getall', ['10', '20']),
+    ('li[hidden]::attr(hidden)', 'getall', ['']),
+    ('li:nth-child(2) .title::text', 'getall', ['Two <2>']),
+    ('li.first + li::attr(data-id)', 'getall', ['2']),
+    ('#main p::text', 'getall', ['Lead ', ' tail', '中文 note']),
+    ('#main p ::text', 'getall', ['Lead ', 'bold', ' tail', '中文 note']),
+    ('p.note::text', 'getall', ['中文 note']),
+    ('a::attr(href)', 'getall', ['/a?x=1&y=2', 'b.html']),
+    ('a[rel=next]::text', 'getall', ['B']),
+    ('base::attr(href)', 'getall', ['/base/']),
+    ('td::text', 'getall', ['1', '2', '3', '4']),
+    ('li', 'count', 3),
+    ('ul > li > span', 'count', 6),
+    ('div#main a', 'count', 3),
+    ('tr', 'count', 2),
+    ('missing', 'count', 0),
+]
+
+# li.item 节点上的查询: (css 查询, 结果处理, 每个节点的期望值)
+NODE_CASES = [
+    ('::text', 'getall', [['One', ' ', '10'], ['Two <2>', ' ', '20'], ['Three']]),
+    (' ::text', 'getall', [['One', ' ', '10'], ['Two <2>', ' ', '20'], ['Three']]),
+    ('::attr(data-id)', 'getall', [['1'], ['2'], ['3']]),
+    ('.title::text', 'getall', [['One'], ['Two <2>'], ['Three']]),
+    ('span::text', 'getall', [['One', '10'], ['Two <2>', '20'], ['Three']]),
+    ('span', 'count', [2, 2, 2]),
+]
+
+
+def create(name, html=CONFORMANCE_HTML):
+    return get_backend(name).create(body=html.encode('utf-8'), encoding='utf-8')
+
+
+def run_case(selector, query, kind):
+    result = selector.css(query)
+    return len(result) if kind == 'count' else result.getall()
+
+
+def check(backends, html=CONFORMANCE_HTML):
+    """
+    返回不一致的结果列表 [(后端, 查询, lxml 结果, 后端结果)]
+    """
+    expected = create('lxml', html)
+    failures = []
+    for name in backends:
+        if name == 'lxml': continue
+        selector = create(name, html)
+        for query, kind, _ in CONFORMANCE_CASES:
+            want, got = run_case(expected, query, kind), run_case(selector, query, kind)
+            if want != got: failures.append((name, query, want, got))
+
+        # 子节点上的查询
+        items, items_ = expected.css('li.item'), selector.css('li.item')
+        if len(items) != len(items_): failures.append((name, 'li.item', len(items), len(items_)))
+        for item, item_ in zip(items, items_):
+            for query, kind, _ in NODE_CASES:
+                want, got = run_case(item, query, kind), run_case(item_, query, kind)
+                if want != got: failures.append((name, f'li.item >> {query}', want, got))
+    return failures
@@ -0,0 +1,63 @@
+import datetime
+
+import pytest
+import requests.models
+from requests.exceptions import ConnectionError
+
+from espider.parser.response import Response
+from espider.utils.cassette import Cassette
+
+
+def make_download(body, status=200, elapsed=0.25):
+    def download():
+        resp = requests.models.Response()
+        resp._content = body
+        resp._content_consumed = True
+        resp.status_code = status
+        resp.reason = 'OK'
+        resp.url = 'http://example.com/a'
+        resp.headers['Content-Type'] = 'text/html; charset=gbk'
+        resp.encoding = 'gbk'
+        resp.elapsed = datetime.timedelta(seconds=elapsed)
+        return Response(resp)
+    return download
+
+
+def fail():
+    raise AssertionError('replay must not download')
+
+
+def test_record_and_replay(tmp_path):
+    path = str(tmp_path / 'site.cassette')
+    kwargs = {'method': 'GET', 'url': 'http://example.com/a', 'params': {'p': '1'}}
+
+    cassette = Cassette(path, mode='record')
+    recorded = cassette.fetch(kwargs, make_download('第一次'.encode('gbk'), elapsed=0.25))
+    cassette.fetch(kwargs, make_download('第二次'.encode('gbk'), status=500, elapsed=1.5))
+    cassette.close()
+    assert recorded.text == '第一次'
+
+    cassette = Cassette(path, mode='replay')
+    first = cassette.fetch(kwargs, fail)
+    second = cassette.fetch(kwargs, fail)
+    third = cassette.fetch(kwargs, fail)
+    assert (first.status_code, first.text, first.encoding) == (200, '第一次', 'gbk')
+    assert first.elapsed == datetime.timedelta(seconds=0.25)
+    assert (second.status_code, second.text, second.elapsed) == (500, '第二次', datetime.timedelta(seconds=1.5))
+    assert third.text == '第二次'
+    assert first.headers['content-type'] == 'text/html; charset=gbk'
+
+    with pytest.raises(ConnectionError):
+        cassette.fetch({**kwargs, 'params': {'p': '2'}}, fail)
+    assert cassette.count == {'Recorded': 0, 'Replayed': 3, 'Missed': 1}
+    cassette.close()
+
+
+def test_replay_fallback(tmp_path):
+    path = str(tmp_path / 'site.cassette')
+    Cassette(path, mode='record').close()
+
+    cassette = Cassette(path, mode='replay', strict=False)
+    response = cassette.fetch({'method': 'GET', 'url': 'http://example.com/a'}, make_download(b'live'))
+    assert response.content == b'live'
+    cassette.close()
@@ -0,0 +1,40 @@
+from espider.dbs import UrlSet
+
+
+def make_urls(n):
+    return [f'http://example.com/item/{i}?page={i % 7}' for i in range(n)]
+
+
+def test_url_set_add_and_contains():
+    urls = UrlSet(merge_size=50, block_size=4)
+    for url in make_urls(200):
+        assert urls.add(url)
+    assert not urls.add('http://example.com/item/3?page=3')
+    assert len(urls) == 200
+    assert all(url in urls for url in make_urls(200))
+    assert 'http://example.com/item/200?page=4' not in urls
+    assert list(urls) == sorted(make_urls(200))
+
+
+def test_url_set_reopen_with_other_block_size(tmp_path):
+    path = str(tmp_path / 'urls')
+    urls = UrlSet(path, merge_size=50, block_size=16)
+    for url in make_urls(300):
+        urls.add(url)
+    urls.close()
+
+    for block_size in (3, 16, 64):
+        urls = UrlSet(path, merge_size=50, block_size=block_size)
+        assert len(urls) == 300
+        assert all(url in urls for url in make_urls(300))
+        assert 'http://example.com/item/300?page=6' not in urls
+        urls.close()
+
+    # 合并后写回磁盘的数据保持正确
+    urls = UrlSet(path, merge_size=50, block_size=5)
+    for url in make_urls(400):
+        urls.add(url)
+    urls.close()
+    urls = UrlSet(path, block_size=16)
+    assert list(urls) == sorted(make_urls(400))
+    urls.close()
@@ -0,0 +1,114 @@
+import pytest
+
+from espider.parser import response as response_module
+from espider.utils.encoding import (
+    DETECT_SIZE, PRESCAN_SIZE, EncodingMemory, body_declared_encoding, detect_encoding, encoding_memory, prescan_encoding
+)
+
+from test_response import make_response
+
+
+@pytest.mark.parametrize('body, encoding', [
+    # BOM 优先于 xml 声明和 meta
+    (b'\xef\xbb\xbf<meta charset="gbk">', 'utf-8'),
+    (b'\xff\xfe<\x00h\x00', 'utf-16-le'),
+    (b'<?xml version="1.0" encoding="Shift_JIS"?><meta charset="utf-8">', 'cp932'),
+    (b'<html><head><meta charset="gbk"></head>', 'gb18030'),
+    (b'<META CHARSET=GB2312>', 'gb18030'),
+    (b'<meta http-equiv="Content-Type" content="text/html; charset=big5">', 'big5hkscs'),
+    # content 中的 charset 需要 http-equiv
+    (b'<meta content="text/html; charset=big5">', None),
+    # 注释和其他标签属性中的 meta 不算
+    (b'<!-- <meta charset="gbk"> --><meta charset="latin1">', 'cp1252'),
+    (b'<div title="<meta charset=gbk>"><meta charset=\'euc-jp\'>', 'euc_jp'),
+    # 规范要求 utf-16 按 utf-8 处理
+    (b'<meta charset="utf-16">', 'utf-8'),
+    (b'<meta charset="bogus"><meta charset="gbk">', 'gb18030'),
+    (b'<p>no declaration</p>', None),
+    (b'', None),
+])
+def test_body_declared_encoding(body, encoding):
+    assert body_declared_encoding(body) == encoding
+
+
+def test_prescan_limit():
+    body = b'<script>' + b'x' * PRESCAN_SIZE + b'</script><meta charset="gbk">'
+    assert body_declared_encoding(body) is None
+    assert prescan_encoding(body, limit=len(body)) == 'gb18030'
+
+
+def test_response_encoding_precedence():
+    body = '<meta charset="gbk"><p>中文</p>'.encode('gbk')
+
+    # header 中的 charset 优先
+    response = make_response(body, content_type='text/html; charset=utf-8')
+    assert response.encoding == 'utf-8'
+
+    # 没有 header 时使用页面声明，不需要构建 DOM
+    response = make_response(body, content_type='text/html')
+    assert response.encoding == 'gb18030'
+    assert response.text == '<meta charset="gbk"><p>中文</p>'
+    assert response._cached_selector is None
+
+    # 手动设置的编码优先
+    response = make_response(body, content_type='text/html')
+    response.encoding = 'latin-1'
+    assert response.text == body.decode('latin-1')
+
+
+@pytest.fixture
+def memory():
+    encoding_memory.clear()
+    yield encoding_memory
+    encoding_memory.clear()
+
+
+def test_encoding_memory_lru():
+    memory = EncodingMemory(maxsize=2)
+    memory.remember('a.com', 'gbk')
+    memory.remember('b.com', 'utf-8')
+    assert memory.get('a.com') == 'gbk'
+    memory.remember('c.com', 'big5')
+    assert (memory.get('a.com'), memory.get('b.com'), memory.get('c.com')) == ('gbk', None, 'big5')
+
+    memory.remember(None, 'gbk')
+    memory.remember('d.com', None)
+    memory.forget('a.com')
+    assert len(memory) == 1
+
+
+def test_detect_encoding_sample():
+    text = '中文内容，用于编码检测。' * 200
+    assert detect_encoding(text.encode('gbk')) in ('gb18030', 'gbk', 'gb2312')
+    assert detect_encoding(text.encode('utf-8')) == 'utf-8'
+    # 样本全是 ascii 时后续内容按 utf-8 处理
+    assert detect_encoding(b'a' * 64 + text.encode('utf-8'), sample_size=32) == 'utf-8'
+    assert detect_encoding(b'') is None
+
+
+def test_apparent_encoding_per_host(memory, monkeypatch):
+    calls = []
+
+    def detect(data, sample_size=DETECT_SIZE):
+        calls.append(sample_size)
+        return detect_encoding(data, sample_size=sample_size)
+
+    monkeypatch.setattr(response_module, 'detect_encoding', detect)
+    body = ('<p>' + '中文内容，用于编码检测。' * 200 + '</p>').encode('gbk')
+
+    first = make_response(body, content_type='text/html', url='http://gbk.example.com/1')
+    assert first.text.startswith('<p>中文内容')
+    second = make_response(body, content_type='text/html', url='http://gbk.example.com/2')
+    assert second.text == first.text
+    assert calls == [DETECT_SIZE]
+    assert memory.get('gbk.example.com') == first.apparent_encoding
+
+
+def test_apparent_encoding_redetect(memory):
+    # host 记录的编码解码出现替换字符时，检测全文并更新记录
+    memory.remember('example.com', 'utf-8')
+    body = ('<p>' + '中文内容，用于编码检测。' * 200 + '</p>').encode('gbk')
+    response = make_response(body, content_type='text/html', url='http://example.com/')
+    assert '�' not in response.text
+    assert response.text.startswith('<p>中文内容')
+    assert memory.get('example.com') == response.apparent_encoding != 'utf-8'
@@ -0,0 +1,79 @@
+import re
+
+import pytest
+import requests.models
+
+from espider.network import Downloader, Request
+from espider.parser.links import LinkExtractor
+from espider.parser.response import Response
+
+BODY = b'''<html><head><base href="/base/"></head><body>
+<a href="/Page/1?b=2&a=1#top">1</a>
+<a href="/page/1?a=1&b=2">1 again</a>
+<a href="page/2">2</a>
+<a href="http://ads.example.com/x">ad</a>
+<a href="http://cdn.example.com/file.PDF">pdf</a>
+<a href="mailto:a@example.com">mail</a>
+<a href="#anchor">anchor</a>
+<area href="/area">
+</body></html>'''
+
+
+def make_response(body=BODY, url='http://example.com/dir/index.html'):
+    resp = requests.models.Response()
+    resp._content = body
+    resp._content_consumed = True
+    resp.status_code = 200
+    resp.url = url
+    resp.headers['Content-Type'] = 'text/html; charset=utf-8'
+    return Response(resp)
+
+
+def test_extract_links():
+    links = make_response().extract_links()
+    assert links == [
+        'http://example.com/Page/1?a=1&b=2',
+        'http://example.com/page/1?a=1&b=2',
+        'http://example.com/base/page/2',
+        'http://ads.example.com/x',
+        'http://cdn.example.com/file.PDF',
+        'http://example.com/area',
+    ]
+
+
+def test_domains_and_extensions():
+    extractor = LinkExtractor(deny_domains=['ads.example.com'], deny_extensions=['pdf'], tags=['a'])
+    assert make_response().extract_links(extractor) == [
+        'http://example.com/Page/1?a=1&b=2',
+        'http://example.com/page/1?a=1&b=2',
+        'http://example.com/base/page/2',
+    ]
+    extractor = LinkExtractor(allow_domains=['example.com'], deny_domains=['cdn.example.com'])
+    assert 'http://cdn.example.com/file.PDF' not in make_response().extract_links(extractor)
+
+
+def test_pattern_flags():
+    # 预编译正则的 flags 要保留
+    extractor = LinkExtractor(allow=re.compile(r'\.com/page/\d+', re.I))
+    assert make_response().extract_links(extractor) == [
+        'http://example.com/Page/1?a=1&b=2', 'http://example.com/page/1?a=1&b=2'
+    ]
+
+    # 后面的正则带全局内联 flags
+    extractor = LinkExtractor(allow=[r'/area$', r'(?i)\.pdf$'])
+    assert make_response().extract_links(extractor) == ['http://cdn.example.com/file.PDF', 'http://example.com/area']
+
+    extractor = LinkExtractor(deny=[r'/base/', re.compile('/PAGE/', re.I)], tags=['a'])
+    assert make_response().extract_links(extractor) == ['http://ads.example.com/x', 'http://cdn.example.com/file.PDF']
+
+
+def test_push_many_rejects_invalid():
+    downloader = Downloader()
+    request = Request('http://example.com/', downloader=downloader)
+    with pytest.raises(TypeError, match='index 1'):
+        downloader.push_many([request, 'http://example.com/b'])
+    with pytest.raises(TypeError):
+        downloader.push('http://example.com/')
+
+    downloader.push_many([request])
+    assert downloader.request_pool.pop() is request
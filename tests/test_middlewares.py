@@ -0,0 +1,151 @@
+import requests.models
+
+from espider.middlewares import HttpCacheMiddleware, SeenFilter
+from espider.network import Downloader, Request
+from espider.parser.response import Response
+
+
+def make_request(url, **kwargs):
+    return Request(url, downloader=Downloader(), **kwargs)
+
+
+def test_seen_filter_drops_second_push():
+    seen_filter = SeenFilter()
+    assert seen_filter.process_request(make_request('http://example.com/a?b=1&a=2')) != 'drop'
+    assert seen_filter.process_request(make_request('http://example.com/a?a=2&b=1')) == 'drop'
+    assert seen_filter.process_request(make_request('http://example.com/b')) != 'drop'
+    assert seen_filter.number == 1
+
+
+def test_seen_filter_priority():
+    seen_filter = SeenFilter(priority=1)
+    assert seen_filter.process_request(make_request('http://example.com/a')) != 'drop'
+    assert seen_filter.process_request(make_request('http://example.com/a')) != 'drop'
+
+    assert seen_filter.process_request(make_request('http://example.com/a', priority=1)) != 'drop'
+    assert seen_filter.process_request(make_request('http://example.com/a', priority=1)) == 'drop'
+
+
+class FlakyTransport(object):
+    """
+    第一次返回 500，之后返回 200
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def fetch(self, request_kwargs, download):
+        self.calls += 1
+        resp = requests.models.Response()
+        resp._content = b'ok'
+        resp._content_consumed = True
+        resp.status_code = 500 if self.calls == 1 else 200
+        resp.url = request_kwargs['url']
+        return Response(resp)
+
+
+def test_seen_filter_lets_retries_through():
+    downloader = Downloader(transport=FlakyTransport())
+    seen_filter = SeenFilter()
+    downloader.add_middleware(seen_filter)
+
+    responses = []
+    request = Request('http://example.com/a', downloader=downloader, max_retry=2, callback=responses.append)
+    request.run()
+    assert downloader.transport.calls == 2
+    assert request.success and request.retry_times == 1
+    assert [_.status_code for _ in responses] == [200]
+    assert seen_filter.number == 0
+
+    assert seen_filter.process_request(make_request('http://example.com/a')) == 'drop'
+
+
+class ServerTransport(object):
+    """
+    按 url 返回预设的响应头，带 If-None-Match 且 ETag 一致时返回 304
+    """
+
+    def __init__(self, headers, body=b'<p>page</p>'):
+        self.headers = headers
+        self.body = body
+        self.requests = []
+
+    def fetch(self, request_kwargs, download):
+        request_headers = dict(request_kwargs.get('headers') or {})
+        self.requests.append(request_headers)
+
+        resp = requests.models.Response()
+        resp.url = request_kwargs['url']
+        resp._content_consumed = True
+        resp.headers.update(self.headers)
+        if self.headers.get('ETag') and request_headers.get('If-None-Match') == self.headers['ETag']:
+            resp.status_code, resp._content = 304, b''
+        else:
+            resp.status_code, resp._content = 200, self.body
+        return Response(resp)
+
+
+def fetch_with_cache(cache, transport, url='http://example.com/a'):
+    downloader = Downloader(transport=transport)
+    downloader.add_middleware(cache)
+    responses = []
+    Request(url, downloader=downloader, callback=responses.append).run()
+    return responses[0]
+
+
+def test_http_cache_fresh_hit(tmp_path):
+    cache = HttpCacheMiddleware(path=str(tmp_path / 'cache.db'))
+    transport = ServerTransport({'Cache-Control': 'max-age=60', 'Content-Type': 'text/html; charset=utf-8'})
+
+    first = fetch_with_cache(cache, transport)
+    second = fetch_with_cache(cache, transport)
+    assert len(transport.requests) == 1
+    assert not getattr(first, 'from_cache', False) and second.from_cache
+    assert second.status_code == 200 and second.text == '<p>page</p>'
+    assert cache.count['Hit'] == 1 and cache.count['Stored'] == 1
+
+
+def test_http_cache_revalidation(tmp_path):
+    cache = HttpCacheMiddleware(path=str(tmp_path / 'cache.db'))
+    transport = ServerTransport({'Cache-Control': 'no-cache', 'ETag': '"v1"', 'Last-Modified': 'Mon, 19 Oct 2026 00:00:00 GMT'})
+
+    fetch_with_cache(cache, transport)
+    response = fetch_with_cache(cache, transport)
+    assert transport.requests[1] == {'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon, 19 Oct 2026 00:00:00 GMT'}
+
+    # 304 换成缓存中的 200 响应
+    assert response.status_code == 200 and response.from_cache
+    assert response.content == b'<p>page</p>'
+    assert cache.count['Revalidated'] == 1
+
+    # 内容变化时返回并保存新响应
+    transport.headers['ETag'], transport.body = '"v2"', b'<p>new</p>'
+    response = fetch_with_cache(cache, transport)
+    assert response.content == b'<p>new</p>' and not getattr(response, 'from_cache', False)
+    assert fetch_with_cache(cache, transport).content == b'<p>new</p>'
+    assert cache.count['Revalidated'] == 2
+
+
+def test_http_cache_no_store_and_policy(tmp_path):
+    cache = HttpCacheMiddleware(path=str(tmp_path / 'rfc.db'))
+    transport = ServerTransport({'Cache-Control': 'no-store, max-age=60'})
+    fetch_with_cache(cache, transport)
+    fetch_with_cache(cache, transport)
+    assert len(transport.requests) == 2 and cache.count['Stored'] == 0
+
+    cache = HttpCacheMiddleware(path=str(tmp_path / 'always.db'), policy='always', ttl=60)
+    fetch_with_cache(cache, transport)
+    assert fetch_with_cache(cache, transport).from_cache
+    assert len(transport.requests) == 3
+
+
+def test_http_cache_eviction(tmp_path):
+    cache = HttpCacheMiddleware(path=str(tmp_path / 'cache.db'), policy='always', max_size=25)
+    transport = ServerTransport({}, body=b'x' * 10)
+    for page in range(4):
+        fetch_with_cache(cache, transport, url=f'http://example.com/{page}')
+    assert cache.count['Evicted'] == 2 and cache.total_size == 20
+
+    fetch_with_cache(cache, transport, url='http://example.com/3')
+    fetch_with_cache(cache, transport, url='http://example.com/0')
+    assert len(transport.requests) == 5
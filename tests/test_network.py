@@ -0,0 +1,73 @@
+import threading
+import time
+
+import requests.models
+
+from espider.network import Downloader, Request
+from espider.parser.response import Response
+
+
+class BlockingTransport(object):
+    """
+    请求阻塞到 release 被设置，用于让多个请求同时处于进行中
+    """
+
+    def __init__(self):
+        self.urls = []
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def fetch(self, request_kwargs, download):
+        with self._lock:
+            self.urls.append(request_kwargs['url'])
+        self.release.wait(5)
+        resp = requests.models.Response()
+        resp._content = str(request_kwargs.get('cookies')).encode()
+        resp._content_consumed = True
+        resp.status_code = 200
+        resp.url = request_kwargs['url']
+        return Response(resp)
+
+
+def wait_until(condition, timeout=5):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.01)
+    assert condition()
+
+
+def run_requests(kwargs_list):
+    downloader = Downloader(coalesce=True, transport=BlockingTransport())
+    bodies = []
+    requests_ = [
+        Request('http://example.com/a', downloader=downloader, callback=lambda r: bodies.append(r.content), **kwargs)
+        for kwargs in kwargs_list
+    ]
+    requests_[0].start()
+    wait_until(lambda: len(downloader.transport.urls) == 1)
+    for request in requests_[1:]:
+        request.start()
+    wait_until(lambda: len(downloader.transport.urls) + downloader.inflight.number == len(requests_))
+    downloader.transport.release.set()
+    for request in requests_:
+        request.join()
+    return downloader, sorted(bodies)
+
+
+def test_coalesce_identical_requests():
+    downloader, bodies = run_requests([{'cookies': {'user': 'a'}}, {'cookies': {'user': 'a'}}])
+    assert len(downloader.transport.urls) == 1
+    assert downloader.inflight.number == 1
+    assert bodies == [b"{'user': 'a'}"] * 2
+
+
+def test_no_coalesce_with_different_credentials():
+    downloader, bodies = run_requests([
+        {'cookies': {'user': 'a'}},
+        {'cookies': {'user': 'b'}},
+        {'cookies': {'user': 'a'}, 'headers': {'Authorization': 'Bearer b'}},
+        {'cookies': {'user': 'a'}, 'proxies': {'http': 'http://127.0.0.1:1'}},
+    ])
+    assert len(downloader.transport.urls) == 4
+    assert downloader.inflight.number == 0
+    assert bodies == [b"{'user': 'a'}"] * 3 + [b"{'user': 'b'}"]
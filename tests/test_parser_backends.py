@@ -0,0 +1,106 @@
+import pytest
+import requests.models
+
+from espider.parser.backends import available_backends
+from espider.parser.plan import ExtractionPlan
+from espider.parser.response import Response
+from espider.parser.selector import CannotRemoveElementWithoutRoot
+
+from conformance import CONFORMANCE_CASES, CONFORMANCE_HTML, NODE_CASES, check, create, run_case
+
+# 只有 lexbor 相关的用例依赖 selectolax
+lexbor = pytest.param(
+    'lexbor', marks=pytest.mark.skipif('lexbor' not in available_backends(), reason='selectolax is not installed')
+)
+BACKENDS = ['lxml', lexbor]
+
+
+def make_response(parser, normalize=None):
+    resp = requests.models.Response()
+    resp._content = CONFORMANCE_HTML.encode('utf-8')
+    resp._content_consumed = True
+    resp.status_code = 200
+    resp.url = 'http://example.com/dir/page.html'
+    resp.headers['Content-Type'] = 'text/html; charset=utf-8'
+    resp.encoding = 'utf-8'
+
+    response = Response(resp)
+    response.parser = parser
+    if normalize: response.normalize = normalize
+    return response
+
+
+def test_check():
+    assert check(available_backends()) == []
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('query, kind, expected', CONFORMANCE_CASES)
+def test_document_queries(backend, query, kind, expected):
+    assert run_case(create(backend), query, kind) == expected
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('query, kind, expected', NODE_CASES)
+def test_node_queries(backend, query, kind, expected):
+    items = create(backend).css('li.item')
+    assert len(items) == len(expected)
+    assert [run_case(item, query, kind) for item in items] == expected
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_attrib(backend):
+    assert [_.attrib for _ in create(backend).css('li.item')] == [
+        {'class': 'item first', 'data-id': '1'},
+        {'class': 'item', 'data-id': '2'},
+        {'class': 'item', 'data-id': '3', 'hidden': ''},
+    ]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_remove(backend):
+    selector = create(backend)
+    selector.css('li[hidden]')[0].remove()
+    assert selector.css('li.item::attr(data-id)').getall() == ['1', '2']
+
+    with pytest.raises(CannotRemoveElementWithoutRoot):
+        selector.css('li::attr(data-id)')[0].remove()
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_absolute_links(backend):
+    response = make_response(backend, ['absolute_links'])
+    assert response.css('a::attr(href)').getall() == ['http://example.com/a?x=1&y=2', 'http://example.com/base/b.html']
+    assert response.extract_links() == ['http://example.com/a?x=1&y=2', 'http://example.com/base/b.html']
+
+
+def test_extraction_plan():
+    response = make_response('lxml')
+    assert ExtractionPlan({'title': 'title::text', 'ids': 'li.item::attr(data-id)'}, first=True).run(response) == {
+        'title': 'Conformance & test', 'ids': '1'
+    }
+
+
+@pytest.mark.parametrize('backend', [lexbor])
+def test_xpath_not_supported(backend):
+    response = make_response(backend)
+    with pytest.raises(TypeError):
+        response.xpath('//a')
+    with pytest.raises(TypeError):
+        response.xpath_map({'a': '//a/@href'})
+    with pytest.raises(TypeError):
+        ExtractionPlan({'title': 'title::text'}).run(response)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_absolute_links_keep_invalid(backend):
+    resp = requests.models.Response()
+    resp._content = b'<html><head><base href="/base/"></head><body><a href="http://[bad">x</a><a href="a">a</a></body></html>'
+    resp._content_consumed = True
+    resp.status_code = 200
+    resp.url = 'http://example.com/dir/page.html'
+    response = Response(resp)
+    response.parser = backend
+    response.normalize = ['absolute_links']
+    assert response.css('a::attr(href)').getall() == ['http://[bad', 'http://example.com/base/a']
+    assert response.css('base::attr(href)').getall() == ['http://example.com/base/']
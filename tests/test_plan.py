@@ -0,0 +1,77 @@
+import pytest
+
+from espider.parser.plan import ExtractionPlan, classify_query
+from espider.parser.selector import Selector
+
+HTML = '''<html><head><title>Shop</title></head><body>
+<div class="item" data-id="1"><a href="/1">One</a><span class="price">price: 10</span></div>
+<div class="item" data-id="2"><a href="/2">Two</a><span class="price">price: 20</span></div>
+<div class="item" data-id="3"><a href="/3">Three</a><span class="price">price: 30</span></div>
+<div class="other"><a href="/x">X</a></div>
+</body></html>'''
+
+XPATH_MAP = {
+    'id': '//div[@class="item"]/@data-id',
+    'link': '//div[@class="item"]/a/@href',
+    'name': '//div[@class="item"]/a/text()',
+    'price': '//div[@class="item"]/span[@class="price"]/text()',
+}
+
+CSS_MAP = {
+    'link': 'div.item a::attr(href)',
+    'name': 'div.item a::text',
+}
+
+
+@pytest.mark.parametrize('query, kind', [
+    ('//div/a', 'xpath'),
+    ('./a/@href', 'xpath'),
+    ('(//a)[1]', 'xpath'),
+    ('div.item a::text', 'css'),
+    ('title', 'css'),
+    (r'price: (\d+)', 're'),
+    ('re:title', 're'),
+    ('xpath:string(//title)', 'xpath'),
+    ('css:a', 'css'),
+])
+def test_classify_query(query, kind):
+    assert classify_query(query)[0] == kind
+
+
+def test_plan_matches_xpath_map():
+    selector = Selector(text=HTML)
+    plan = ExtractionPlan(XPATH_MAP)
+    assert plan._batches
+    assert plan.run(selector) == selector.xpath_map(XPATH_MAP)
+    assert ExtractionPlan(XPATH_MAP, first=True).run(selector) == selector.xpath_map(XPATH_MAP, first=True)
+
+    assert ExtractionPlan(CSS_MAP).run(selector) == selector.css_map(CSS_MAP)
+    assert ExtractionPlan(CSS_MAP, first=True).run(selector) == selector._query_from_map(selector.css, CSS_MAP, first=True)
+
+
+def test_plan_mixed_fields():
+    plan = ExtractionPlan({
+        'title': 'title::text',
+        'price': r'price: (\d+)',
+        'links': {'href': '//div[@class="item"]/a/@href', 'text': '//div[@class="item"]/a/text()'},
+    }, first=True)
+    assert plan.run(Selector(text=HTML)) == {
+        'title': 'Shop', 'price': '10', 'links': {'href': '/1', 'text': 'One'}
+    }
+
+    # 长度不同的字段以第一个字段为准，缺少的值为 None
+    plan = ExtractionPlan({'name': '//div/a/text()', 'id': '//div/@data-id'})
+    assert plan.run(Selector(text=HTML))[-1] == {'name': 'X', 'id': None}
+
+
+def test_plan_nested_prefix_falls_back():
+    html = '<div class="a"><p>1</p><div class="a"><p>2</p></div></div>'
+    query_map = {'p': '//div[@class="a"]/p/text()', 'n': '//div[@class="a"]/p/text()'}
+    assert ExtractionPlan(query_map).run(Selector(text=html)) == Selector(text=html).xpath_map(query_map)
+
+
+def test_plan_invalid_queries():
+    with pytest.raises(ValueError):
+        ExtractionPlan({'a': '//div['})
+    with pytest.raises(TypeError):
+        ExtractionPlan({'a': 1})
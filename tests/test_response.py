@@ -0,0 +1,316 @@
+import io
+import pickle
+import re
+
+import pytest
+import requests.models
+
+from espider.network import Downloader, Request
+from espider.parser.response import FAIL_ENCODING, SPECIAL_CHARACTERS, SPECIAL_CHARACTER_PATTERNS, Response
+
+
+def make_response(body, content_type='text/html', status=200, url='http://example.com/'):
+    resp = requests.models.Response()
+    resp._content = body
+    resp._content_consumed = True
+    resp.status_code = status
+    resp.url = url
+    resp.headers['Content-Type'] = content_type
+    resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+    return Response(resp)
+
+
+class StaticTransport(object):
+    """
+    所有请求返回同一个 body
+    """
+
+    def __init__(self, body, content_type='text/html', status=200):
+        self.body = body
+        self.content_type = content_type
+        self.status = status
+
+    def fetch(self, request_kwargs, download):
+        return make_response(self.body, content_type=self.content_type, status=self.status, url=request_kwargs['url'])
+
+
+def test_between():
+    response = make_response(b'<b>1</b><b>2</b><b>3')
+    assert response.between('<b>', '</b>') == b'1'
+    assert response.between_all(b'<b>', b'</b>') == [b'1', b'2']
+    assert bytes(response.between_all('<b>', '</b>', view=True)[1]) == b'2'
+    assert response.between('<i>', '</i>', default=b'') == b''
+
+
+@pytest.mark.parametrize('start, end', [(b'', b'x'), (b'x', b''), ('', '')])
+def test_between_empty_marker(start, end):
+    response = make_response(b'xxx')
+    with pytest.raises(ValueError):
+        response.between_all(start, end)
+    with pytest.raises(ValueError):
+        response.between(start, end)
+
+
+@pytest.mark.parametrize('body, content_type, is_json', [
+    (b' {"a": 1}', 'application/json', True),
+    (b'[1, 2]', 'application/vnd.api+json; charset=utf-8', True),
+    (b'{"a": 1}', '', True),
+    (b'{"a": 1}', 'text/html; charset=utf-8', True),
+    (b'\xef\xbb\xbf[1]', 'text/plain', True),
+    (b'[if IE]', 'text/html', False),
+    (b'{a: 1}', 'text/plain', False),
+    (b'<html><body>{}</body></html>', 'application/json', False),
+    (b'<!DOCTYPE html><html></html>', 'text/html; charset=utf-8', False),
+    (b'', 'text/html', False),
+])
+def test_is_json(body, content_type, is_json):
+    response = make_response(body, content_type=content_type)
+    if not content_type: del response.headers['Content-Type']
+    assert response.is_json is is_json
+
+    with pytest.warns(DeprecationWarning):
+        assert response.is_html is is_json
+
+
+def test_special_character_aliases():
+    assert FAIL_ENCODING == 'ISO-8859-1'
+    assert SPECIAL_CHARACTER_PATTERNS[0].sub('', 'a\x00b\x7f\x9fc\t\n中') == 'abc\t\n中'
+    assert re.compile(SPECIAL_CHARACTERS[0]).pattern == SPECIAL_CHARACTER_PATTERNS[0].pattern
+
+
+def test_text_is_memoized():
+    response = make_response('<p>中\x00文</p>'.encode('utf-8'), content_type='text/html; charset=utf-8')
+    text = response.text
+    assert text == '<p>中\x00文</p>'
+    assert response.text is text and response.raw_text is text
+
+    # 修改编码后重新解码
+    response.encoding = 'gbk'
+    assert response.text is not text and response.text == '<p>中\x00文</p>'.encode('utf-8').decode('gbk', 'replace')
+
+
+def test_text_normalize():
+    response = make_response('<p>中\x00文\x7f</p>'.encode('utf-8'), content_type='text/html; charset=utf-8')
+    response.normalize = ['special_character']
+    text = response.text
+    assert text == '<p>中文</p>'
+    assert response.text is text
+    assert response.raw_text == '<p>中\x00文\x7f</p>'
+
+    response.normalize = True
+    assert set(response.normalize) == {'absolute_links', 'special_character', 'fail_encoding'}
+    response.normalize = None
+    assert response.text == '<p>中\x00文\x7f</p>'
+
+    with pytest.raises(ValueError):
+        response.normalize = ['missing']
+
+
+def test_request_normalize_setting():
+    downloader = Downloader(transport=StaticTransport(b'<p>a\x00b</p>', 'text/html; charset=utf-8'))
+    texts = []
+    Request('http://example.com/', downloader=downloader, normalize=['special_character'],
+            callback=lambda r: texts.append(r.text)).run()
+    Request('http://example.com/', downloader=downloader, callback=lambda r: texts.append(r.text)).run()
+    assert texts == ['<p>ab</p>', '<p>a\x00b</p>']
+
+
+LINKS_BODY = b'''<html><head><base href="/base/"></head><body>
+<a href="a.html">a</a><img src="/img.png"><link href="style.css"><script src="//cdn.example.com/s.js"></script>
+<a href="http://other.com/x">x</a><a href="http://[bad">bad</a>
+</body></html>'''
+
+
+def test_absolute_links():
+    response = make_response(LINKS_BODY, url='http://example.com/dir/page.html')
+    response.normalize = ['absolute_links']
+    assert response.base_url == 'http://example.com/base/'
+    assert response.css('a::attr(href)').getall() == [
+        'http://example.com/base/a.html', 'http://other.com/x', 'http://[bad'
+    ]
+    assert response.css('img::attr(src)').get() == 'http://example.com/img.png'
+    assert response.css('link::attr(href)').get() == 'http://example.com/base/style.css'
+    assert response.css('script::attr(src)').get() == 'http://cdn.example.com/s.js'
+
+    # text 不改写链接
+    assert b'href="a.html"' in response.text.encode()
+
+
+def test_links_untouched_without_normalize():
+    response = make_response(LINKS_BODY, url='http://example.com/dir/page.html')
+    assert response.css('a::attr(href)').get() == 'a.html'
+    assert response.urljoin('b.html') == 'http://example.com/base/b.html'
+    assert response.urljoin('/c') == 'http://example.com/c'
+
+    response = make_response(b'<a href="b.html">b</a>', url='http://example.com/dir/page.html')
+    assert response.base_url == 'http://example.com/dir/page.html'
+    assert response.urljoin('b.html') == 'http://example.com/dir/b.html'
+
+
+def test_selector_from_bytes():
+    body = '<html><body><p>中文</p></body></html>'.encode('gbk')
+    response = make_response(body, content_type='text/html; charset=gbk')
+    assert response.css('p::text').get() == '中文'
+    # 没有开启文本归一化时不解码全文
+    assert response._cached_raw_text is None and response._cached_text is None
+
+    response = make_response(b'<p>a\x01b</p>', content_type='text/html; charset=utf-8')
+    response.normalize = ['special_character']
+    assert response.css('p::text').get() == 'ab'
+
+    response = make_response('<p>中文</p>'.encode(), content_type='text/html; charset=x-unknown')
+    assert response.css('p::text').get() == response.text[3:5] == '中文'
+
+
+class FakeRaw(object):
+    """
+    非 urllib3 的 file-like raw，记录连接是否被释放
+    """
+
+    def __init__(self, body):
+        self.body = io.BytesIO(body)
+        self.released = 0
+        self.closed = False
+
+    def read(self, size=None):
+        return self.body.read(size)
+
+    def release_conn(self):
+        self.released += 1
+
+    def close(self):
+        self.closed = True
+
+
+def make_stream_response(body):
+    resp = requests.models.Response()
+    resp._content = False
+    resp._content_consumed = False
+    resp.status_code = 200
+    resp.url = 'http://example.com/'
+    resp.raw = FakeRaw(body)
+    return Response(resp), resp.raw
+
+
+def test_slots():
+    response = make_response(b'<p>a</p>')
+    assert 'status_code' not in response.__dict__ and '_content' not in response.__dict__
+    # 中间件设置的自定义属性保存在 __dict__ 中
+    response.from_cache = True
+    assert response.__dict__ == {'from_cache': True}
+
+
+def test_raw_released():
+    raw = FakeRaw(b'')
+    resp = requests.models.Response()
+    resp._content = b'<p>a</p>'
+    resp._content_consumed = True
+    resp.raw = raw
+    response = Response(resp)
+    assert response.raw is None and raw.released == 1
+    assert response.content == b'<p>a</p>'
+
+    response, raw = make_stream_response(b'<p>a</p>' * 100)
+    assert response.raw is raw and not raw.released
+    assert b''.join(response.iter_content(64)) == b'<p>a</p>' * 100
+    assert response.raw is None and raw.released == 1
+    response.close()
+    assert raw.released == 1
+
+
+def test_close_stream():
+    response, raw = make_stream_response(b'<p>a</p>')
+    response.close()
+    assert raw.closed and raw.released == 1 and response.raw is None
+    response.close()
+
+
+def test_encoding_from_charset_only():
+    # requests 对没有 charset 的 text/html 默认 ISO-8859-1，不应覆盖页面声明的编码
+    body = '<meta charset="gbk"><p>中文</p>'.encode('gbk')
+    response = make_response(body, content_type='text/html')
+    assert response._encoding is None
+    assert response.encoding == 'gb18030' and '中文' in response.text
+    assert make_response(body, content_type='text/html; charset=gbk')._encoding == 'gbk'
+
+
+def test_error_status_kept():
+    response = make_response(b'missing', status=404)
+    assert response.status_code == 404 and response.content == b'missing'
+    assert not response.ok
+
+
+def test_plain_object():
+    class Plain(object):
+        def __init__(self):
+            self.text = '<p>中文</p>'
+            self.status = 201
+
+    response = Response(Plain())
+    assert response.content == '<p>中文</p>'.encode()
+    assert response.status_code == 201
+    assert response.css('p::text').get() == '中文'
+
+    response = Response()
+    assert response.status_code is None and response.content is None
+    assert len(response.headers) == 0 and len(response.cookies) == 0
+
+
+def test_release():
+    response = make_response(b'{"a": [{"b": 1}]}', content_type='application/json')
+    assert response.find('b') == 1 and response.css('p') is not None
+    assert response._cached_selector is not None and response._cached_json_index is not None
+
+    response.release()
+    assert response._cached_selector is None and response._cached_text is None
+    assert response._cached_json_index is None
+    # 之后访问时重新构建
+    assert response.content == b'{"a": [{"b": 1}]}'
+    assert response.find('b') == 1
+
+
+def test_released_after_callback():
+    downloader = Downloader(transport=StaticTransport(b'<p>a</p>', 'text/html; charset=utf-8'))
+    responses = []
+
+    def parse(response):
+        assert response.css('p::text').get() == 'a'
+        responses.append(response)
+
+    Request('http://example.com/', downloader=downloader, callback=parse).run()
+    response, = responses
+    assert response._cached_selector is None and response._cached_text is None
+    assert response.content == b'<p>a</p>' and response.css('p::text').get() == 'a'
+
+
+def test_copy():
+    response = make_response(b'<p>a</p>', content_type='text/html; charset=utf-8')
+    response.request_kwargs = {'url': 'http://example.com/'}
+    response.normalize = ['special_character']
+
+    copied = response.copy()
+    assert copied is not response and type(copied) is Response
+    assert copied.content is response.content
+    assert copied.request_kwargs is response.request_kwargs
+    assert copied.normalize == response.normalize
+    assert copied.encoding == 'utf-8' and copied.css('p::text').get() == 'a'
+
+    # 自定义属性各自独立
+    copied.from_cache = True
+    assert not hasattr(response, 'from_cache')
+
+
+def test_pickle():
+    response = make_response(b'<p>a</p>', content_type='text/html; charset=utf-8', status=201)
+    response.css('p')
+
+    loaded = pickle.loads(pickle.dumps(response))
+    assert loaded.content == b'<p>a</p>' and loaded.status_code == 201
+    assert loaded.encoding == 'utf-8' and loaded.url == 'http://example.com/'
+    assert loaded.headers['Content-Type'] == 'text/html; charset=utf-8'
+    assert loaded.raw is None and loaded._cached_selector is None
+    assert loaded.css('p::text').get() == 'a'
+
+    response, raw = make_stream_response(b'<p>b</p>')
+    loaded = pickle.loads(pickle.dumps(response))
+    assert loaded.content == b'<p>b</p>' and raw.released == 1
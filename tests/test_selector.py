@@ -0,0 +1,132 @@
+import threading
+
+import pytest
+
+from espider.parser.selector import QueryCache, Selector, ValueList, compile_xpath, iterparse, query_cache_clear, query_cache_info
+
+
+def iter_document(n):
+    yield b'<?xml version="1.0"?><root xmlns="http://x"><urlset>'
+    for i in range(n):
+        yield f'<url><loc>http://a/{i}</loc></url><other><loc>junk{i}</loc><url><loc>n{i}</loc></url></other>'.encode()
+    yield b'</urlset></root>'
+
+
+def test_iterparse_releases_unmatched_elements():
+    count = 0
+    for selector in iterparse(iter_document(1000), 'urlset/url', type='xml'):
+        # 已处理的兄弟节点（包括不匹配的 other）都已删除，只剩上一个、当前和已读入的下一个节点
+        assert len(selector.root.getparent()) <= 3
+        assert selector.xpath('string(.)').get() == f'http://a/{count}'
+        count += 1
+    assert count == 1000
+
+
+def test_iterparse_nested_matches():
+    chunks = [b'<a><b><c>1</c><b><c>2</c></b></b><c>3</c></a>']
+    assert [_.css('c::text').getall() for _ in iterparse(chunks, 'b', type='xml')] == [['2'], ['1', '2']]
+
+
+def test_register_namespace_does_not_leak():
+    selector = Selector(text='<root><a><b>1</b></a><a><b>2</b></a></root>', type='xml')
+    first, second = selector.xpath('//a')
+    first.register_namespace('x', 'http://x')
+    assert 'x' in first.namespaces
+    assert 'x' not in second.namespaces
+    assert 'x' not in selector.namespaces
+    assert 'x' in first.xpath('b')[0].namespaces
+
+    values = selector.xpath_values('//a')
+    values[0].register_namespace('y', 'http://y')
+    assert 'y' not in values[1].namespaces and 'y' not in selector.namespaces
+
+
+def test_pooled_xpath_threads():
+    selector = Selector(text=''.join(f'<p>{i}</p>' for i in range(100)))
+    xpath = compile_xpath('//p/text()')
+    assert compile_xpath('//p/text()') is xpath
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(len(xpath(selector.root)))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [100] * 8
+    assert 1 <= len(xpath._free) <= 8
+
+
+@pytest.mark.parametrize('encoding', ['utf-8', 'gbk', 'cp932', 'euc_jp', 'utf-16', 'utf-16-le'])
+def test_selector_from_body(encoding):
+    body = '\n  <html><body><p class="t">中文 text</p></body></html>'.encode(encoding)
+    selector = Selector(body=body, encoding=encoding)
+    assert selector.css('p.t::text').get() == '中文 text'
+
+
+def test_selector_from_body_cleanup():
+    # 开头的空白和 \x00 不影响解析
+    selector = Selector(body=b'\x00 \n<p>a\x00b</p>', encoding='utf-8')
+    assert selector.css('p::text').get() == 'ab'
+    assert Selector(body=b'   ', encoding='utf-8').css('p') == []
+    # python 和 libxml2 都不认识的编码按 utf-8 解码
+    assert Selector(body='<p>中文</p>'.encode(), encoding='x-unknown').css('p::text').get() == '中文'
+    with pytest.raises(TypeError):
+        Selector(body='<p>text</p>')
+
+
+def test_query_cache_lru():
+    cache = QueryCache(maxsize=2)
+    assert cache.get('a', lambda: 1) == 1
+    assert cache.get('b', lambda: 2) == 2
+    assert cache.get('a', lambda: 0) == 1
+    assert cache.get('c', lambda: 3) == 3
+    assert cache.get('b', lambda: 4) == 4
+    assert cache.info() == {'hits': 1, 'misses': 4, 'size': 2, 'maxsize': 2}
+
+    # 编译失败不缓存
+    with pytest.raises(ValueError):
+        cache.get('d', lambda: int('x'))
+    assert cache.info()['size'] == 2
+
+
+def test_query_cache_shared_across_selectors():
+    query_cache_clear()
+    for i in range(3):
+        selector = Selector(text=f'<div><p class="a">{i}</p></div>')
+        assert selector.css('div p.a::text').get() == str(i)
+        assert selector.xpath('//p/text()').get() == str(i)
+    info = query_cache_info()
+    assert info['css']['misses'] == 1 and info['css']['hits'] == 2
+    assert info['xpath']['size'] == 2
+
+    # namespaces 不同的 xpath 分别编译
+    xml = Selector(text='<r xmlns:x="http://x"><x:a>1</x:a></r>', type='xml')
+    assert xml.xpath('//y:a/text()', namespaces={'y': 'http://x'}).get() == '1'
+    assert xml.xpath('//y:a/text()', namespaces={'y': 'http://other'}).get() is None
+    assert compile_xpath('//p', {'y': 'http://x'}) is not compile_xpath('//p', {'y': 'http://other'})
+
+    with pytest.raises(ValueError):
+        Selector(text='<p/>').xpath('//p[')
+
+
+def test_value_list_matches_selector_list():
+    selector = Selector(text='<table><tr><td a="1">x</td><td a="2">y</td></tr><tr><td a="3">z</td></tr></table>')
+    for query in ('//td/text()', '//td/@a', '//td', 'count(//td)', 'boolean(//td)', '//missing'):
+        values = selector.xpath_values(query)
+        assert isinstance(values, ValueList)
+        assert values.getall() == selector.xpath(query).getall()
+        assert values.get() == selector.xpath(query).get()
+
+    # 文本和属性为普通字符串，元素在访问时才包装为 Selector
+    values = selector.xpath_values('//td/@a')
+    assert all(type(_) is str for _ in list.__iter__(values))
+    cells = selector.css_values('td')
+    assert isinstance(cells[0], Selector) and cells[0].css('::attr(a)').get() == '1'
+    assert [_.xpath('text()').get() for _ in cells] == ['x', 'y', 'z']
+    assert isinstance(cells[1:], ValueList) and cells[1:].getall() == selector.css('td')[1:].getall()
+
+    # SelectorList 上的 xpath_values 合并各节点的结果
+    rows = selector.xpath('//tr')
+    assert rows.xpath_values('td/@a').getall() == ['1', '2', '3']
+    assert rows.css_values('td::text').getall() == ['x', 'y', 'z']
+    assert selector.xpath('//missing').xpath_values('td').get('none') == 'none'
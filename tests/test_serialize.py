@@ -0,0 +1,88 @@
+import datetime
+
+import pytest
+import requests
+import requests.models
+
+from espider.parser.response import Response
+from espider.spider import Spider
+from espider.utils import serialize
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class SerializeSpider(Spider):
+    def parse(self, response, *args, **kwargs):
+        pass
+
+
+@pytest.fixture(params=['python', 'msgpack'])
+def backend(request, monkeypatch):
+    if request.param == 'msgpack':
+        if msgpack is None: pytest.skip('msgpack is not installed')
+        monkeypatch.setattr(serialize, 'msgpack', msgpack)
+    else:
+        monkeypatch.setattr(serialize, 'msgpack', None)
+    return request.param
+
+
+def test_request_round_trip(backend):
+    spider = SerializeSpider()
+    request = spider.request(
+        'http://example.com/a',
+        params=[('b', '1'), ('a', '2')],
+        headers={'User-Agent': 'espider'},
+        timeout=(3, 10),
+        auth=('u', 'p'),
+        cert=('client.crt', 'client.key'),
+        cb_args=(1, 'x'),
+        cb_kwargs={'depth': 2},
+        priority=3,
+        max_retry=2,
+    )
+    request.retry_times = 1
+
+    loaded = serialize.loads(serialize.dumps(request), spider=spider)
+    assert loaded.url == request.url and loaded.method == 'GET'
+    assert loaded.request_kwargs['timeout'] == (3, 10)
+    assert loaded.request_kwargs['auth'] == ('u', 'p')
+    assert loaded.request_kwargs['cert'] == ('client.crt', 'client.key')
+    assert loaded.callback == spider.parse
+    assert (loaded.func_args, loaded.func_kwargs) == ((1, 'x'), {'depth': 2})
+    assert (loaded.priority, loaded.max_retry, loaded.retry_times) == (3, 2, 1)
+
+    # 还原后的参数可以直接交给 requests
+    kwargs = loaded.request_kwargs
+    prepared = requests.Request(kwargs['method'], kwargs['url'], params=kwargs['params'], auth=kwargs['auth']).prepare()
+    assert prepared.url == 'http://example.com/a?b=1&a=2'
+    assert prepared.headers['Authorization'].startswith('Basic ')
+
+
+def test_response_round_trip(backend):
+    resp = requests.models.Response()
+    resp._content = b'<html><title>t</title></html>'
+    resp._content_consumed = True
+    resp.status_code = 404
+    resp.reason = 'Not Found'
+    resp.url = 'http://example.com/a'
+    resp.headers['Content-Type'] = 'text/html; charset=utf-8'
+    resp.encoding = 'utf-8'
+    resp.elapsed = datetime.timedelta(milliseconds=12)
+    response = Response(resp)
+
+    loaded = serialize.loads(serialize.dumps(response))
+    assert (loaded.url, loaded.status_code, loaded.reason) == (response.url, 404, 'Not Found')
+    assert loaded.content == response.content
+    assert loaded.headers['content-type'] == 'text/html; charset=utf-8'
+    assert loaded.elapsed == response.elapsed
+    assert loaded.css('title::text').get() == 't'
+
+
+def test_unpackb_without_copy(backend):
+    data = serialize.packb([1, 'a', b'body', {'k': [None, True, 1.5]}])
+    assert serialize.unpackb(data) == [1, 'a', b'body', {'k': [None, True, 1.5]}]
+    body = serialize.unpackb(data, copy=False)[2]
+    assert isinstance(body, memoryview) and bytes(body) == b'body'
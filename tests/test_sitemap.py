@@ -0,0 +1,151 @@
+import codecs
+import gzip
+from datetime import datetime, timezone
+
+import pytest
+import requests.models
+
+from espider.parser.response import Response
+from espider.parser.sitemap import iter_sitemap, parse_lastmod, sitemap_urls_from_robots
+from espider.spider import SitemapSpider
+
+URLSET = b'''<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>http://example.com/a</loc><lastmod>2026-10-01</lastmod></url>
+  <url><loc> /b </loc></url>
+  <url><lastmod>2026-10-01</lastmod></url>
+</urlset>'''
+
+INDEX = b'''<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>http://example.com/s1.xml.gz</loc><lastmod>2026-10-01T08:00:00+08:00</lastmod></sitemap>
+  <sitemap><loc>http://example.com/s2.xml</loc></sitemap>
+</sitemapindex>'''
+
+URLSET_ENTRIES = [
+    {'loc': 'http://example.com/a', 'lastmod': datetime(2026, 10, 1, tzinfo=timezone.utc), 'type': 'url'},
+    {'loc': 'http://example.com/b', 'lastmod': None, 'type': 'url'},
+]
+
+
+def split(data, size=7):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_urlset():
+    assert list(iter_sitemap(split(URLSET), base_url='http://example.com/sitemap.xml')) == URLSET_ENTRIES
+
+
+def test_sitemap_index():
+    entries = list(iter_sitemap([INDEX]))
+    assert [(_['loc'], _['type']) for _ in entries] == [
+        ('http://example.com/s1.xml.gz', 'sitemap'), ('http://example.com/s2.xml', 'sitemap')
+    ]
+    assert entries[0]['lastmod'] == datetime(2026, 10, 1, 0, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 1024])
+def test_gzip(chunk_size):
+    data = gzip.compress(URLSET)
+    assert list(iter_sitemap(split(data, chunk_size), base_url='http://example.com/')) == URLSET_ENTRIES
+
+    # 多个 gzip 成员拼接
+    data = gzip.compress(INDEX[:100]) + gzip.compress(INDEX[100:])
+    assert len(list(iter_sitemap(split(data, chunk_size)))) == 2
+
+
+def test_gzip_max_size():
+    with pytest.raises(ValueError):
+        list(iter_sitemap([gzip.compress(URLSET)], max_size=100))
+
+
+def test_bom_and_text_sitemap():
+    assert list(iter_sitemap([codecs.BOM_UTF8, URLSET], base_url='http://example.com/')) == URLSET_ENTRIES
+    assert len(list(iter_sitemap([gzip.compress(codecs.BOM_UTF8 + INDEX)]))) == 2
+
+    text = codecs.BOM_UTF8 + b'http://example.com/1\r\n\nhttps://example.com/2\nnot a url\nftp://x/y\nhttp://example.com/3'
+    assert [_['loc'] for _ in iter_sitemap(split(text, 4))] == [
+        'http://example.com/1', 'https://example.com/2', 'http://example.com/3'
+    ]
+    assert list(iter_sitemap([])) == [] and list(iter_sitemap([b''])) == []
+
+
+def test_feeds():
+    rss = b'''<rss version="2.0"><channel><title>t</title>
+      <item><link>http://example.com/post/1</link><pubDate>Mon, 19 Oct 2026 08:00:00 +0800</pubDate></item>
+    </channel></rss>'''
+    atom = b'''<feed xmlns="http://www.w3.org/2005/Atom">
+      <entry><link rel="edit" href="http://example.com/edit/1"/><link href="/post/2"/>
+      <published>2026-10-01T00:00:00Z</published><updated>2026-10-02T00:00:00Z</updated></entry>
+    </feed>'''
+    assert list(iter_sitemap([rss])) == [
+        {'loc': 'http://example.com/post/1', 'lastmod': datetime(2026, 10, 19, 0, 0, tzinfo=timezone.utc), 'type': 'url'}
+    ]
+    assert list(iter_sitemap([atom], base_url='http://example.com/feed')) == [
+        {'loc': 'http://example.com/post/2', 'lastmod': datetime(2026, 10, 2, tzinfo=timezone.utc), 'type': 'url'}
+    ]
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('2026', datetime(2026, 1, 1, tzinfo=timezone.utc)),
+    ('2026-10', datetime(2026, 10, 1, tzinfo=timezone.utc)),
+    ('2026-10-19T08:00:00Z', datetime(2026, 10, 19, 8, tzinfo=timezone.utc)),
+    ('Mon, 19 Oct 2026 08:00:00 GMT', datetime(2026, 10, 19, 8, tzinfo=timezone.utc)),
+    ('yesterday', None),
+    ('', None),
+])
+def test_parse_lastmod(value, expected):
+    assert parse_lastmod(value) == expected
+
+
+def test_robots():
+    robots = 'User-agent: *\nDisallow: /x\nSitemap: http://example.com/s1.xml\n  sitemap:http://example.com/s2.xml\n'
+    assert sitemap_urls_from_robots(robots) == ['http://example.com/s1.xml', 'http://example.com/s2.xml']
+
+
+class ShopSitemapSpider(SitemapSpider):
+    sitemap_urls = ['http://example.com/robots.txt']
+    sitemap_rules = [(r'/product/', 'parse_product'), (r'/post/', 'parse')]
+    sitemap_follow = [r'/products']
+    sitemap_since = '2026-10-01'
+
+    def parse(self, response, *args, **kwargs):
+        pass
+
+    def parse_product(self, response, *args, **kwargs):
+        pass
+
+
+def make_sitemap_response(url, body, status=200):
+    resp = requests.models.Response()
+    resp._content = body
+    resp._content_consumed = True
+    resp.status_code = status
+    resp.url = url
+    return Response(resp)
+
+
+def test_sitemap_spider():
+    spider = ShopSitemapSpider()
+    robots = make_sitemap_response('http://example.com/robots.txt', b'Sitemap: http://example.com/index.xml\n')
+    assert [_.url for _ in spider._parse_sitemap(robots)] == ['http://example.com/index.xml']
+
+    index = make_sitemap_response('http://example.com/index.xml', gzip.compress(
+        b'<sitemapindex><sitemap><loc>/products.xml</loc></sitemap><sitemap><loc>/other.xml</loc></sitemap></sitemapindex>'
+    ))
+    requests_ = list(spider._parse_sitemap(index))
+    assert [(_.url, _.callback) for _ in requests_] == [('http://example.com/products.xml', spider._parse_sitemap)]
+
+    urlset = make_sitemap_response('http://example.com/products.xml', b'''<urlset>
+        <url><loc>/product/1</loc><lastmod>2026-10-02</lastmod></url>
+        <url><loc>/product/2</loc><lastmod>2026-09-01</lastmod></url>
+        <url><loc>/post/3</loc></url>
+        <url><loc>/about</loc></url>
+    </urlset>''')
+    assert [(_.url, _.callback) for _ in spider._parse_sitemap(urlset)] == [
+        ('http://example.com/product/1', spider.parse_product), ('http://example.com/post/3', spider.parse)
+    ]
+
+    # 错误页不解析
+    error = make_sitemap_response('http://example.com/products.xml', b'http://example.com/product/9', status=404)
+    assert list(spider._parse_sitemap(error)) == []
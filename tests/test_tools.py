@@ -0,0 +1,174 @@
+import re
+
+import pytest
+
+from espider.parser.selector import Selector
+from espider.utils.tools import JsonIndex, RegexMap, compile_regex_map, re_findall, re_search, search
+
+from test_response import make_response
+
+DATA = {
+    'id': 1,
+    'name': 'root',
+    'items': [
+        {'id': 2, 'name': 'a', 'tags': ['x', 'y']},
+        {'id': 3, 'name': 'b', 'child': {'id': 4, 'name': 'c'}},
+    ],
+    'meta': {'total': 2, 'a.b': 'dotted'},
+}
+
+
+def test_get():
+    index = JsonIndex(DATA)
+    assert index.get('id') == [1, 2, 3, 4]
+    assert index.get('name', target_type=str) == ['root', 'a', 'b', 'c']
+    assert index.get('child', target_type=dict) == [{'id': 4, 'name': 'c'}]
+    assert index.get('tags', target_type=dict) == []
+    assert index.get('missing') == []
+
+    # 返回的列表是副本
+    index.get('id').append(5)
+    assert index.get('id') == [1, 2, 3, 4]
+
+
+def test_nested_order():
+    # 按遍历顺序，同名 key 的子节点在父节点之前
+    index = JsonIndex({'a': {'a': 1}, 'b': [{'a': 2}]})
+    assert index.get('a') == [1, {'a': 1}, 2]
+    assert index.paths('a') == [('a', 'a'), ('a',), ('b', 0, 'a')]
+
+
+def test_contains():
+    index = JsonIndex(DATA)
+    assert 'total' in index
+    assert 'missing' not in index
+    assert set(index.keys()) == {'id', 'name', 'items', 'tags', 'child', 'meta', 'total', 'a.b'}
+    assert len(index) == 8
+
+
+def test_paths():
+    index = JsonIndex(DATA)
+    assert index.paths('id') == [('id',), ('items', 0, 'id'), ('items', 1, 'id'), ('items', 1, 'child', 'id')]
+    assert index.paths('missing') == []
+    # 与 get 的结果一一对应
+    assert len(index.paths('name')) == len(index.get('name'))
+
+
+@pytest.mark.parametrize('key, target_type, expected', [
+    ('total', None, 2),
+    ('id', None, [1, 2, 3, 4]),
+    ('tags', list, ['x', 'y']),
+    ('tags', dict, []),
+    ('missing', None, None),
+    ('missing', str, []),
+    (['total', 'missing'], None, {'total': [2], 'missing': None}),
+    (('child', 'tags'), dict, {'child': [{'id': 4, 'name': 'c'}], 'tags': []}),
+])
+def test_search(key, target_type, expected):
+    assert JsonIndex(DATA).search(key, target_type=target_type) == expected
+    assert search(key, data=DATA, target_type=target_type) == expected
+
+
+def test_scalar_data():
+    assert JsonIndex([1, 2]).get('a') == []
+    assert JsonIndex('text').search('a') is None
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('$.name', ['root']),
+    ('name', ['root']),
+    ('$.items[0].name', ['a']),
+    ('$.items[-1].child.name', ['c']),
+    ('$.items[5].name', []),
+    ('$.items[*].id', [2, 3]),
+    ('$.items.*.id', [2, 3]),
+    ('$.meta.*', [2, 'dotted']),
+    ("$.meta['a.b']", ['dotted']),
+    ('$..id', [1, 2, 3, 4]),
+    ('$.items..name', ['a', 'b', 'c']),
+    ('$..child.name', ['c']),
+    ('$..tags[1]', ['y']),
+    ('$.name.x', []),
+    ('$', [DATA]),
+])
+def test_query(path, expected):
+    assert JsonIndex(DATA).query(path) == expected
+
+
+@pytest.mark.parametrize('path', ['$.items[', '$.items[a]', '$..'])
+def test_query_invalid(path):
+    with pytest.raises(ValueError):
+        JsonIndex(DATA).query(path)
+
+
+def test_response_find():
+    response = make_response(b'{"a": {"b": 1, "c": [{"b": 2}]}, "d": "x"}', content_type='application/json')
+    assert response.find('b') == [1, 2]
+    assert response.find('d') == 'x'
+    assert response.find('b', data={'b': 3}) == 3
+    assert response.find_map({'d': 'd', 'nested': {'b': 'b'}}) == {'d': 'x', 'nested': {'b': [1, 2]}}
+    assert response.query('$.a.c[0].b') == [2]
+
+    # 索引只建立一次
+    assert response.json_index is response.json_index
+
+
+TEXT = 'id=1 name=a\nid=2 name=b <p>x\ny</p>'
+
+
+@pytest.mark.parametrize('backend', [None, 're', 're2'])
+def test_re_search(backend):
+    assert re_search(r'id=(\d+)', TEXT, backend=backend) == 'id=1'
+    assert re_search(r'id=(\d+)', TEXT, index=1, backend=backend) == '1'
+    assert re_search({'id': r'id=(\d+)', 'name': r'name=(\w)', 'none': r'zzz'}, TEXT, index=1, backend=backend) == {
+        'id': '1', 'name': 'a', 'none': ''
+    }
+    assert re_search({'a': {'b': r'name=(\w)'}}, TEXT, index=1, backend=backend) == {'a': {'b': 'a'}}
+
+
+@pytest.mark.parametrize('backend', [None, 're', 're2'])
+def test_re_findall(backend):
+    assert re_findall(r'id=(\d+)', TEXT, backend=backend) == ['1', '2']
+    assert re_findall({'id': r'id=(\d+)', 'a': {'name': r'name=(\w)'}}, TEXT, backend=backend) == {
+        'id': ['1', '2'], 'a': {'name': ['a', 'b']}
+    }
+    assert [m.group(1) for m in re_findall(r'id=(\d+)', TEXT, iter=True, backend=backend)] == ['1', '2']
+    assert list(re_findall({'none': r'zzz'}, TEXT, iter=True, backend=backend)['none']) == []
+
+
+def test_dot_fallback():
+    # 未指定 flags 时匹配失败以 re.S 重试
+    assert re_search(r'<p>(.*)</p>', TEXT, index=1) == 'x\ny'
+    assert re_findall(r'<p>(.*)</p>', TEXT) == ['x\ny']
+    # 指定 flags 时不重试
+    assert re_search(r'<p>(.*)</p>', TEXT, flags=re.I) == ''
+    assert re_search(r'ID=(\d)', TEXT, flags=re.I, index=1) == '1'
+
+
+def test_compiled_pattern():
+    assert re_findall({'id': re.compile(r'ID=(\d)', re.I)}, TEXT) == {'id': ['1', '2']}
+
+
+def test_compile_regex_map():
+    regex_map = compile_regex_map({'id': r'id=(\d+)', 'a': {'name': r'name=(\w)'}})
+    assert isinstance(regex_map, RegexMap)
+    # 相同的 re_map 只编译一次
+    assert compile_regex_map({'id': r'id=(\d+)', 'a': {'name': r'name=(\w)'}}) is regex_map
+    assert compile_regex_map(regex_map) is regex_map
+    assert compile_regex_map({'id': r'id=(\d+)', 'a': {'name': r'name=(\w)'}}, flags=re.I) is not regex_map
+    assert isinstance(dict(regex_map.items())['a'], RegexMap)
+
+
+@pytest.mark.parametrize('re_map, backend', [({'a': 1}, None), (r'a', 'pcre')])
+def test_regex_map_invalid(re_map, backend):
+    with pytest.raises(Exception):
+        RegexMap(re_map, backend=backend)
+
+
+def test_selector_re_map():
+    selector = Selector(text='<ul><li>id=1 name=a</li><li>id=2 name=b</li></ul>')
+    regex_map = {'id': r'id=(\d+)', 'a': {'name': r'name=(\w)'}, 'none': r'zzz'}
+    assert selector.re_map(regex_map) == {'id': ['1', '2'], 'a': {'name': ['a', 'b']}, 'none': []}
+    assert selector.re_map_first(regex_map, default='-') == {'id': '1', 'a': {'name': 'a'}, 'none': '-'}
+    assert selector.css('li')[1].re_map({'id': r'id=(\d+)'}) == {'id': ['2']}
+    assert selector.css('li')[1].re_map_first({'id': r'id=(\d+)'}) == {'id': '2'}